@@ -0,0 +1,395 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+
+from discord_app import (
+    BotState, MESSAGES_ROUTE, PAGE_SIZE, POLL_LIMIT, TYPING_ROUTE, llm, work_queue, channel_ids,
+    load_state, update_state, flush_state, can_reply, record_reply, mentions_bot, message_age, split_stale,
+    summarize_stale, decode_messages, has_mention, missed_deadline, save_reply
+)
+from deadline import Deadline
+from ratelimit import rate_limiter
+from typing_indicator import AsyncTypingScheduler
+from gateway import GatewayClient
+from database import init_db, close_db
+from text_analysis import detect_language
+from context_cache import conversation_cache
+from metrics import metrics
+from polling import PollSchedule
+from config import Config
+
+logger = logging.getLogger('AsyncApp')
+
+
+class AsyncDiscordApp:
+    """Concurrent polling/reply engine sharing one keep-alive HTTP session.
+
+    Fetching keeps running while mentions are generated and sent in their
+    own tasks, so a slow Ollama generation only delays its own reply.
+    Generations go through the LLMHandler worker pool, shared by every
+    channel the process serves.
+
+    Fetching moves ahead of replies, so a channel has two cursors: the
+    newest message ingested, kept in memory, and the saved one, held just
+    before the oldest mention whose reply task hasn't finished. A restart
+    fetches from the saved cursor and answers those mentions again, along
+    with any later ones that finished in between.
+    """
+
+    def __init__(self):
+        self.session = None
+        self.send_slots = asyncio.Semaphore(Config.MAX_CONCURRENT_SENDS)
+        self.tasks = set()
+        self.unfinished = defaultdict(set)  # Mention ids with a reply task, per channel
+        self.cursors = {}  # Newest message ingested per channel, ahead of the saved cursor
+        self.held = {}  # Gateway events per channel held back while it catches up
+        self.typing = None
+        self.channels = channel_ids()
+        self.schedule = PollSchedule(self.channels)
+        self.state = None
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(limit=Config.HTTP_POOL_SIZE, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers={
+                "Authorization": Config.USER_TOKEN,
+                "User-Agent": Config.USER_AGENT
+            }
+        )
+        self.typing = AsyncTypingScheduler(self.send_typing_indicator)
+
+    async def close(self):
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.typing:
+            await self.typing.close()
+        if self.state:
+            flush_state(self.state)
+        if self.session:
+            await self.session.close()
+        await asyncio.to_thread(close_db)
+
+    async def api_request(self, method, route, channel_id, timeout, decode=None, deadline=None, **kwargs):
+        """Rate-limited request, returns (status, decoded JSON body or None)
+
+        decode parses the raw JSON body instead of json.loads. A wait on the
+        limiter that runs past the deadline counts as a send-stage miss, the
+        request still goes out.
+        """
+        route_key = f"{method} {route}"
+        url = f"{Config.API_BASE}{route.format(channel_id=channel_id)}"
+
+        for _ in range(Config.RATE_LIMIT_RETRIES + 1):
+            remaining = deadline.remaining() if deadline is not None else None
+            if not await rate_limiter.acquire_async(route_key, channel_id, remaining):
+                # A finished reply is still sent, late beats never
+                deadline.miss("send")
+                deadline = None
+                await rate_limiter.acquire_async(route_key, channel_id)
+            async with self.send_slots:
+                async with self.session.request(
+                    method, url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs
+                ) as response:
+                    body = None
+                    if response.content_type == "application/json":
+                        body = decode(await response.read()) if decode else await response.json()
+                    retry_after = rate_limiter.update(
+                        route_key, channel_id, response.status, response.headers, body
+                    )
+                    if retry_after is None:
+                        response.raise_for_status()
+                        return response.status, body
+            logger.warning(f"Rate limited on {route_key}. Retrying after {retry_after}s")
+        return 429, None
+
+    def cursor(self, channel_id):
+        return self.cursors.get(channel_id) or self.state["channels"][channel_id]["last_processed_id"] or None
+
+    async def fetch_messages(self, channel_id, after=None, limit=POLL_LIMIT):
+        params = {"limit": limit}
+        if after:
+            params["after"] = after
+
+        try:
+            status, messages = await self.api_request(
+                "GET", MESSAGES_ROUTE, channel_id, 15, decode=decode_messages, params=params
+            )
+            return messages if status == 200 else []
+        except Exception as e:
+            logger.error(f"Fetch error: {e}")
+            return []
+
+    async def send_typing_indicator(self, channel_id):
+        await self.api_request("POST", TYPING_ROUTE, channel_id, 5)
+
+    async def send_reply(self, original_message, reply_text, deadline=None):
+        """Send reply mentioning the original author, within the mention's deadline"""
+        author_id = original_message['author']['id']
+        message_id = original_message['id']
+        channel_id = original_message['channel_id']
+        # A fallback for a missed deadline goes out under the normal send limits
+        if deadline is not None and deadline.missed:
+            deadline = None
+
+        typing = self.typing.start(channel_id, len(reply_text) * Config.TYPING_ANIMATION_DELAY)
+        try:
+            min_wait = min(len(reply_text) * Config.TYPING_ANIMATION_DELAY, Config.COOLDOWN_SECONDS)
+            remaining = deadline.remaining() if deadline is not None else None
+            if remaining is not None:
+                min_wait = min(min_wait, remaining)
+            await asyncio.sleep(min_wait)
+            metrics.observe("typing", min_wait)
+            start = time.monotonic()
+
+            data = {
+                "content": f"<@{author_id}> {reply_text}",
+                "message_reference": {
+                    "channel_id": channel_id,
+                    "message_id": message_id
+                },
+                "nonce": message_id,
+                "enforce_nonce": True
+            }
+
+            status, _ = await self.api_request(
+                "POST", MESSAGES_ROUTE, channel_id, 10, deadline=deadline, json=data
+            )
+            if status == 429:
+                logger.error(f"Reply to {message_id} still rate limited, giving up")
+                metrics.inc("replies_failed")
+                return False
+            logger.info(f"Replied to {message_id}")
+            if metrics.enabled:
+                metrics.observe("send", time.monotonic() - start)
+                metrics.observe("end_to_end", message_age(message_id))
+                metrics.inc("replies_sent")
+            return True
+        except Exception as e:
+            logger.error(f"Reply failed: {e}")
+            metrics.inc("replies_failed")
+            return False
+        finally:
+            self.typing.stop(typing)
+
+    async def handle_mention(self, msg, deadline):
+        try:
+            lang = detect_language(msg['content'])
+            future = llm.submit(msg['author']['id'], msg['content'], lang, deadline)
+            try:
+                response = await asyncio.wait_for(asyncio.wrap_future(future), deadline.remaining())
+            except asyncio.TimeoutError:
+                response = missed_deadline(msg, lang, future, deadline)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                logger.info(f"Dropped queued mention {msg['id']}")
+                return
+
+            if response and await self.send_reply(msg, response, deadline):
+                record_reply(self.state, msg['channel_id'])
+                await asyncio.to_thread(save_reply, msg, response, lang, deadline.fallback)
+        except Exception as e:
+            logger.error(f"Processing error: {e}")
+
+    def process_messages(self, channel_id, messages, last_processed_id):
+        """Schedule a reply task for every new mention in a channel, oldest first"""
+        if messages and not getattr(messages, "may_mention", True):
+            return 0, messages[0]['id']
+
+        scheduled = 0
+
+        for msg in reversed(messages):
+            # A REST catch-up can overlap gateway events, skip what's behind the cursor
+            if last_processed_id and int(msg['id']) <= int(last_processed_id):
+                continue
+
+            if mentions_bot(msg):
+                if metrics.enabled:
+                    metrics.observe("fetch_lag", message_age(msg['id']))
+                    metrics.inc("mentions")
+                if not can_reply(self.state, channel_id):
+                    logger.info(f"Skipping reply in {channel_id} due to cooldown")
+                    metrics.inc("cooldown_skips")
+                elif work_queue is not None:
+                    work_queue.enqueue(msg, detect_language(msg['content']))
+                    scheduled += 1
+                else:
+                    # The mention's deadline starts at ingestion
+                    task = asyncio.create_task(self.handle_mention(msg, Deadline()))
+                    self.tasks.add(task)
+                    self.unfinished[channel_id].add(int(msg['id']))
+                    task.add_done_callback(
+                        lambda task, channel_id=channel_id, message_id=int(msg['id']):
+                            self.task_done(task, channel_id, message_id)
+                    )
+                    scheduled += 1
+
+            last_processed_id = msg['id']
+
+        return scheduled, last_processed_id
+
+    def task_done(self, task, channel_id, message_id):
+        self.tasks.discard(task)
+        self.unfinished[channel_id].discard(message_id)
+        self.save_cursor(channel_id)
+
+    def ingest(self, channel_id, messages):
+        """Feed a batch of a channel's messages (newest first) through process_messages"""
+        new_count, last_processed_id = self.process_messages(channel_id, messages, self.cursor(channel_id))
+        if new_count:
+            logger.info(f"Scheduled {new_count} new mentions in {channel_id} ({len(self.tasks)} in flight)")
+            logger.info(f"Generation queue: {llm.scheduler_stats()}")
+            logger.info(f"Conversation cache: {conversation_cache.stats()}")
+            logger.info(f"Response cache: {llm.response_cache.stats()}")
+
+        self.advance_cursor(channel_id, last_processed_id)
+
+    def advance_cursor(self, channel_id, message_id):
+        """Move a channel's cursor forward, never back"""
+        cursor = self.cursor(channel_id)
+        if message_id and (not cursor or int(message_id) > int(cursor)):
+            self.cursors[channel_id] = str(message_id)
+            self.save_cursor(channel_id)
+
+    def save_cursor(self, channel_id):
+        """Save the channel's cursor, held back to just before its oldest
+        unfinished mention"""
+        cursor = self.cursor(channel_id)
+        unfinished = self.unfinished[channel_id]
+        if unfinished and (not cursor or min(unfinished) <= int(cursor)):
+            cursor = str(min(unfinished) - 1)
+        if cursor and cursor != self.state["channels"][channel_id]["last_processed_id"]:
+            update_state(self.state, channel_id, cursor)
+
+    async def catch_up(self, channel_id):
+        """Page through everything posted in a channel since its cursor, in order.
+
+        Gateway events for the channel are held until the catch-up reaches
+        the head, so a live message can't move the cursor past the backlog
+        still being paged through.
+        """
+        start_time = time.time()
+        cutoff = datetime.now(timezone.utc) - timedelta(minutes=Config.CATCHUP_STALE_MINUTES)
+        stale = {}
+        pages = total = 0
+        self.held[channel_id] = []
+
+        try:
+            while True:
+                page = await self.fetch_messages(channel_id, self.cursor(channel_id), limit=PAGE_SIZE)
+                if not page:
+                    break
+                page.sort(key=lambda m: int(m['id']), reverse=True)
+                fresh = split_stale(page, cutoff, stale)
+                self.process_messages(channel_id, fresh, self.cursor(channel_id))
+                self.advance_cursor(channel_id, page[0]['id'])
+                pages += 1
+                total += len(page)
+                if len(page) < PAGE_SIZE:
+                    break
+
+            if stale:
+                self.process_messages(channel_id, summarize_stale(stale), None)
+        finally:
+            # Oldest first as they arrived; ingest skips what the catch-up already saw
+            held = self.held.pop(channel_id)
+            if held:
+                self.ingest(channel_id, held[::-1])
+        if pages:
+            logger.info(
+                f"Caught up on {total} messages in {channel_id} in {pages} pages "
+                f"in {time.time() - start_time:.1f}s"
+            )
+
+    async def on_gateway_message(self, message):
+        channel_id = str(message['channel_id'])
+        if channel_id in self.held:
+            self.held[channel_id].append(message)
+        else:
+            self.ingest(channel_id, [message])
+
+    async def on_gateway_ready(self):
+        """Fetch what a new gateway session missed, a fresh IDENTIFY replays nothing"""
+        results = await asyncio.gather(
+            *(self.catch_up(channel_id) for channel_id in self.channels if self.cursor(channel_id)),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Catch-up after gateway identify failed: {result}")
+
+    async def autosave(self):
+        """Save cursor updates that were coalesced and not followed by another"""
+        while True:
+            await asyncio.sleep(Config.STATE_SAVE_INTERVAL)
+            flush_state(self.state, force=False)
+
+    async def poll_channel(self, channel_id):
+        messages = await self.fetch_messages(channel_id, self.cursor(channel_id))
+
+        if messages:
+            self.ingest(channel_id, messages)
+            # A full page means more messages are waiting behind it
+            if len(messages) >= POLL_LIMIT:
+                await self.catch_up(channel_id)
+        # Replies still in flight keep the channel on the short interval
+        self.schedule.record(channel_id, len(messages), has_mention(messages), bool(self.unfinished[channel_id]))
+
+    async def poll(self):
+        metrics.add_gauges("poll", self.schedule.stats)
+        while True:
+            # Every due channel is polled each round; the shared rate
+            # limiter and send slots interleave their requests
+            due = self.schedule.due()
+            if due:
+                results = await asyncio.gather(
+                    *(self.poll_channel(channel_id) for channel_id in due),
+                    return_exceptions=True
+                )
+                errors = [result for result in results if isinstance(result, Exception)]
+                if errors:
+                    logger.error(f"Main loop error: {errors[0]}")
+                    if len(errors) == len(results):
+                        await asyncio.sleep(60)
+
+            await asyncio.sleep(self.schedule.wait())
+
+    async def run(self):
+        logger.info(
+            f"Starting Discord User App for {len(self.channels)} channels "
+            f"(async engine, {Config.INGESTION_MODE} ingestion)"
+        )
+        if work_queue is None:
+            llm.warm_up()
+        await asyncio.to_thread(init_db)
+        self.state: BotState = load_state()
+
+        await self.start()
+        autosave = asyncio.create_task(self.autosave())
+        try:
+            await asyncio.gather(*(
+                self.catch_up(channel_id) for channel_id in self.channels if self.cursor(channel_id)
+            ))
+
+            if Config.INGESTION_MODE == "gateway":
+                await GatewayClient(
+                    self.session, self.on_gateway_message, channel_ids=self.channels, on_ready=self.on_gateway_ready
+                ).run()
+            else:
+                await self.poll()
+        finally:
+            autosave.cancel()
+            await self.close()
+
+
+def run():
+    """Blocking entry point used by discord_app.main_loop in async mode"""
+    try:
+        asyncio.run(AsyncDiscordApp().run())
+    except KeyboardInterrupt:
+        logger.info("App stopped by user")
@@ -0,0 +1,81 @@
+"""Catch-up time after downtime against a fake Discord channel with a backlog.
+
+Starts benchmarks/fake_discord.py in-process with --backlog messages (every
+fifth one a mention) in each of --channels channels, points the bot at it
+with every cursor just before the backlog and times discord_app.catch_up.
+LLM_WARMUP_TIMEOUT is 0, so without a reachable Ollama every mention gets
+the in-character error reply at once, which keeps the measurement about
+ingestion rather than generation.
+
+Usage: python benchmarks/bench_catchup.py [--backlog 5000] [--channels 1]
+                                         [--policy reply|summarize|skip]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from fake_discord import FakeDiscord, make_app, start_in_thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backlog", type=int, default=5000, help="messages per channel")
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--policy", default="reply", choices=["reply", "summarize", "skip"])
+    parser.add_argument("--stale-minutes", type=float, default=30)
+    parser.add_argument("--port", type=int, default=8781)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    Config.DATABASE_FILE = os.path.join(tmp, "bench.db")
+    Config.STATE_FILE = os.path.join(tmp, "state.json")
+    Config.TYPING_ANIMATION_DELAY = 0
+    Config.COOLDOWN_SECONDS = 0
+    Config.LLM_WARMUP_TIMEOUT = 0  # Answer with the error reply instead of waiting for Ollama
+    Config.GLOBAL_RATE_LIMIT = 10 ** 6  # The fake has no global limit to respect
+    Config.CATCHUP_STALE_POLICY = args.policy
+    Config.CATCHUP_STALE_MINUTES = args.stale_minutes
+
+    Config.CHANNEL_IDS = [Config.CHANNEL_ID] + [f"{Config.CHANNEL_ID}-{i}" for i in range(1, args.channels)]
+    fake = FakeDiscord(Config.CHANNEL_IDS)
+    for channel in fake.channels.values():
+        # Spread the backlog over the last two hours so part of it is stale
+        channel.preload(args.backlog, start=time.time() - 7200, spacing=7200 / args.backlog)
+    base = start_in_thread(make_app(fake), args.port)
+    Config.API_BASE = f"{base}/api/v9"
+
+    import discord_app
+    from database import init_db, close_db
+    init_db()
+
+    state = discord_app.load_state()
+    cursors = {cid: str(int(ch.messages[0]["id"]) - 1) for cid, ch in fake.channels.items()}
+    start = time.perf_counter()
+    replied = discord_app.catch_up(state, dict(cursors))
+    elapsed = time.perf_counter() - start
+    close_db()
+
+    with urllib.request.urlopen(f"{base}/stats") as response:
+        stats = json.load(response)
+    total = args.backlog * args.channels
+    mentions = sum(1 for ch in fake.channels.values() for m in ch.messages if m["mentions"])
+    at_head = all(state["channels"][cid]["last_processed_id"] == ch.messages[-1]["id"]
+                  for cid, ch in fake.channels.items())
+    received = sum(stats[cid]["replies"] for cid in fake.channels)
+    requests = sum(stats[cid]["requests"] for cid in fake.channels)
+    print(f"backlog: {total} messages in {args.channels} channels, {mentions} mentions, policy={args.policy}")
+    print(f"caught up to head: {at_head}")
+    print(f"replies: {replied} ({received} received), API requests: {requests}")
+    print(f"catch-up time: {elapsed:.2f}s ({total / elapsed:.0f} messages/s)")
+
+
+if __name__ == "__main__":
+    main()
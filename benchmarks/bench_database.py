@@ -0,0 +1,105 @@
+"""Compare the persistent/write-behind database layer with per-call connects.
+
+Usage: python benchmarks/bench_database.py [--rows 5000] [--reads 2000]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from config import Config
+
+LEGACY_INSERT = '''INSERT OR IGNORE INTO messages
+                   (id, user_id, content, language, response)
+                   VALUES (?, ?, ?, ?, ?)'''
+
+LEGACY_HISTORY = '''SELECT content, response
+                    FROM messages
+                    WHERE user_id = ?
+                    ORDER BY timestamp DESC
+                    LIMIT ?'''
+
+
+def legacy_save_message(message, response=None):
+    # What save_message did before: connect, insert, commit, close per row
+    conn = sqlite3.connect(Config.DATABASE_FILE)
+    try:
+        conn.execute(LEGACY_INSERT,
+                     (message['id'], message['author']['id'], message['content'],
+                      database.detect_language(message['content']), response))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def legacy_get_conversation_history(user_id, limit=5):
+    conn = sqlite3.connect(Config.DATABASE_FILE)
+    try:
+        rows = conn.execute(LEGACY_HISTORY, (user_id, limit)).fetchall()
+        return [{"user": row[0], "bot": row[1]} for row in rows]
+    finally:
+        conn.close()
+
+
+def make_messages(count, users=50):
+    return [
+        {
+            "id": str(1000000 + i),
+            "author": {"id": f"user{i % users}"},
+            "content": f"@Leon status report number {i}, what's the situation?"
+        }
+        for i in range(count)
+    ]
+
+
+def run(label, save, read, messages, reads, finish=None):
+    start = time.perf_counter()
+    for msg in messages:
+        save(msg, "Stay sharp. Hostiles everywhere.")
+    if finish:
+        finish()
+    write_time = time.perf_counter() - start
+
+    latencies = []
+    for i in range(reads):
+        t = time.perf_counter()
+        read(f"user{i % 50}", 5)
+        latencies.append(time.perf_counter() - t)
+    latencies.sort()
+
+    print(f"{label:<22} {len(messages) / write_time:>12.0f} inserts/s"
+          f" {latencies[len(latencies) // 2] * 1e6:>10.0f} us p50"
+          f" {latencies[int(len(latencies) * 0.99)] * 1e6:>10.0f} us p99")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--reads", type=int, default=2000)
+    args = parser.parse_args()
+
+    messages = make_messages(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        Config.DATABASE_FILE = os.path.join(tmp, "legacy.db")
+        # Original schema: no WAL, no indexes
+        conn = sqlite3.connect(Config.DATABASE_FILE)
+        database.MIGRATIONS[0][2](conn.cursor())
+        conn.commit()
+        conn.close()
+        run("per-call connect", legacy_save_message, legacy_get_conversation_history,
+            messages, args.reads)
+
+        Config.DATABASE_FILE = os.path.join(tmp, "pooled.db")
+        database.init_db()
+        run("persistent + batched", database.save_message, database.get_conversation_history,
+            messages, args.reads, finish=database.flush)
+        database.close_db()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Rows/s and peak RSS of training-data export on a large synthetic database.
+
+Builds a database with --rows answered messages from --users users (each
+with personality traits), then exports it in fresh processes: the old way
+(get_training_data's fetchall into a list of dicts, then json.dumps per
+row) and with export_training.py, plain, gzipped and sharded.
+
+Usage: python benchmarks/bench_export.py [--rows 1000000] [--users 5000]
+"""
+import argparse
+import json
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config
+
+LEGACY_QUERY = '''SELECT m.content, m.response, pc.personality_traits
+                  FROM messages m
+                  LEFT JOIN personality_context pc ON m.user_id = pc.user_id
+                  WHERE m.response IS NOT NULL'''
+
+
+def build(path, rows, users):
+    Config.DATABASE_FILE = path
+    import database
+    database.init_db()
+    database.close_db()
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO personality_context VALUES (?, ?, ?)",
+            ((str(u), json.dumps({"turns": u % 7}), json.dumps({"sarcasm": u % 10 / 10, "tone": "dry"}))
+             for u in range(users))
+        )
+        base = 1200000000000000000
+        conn.executemany(
+            '''INSERT INTO messages (id, user_id, content, language, response, channel_id, snowflake)
+               VALUES (?, ?, ?, 'en', ?, '1', ?)''',
+            ((str(base + i), str(i % users), f"<@1> message number {i}, what's the plan for the village?",
+              f"Stay sharp. Reply {i}: keep your head down and watch my back while I check the church.",
+              base + i)
+             for i in range(rows))
+        )
+    conn.close()
+
+
+def child(mode, db, out):
+    Config.DATABASE_FILE = db
+    start = time.perf_counter()
+    if mode == "legacy":
+        import database
+        c = database.get_connection().cursor()
+        c.execute(LEGACY_QUERY)
+        data = [
+            {"prompt": row[0], "response": row[1], "personality_traits": json.loads(row[2]) if row[2] else {}}
+            for row in c.fetchall()
+        ]
+        with open(out, "w", encoding="utf-8") as f:
+            for record in data:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        rows = len(data)
+    else:
+        from export_training import export_training_data
+        shards = 4 if mode == "sharded" else 1
+        rows, _, _ = export_training_data(out + (".gz" if mode == "gzip" else ""), shards=shards)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    print(json.dumps({"rows": rows, "seconds": elapsed,
+                      "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "DB", "OUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(*args.child)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "history.db")
+        start = time.perf_counter()
+        build(db, args.rows, args.users)
+        print(f"built {args.rows} rows ({os.path.getsize(db) / 2**20:.0f} MB) in {time.perf_counter() - start:.1f}s")
+
+        for mode in ("legacy", "stream", "gzip", "sharded"):
+            out = os.path.join(tmp, f"{mode}.jsonl")
+            result = json.loads(subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", mode, db, out],
+                cwd=ROOT, capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1])
+            size = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp) if name.startswith(mode))
+            print(f"{mode:<8} {result['rows'] / result['seconds']:9.0f} rows/s   peak RSS {result['rss_mb']:7.1f} MB"
+                  f"   output {size / 2**20:6.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
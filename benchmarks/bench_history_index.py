@@ -0,0 +1,86 @@
+"""History lookup latency on a large synthetic DB, before and after migrating.
+
+Builds a database with the original (unindexed) schema, times
+get_conversation_history-style lookups, applies database.migrate() in place
+and times them again.
+
+Usage: python benchmarks/bench_history_index.py [--rows 2000000] [--users 5000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+LEGACY_HISTORY = '''SELECT content, response
+                    FROM messages
+                    WHERE user_id = ?
+                    ORDER BY timestamp DESC
+                    LIMIT ?'''
+
+
+def populate(conn, rows, users):
+    database.MIGRATIONS[0][2](conn.cursor())
+    base = 1100000000000000000
+    chunk = 50000
+    for offset in range(0, rows, chunk):
+        conn.executemany(
+            '''INSERT INTO messages (id, timestamp, user_id, content, language, response)
+               VALUES (?, datetime(1700000000 + ?, 'unixepoch'), ?, ?, 'en', ?)''',
+            (
+                (str(base + i * 4096), i // 3, f"user{random.randrange(users)}",
+                 f"@Leon message {i}", "Copy that.")
+                for i in range(offset, min(offset + chunk, rows))
+            )
+        )
+        conn.commit()
+
+
+def measure(conn, sql, users, lookups=200):
+    latencies = []
+    for _ in range(lookups):
+        user_id = f"user{random.randrange(users)}"
+        start = time.perf_counter()
+        conn.execute(sql, (user_id, 5)).fetchall()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--users", type=int, default=5000)
+    args = parser.parse_args()
+    random.seed(4)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "history.db"))
+
+        start = time.perf_counter()
+        populate(conn, args.rows, args.users)
+        print(f"Built {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+        p50, p99 = measure(conn, LEGACY_HISTORY, args.users, lookups=20)
+        print(f"before: {p50 * 1e3:9.2f} ms p50 {p99 * 1e3:9.2f} ms p99")
+
+        start = time.perf_counter()
+        database.migrate(conn)
+        print(f"Migrated in place in {time.perf_counter() - start:.1f}s")
+
+        plan = conn.execute("EXPLAIN QUERY PLAN " + database.SELECT_HISTORY, ("user1", 5)).fetchall()
+        print("plan:", "; ".join(row[-1] for row in plan))
+
+        p50, p99 = measure(conn, database.SELECT_HISTORY, args.users)
+        print(f"after:  {p50 * 1e3:9.2f} ms p50 {p99 * 1e3:9.2f} ms p99")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Offline load test: synthetic mention traffic through the real main_loop.
+
+Starts benchmarks/fake_discord.py (optionally with rate-limit buckets that
+answer 429) and benchmarks/fake_ollama.py (with a latency distribution)
+in-process, points the bot at them and runs discord_app.main_loop with the
+blocking or async engine. Mentions from --users users arrive as a Poisson
+stream of --rate per second over --channels channels for --duration
+seconds, mixed with --chatter plain messages per mention. After a --drain
+period it reports throughput, mention-to-reply latency percentiles, the
+mentions the bot dropped (cooldown skips, coalesced, stale or queue full),
+those still unanswered when the drain ran out, and the per-stage breakdown
+from metrics.py. The response cache is off unless --response-cache,
+so every mention is generated.
+
+--degrade-after makes fake Ollama --degrade-factor times slower that many
+seconds into the traffic, to see how --reply-deadline (REPLY_DEADLINE, 0
+for none) bounds the tail: late mentions get the fallback reply, counted
+separately along with the deadline misses per stage.
+
+Use --json to get one machine-readable line, e.g. to compare runs before
+and after a change with identical --seed.
+
+Usage: python benchmarks/bench_load.py [--engine blocking|async] [--rate 2] [--duration 30]
+                                       [--channels 2] [--users 20] [--bucket-limit 5]
+                                       [--latency-dist lognormal --jitter 0.5] [--json]
+                                       [--degrade-after 10 --degrade-factor 20 --reply-deadline 8]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from fake_discord import FakeDiscord, make_app, start_in_thread
+from fake_ollama import DISTRIBUTIONS, start_fake_ollama
+
+PROMPTS = [
+    "what's the plan?", "are we safe here?", "how many rounds left?", "did you see that thing?",
+    "where do we go now?", "status report", "need backup at the church", "مرحبا، أين نذهب؟"
+]
+
+
+def percentile(values, q):
+    """Nearest-rank percentile, q in [0, 100]"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def generate_traffic(fake, channels, args, posted, stop):
+    """Post mentions (Poisson arrivals) and chatter until duration runs out"""
+    rng = random.Random(args.seed)
+    deadline = time.monotonic() + args.duration
+    while not stop.is_set():
+        time.sleep(rng.expovariate(args.rate))
+        if time.monotonic() >= deadline:
+            break
+        channel = fake.channels[rng.choice(channels)]
+        for _ in range(args.chatter):
+            channel.add(rng.randrange(args.users), "just chatting")
+        message = channel.add(rng.randrange(args.users), rng.choice(PROMPTS), mention=True)
+        posted[message["id"]] = time.time()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices=["blocking", "async"], default="blocking")
+    parser.add_argument("--rate", type=float, default=2.0, help="mentions per second over all channels")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of traffic")
+    parser.add_argument("--drain", type=float, default=30.0, help="max seconds to wait for replies afterwards")
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--chatter", type=int, default=2, help="plain messages posted before each mention")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--bucket-limit", type=int, default=5, help="fake Discord requests per bucket window, 0 = no 429s")
+    parser.add_argument("--bucket-window", type=float, default=5.0)
+    parser.add_argument("--load-time", type=float, default=0.0)
+    parser.add_argument("--prefill-time", type=float, default=0.1)
+    parser.add_argument("--token-time", type=float, default=0.02)
+    parser.add_argument("--latency-dist", choices=DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--parallel", type=int, default=2, help="fake Ollama's concurrent generations")
+    parser.add_argument("--workers", type=int, default=Config.MAX_CONCURRENT_GENERATIONS)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--typing-delay", type=float, default=0.005, help="TYPING_ANIMATION_DELAY")
+    parser.add_argument("--cooldown", type=float, default=Config.COOLDOWN_SECONDS)
+    parser.add_argument("--reply-deadline", type=float, default=Config.REPLY_DEADLINE)
+    parser.add_argument("--degrade-after", type=float, default=0.0,
+                        help="seconds into the traffic when Ollama slows down, 0 = never")
+    parser.add_argument("--degrade-factor", type=float, default=20.0)
+    parser.add_argument("--response-cache", action="store_true",
+                        help="keep RESPONSE_CACHE on, so repeated prompts skip Ollama")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--ollama-port", type=int, default=11440)
+    parser.add_argument("--json", action="store_true", help="print one JSON line instead of a report")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    channels = [str(900000 + i) for i in range(args.channels)]
+    Config.DATABASE_FILE = os.path.join(tmp, "load.db")
+    Config.STATE_FILE = os.path.join(tmp, "state.json")
+    Config.QUEUE_FILE = os.path.join(tmp, "queue.db")
+    Config.CHANNEL_IDS = channels
+    Config.ASYNC_MODE = args.engine == "async"
+    Config.MAX_CONCURRENT_GENERATIONS = args.workers
+    Config.POLL_INTERVAL = args.poll_interval
+    Config.TYPING_ANIMATION_DELAY = args.typing_delay
+    Config.COOLDOWN_SECONDS = args.cooldown
+    Config.RESPONSE_CACHE = args.response_cache
+    Config.REPLY_DEADLINE = args.reply_deadline
+    Config.METRICS_ENABLED = True
+    Config.METRICS_LOG_INTERVAL = 0
+
+    fake = FakeDiscord(channels, args.bucket_limit, args.bucket_window)
+    for channel_id in channels:
+        fake.channels[channel_id].add(1, "history before the test")
+    Config.API_BASE = f"{start_in_thread(make_app(fake), args.port)}/api/v9"
+    ollama, Config.OLLAMA_HOST = start_fake_ollama(
+        args.ollama_port, load_time=args.load_time, prefill_time=args.prefill_time,
+        token_time=args.token_time, parallel=args.parallel, latency_dist=args.latency_dist,
+        jitter=args.jitter, seed=args.seed
+    )
+
+    # Imported after the overrides, the LLM handler sizes its pool on import
+    import discord_app
+    import personality
+    from metrics import metrics
+    discord_app.save_state({
+        "channels": {
+            channel_id: {"last_processed_id": fake.channels[channel_id].messages[-1]["id"], "last_reply": ""}
+            for channel_id in channels
+        },
+        "last_run": ""
+    })
+    threading.Thread(target=discord_app.main_loop, name="bot", daemon=True).start()
+
+    posted = {}  # mention id -> wall time it was posted
+    stop = threading.Event()
+    if args.degrade_after:
+        def degrade():
+            ollama.prefill_time *= args.degrade_factor
+            ollama.token_time *= args.degrade_factor
+        threading.Timer(args.degrade_after, degrade).start()
+    start = time.time()
+    generate_traffic(fake, channels, args, posted, stop)
+    traffic_end = time.time()
+
+    def replies():
+        return {
+            reply["message_reference"]["message_id"]: reply["received_at"]
+            for channel in fake.channels.values() for reply in channel.replies
+            if reply.get("message_reference")
+        }
+
+    deadline = time.monotonic() + args.drain
+    replied = replies()
+    while time.monotonic() < deadline and not posted.keys() <= replied.keys():
+        time.sleep(0.1)
+        replied = replies()
+
+    latencies = [replied[mid] - at for mid, at in posted.items() if mid in replied]
+    generation = discord_app.llm.scheduler_stats()
+    counters = metrics.snapshot_counters()
+    cooldown_skips = counters.get("cooldown_skips", 0)
+    fallbacks = tuple(personality.registry.get().fallback_responses.values())
+    fallback_replies = sum(
+        reply["content"].endswith(fallbacks) for channel in fake.channels.values() for reply in channel.replies
+    )
+    dropped = cooldown_skips + generation["coalesced"] + generation["dropped_stale"] + generation["dropped_full"]
+    last_reply = max((replied[mid] for mid in posted if mid in replied), default=traffic_end)
+    result = {
+        "engine": args.engine,
+        "mentions": len(posted),
+        "replied": len(latencies),
+        "dropped": dropped,
+        "unanswered": len(posted) - len(latencies) - dropped,
+        "cooldown_skips": cooldown_skips,
+        "fallback_replies": fallback_replies,
+        "deadline_misses": {
+            event[len("deadline_misses_"):]: value for event, value in counters.items()
+            if event.startswith("deadline_misses_")
+        },
+        "throughput": len(latencies) / max(last_reply - start, 1e-9),
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies, default=0.0),
+        "rate_limited": fake.rate_limited,
+        "typing_posts": sum(channel.typing for channel in fake.channels.values()),
+        "deduplicated": sum(channel.deduplicated for channel in fake.channels.values()),
+        "discord_requests": sum(channel.requests for channel in fake.channels.values()),
+        "ollama_requests": ollama.stats["requests"],
+        "ollama_max_in_flight": ollama.stats["max_in_flight"],
+        "generation": generation
+    }
+
+    if args.json:
+        print(json.dumps(result))
+        return
+
+    print(f"engine {args.engine}: {args.rate}/s mentions for {args.duration:.0f}s over {args.channels} channels, "
+          f"{args.users} users, Ollama {args.latency_dist} prefill {args.prefill_time}s token {args.token_time}s")
+    print(f"mentions {result['mentions']}, replied {result['replied']}, dropped {result['dropped']}, "
+          f"still unanswered after the drain {result['unanswered']}")
+    print(f"throughput {result['throughput']:.2f} replies/s, {fallback_replies} of them deadline fallbacks "
+          f"(misses by stage: {result['deadline_misses'] or 'none'})")
+    print(f"mention-to-reply p50 {result['p50']:.2f}s p90 {result['p90']:.2f}s "
+          f"p99 {result['p99']:.2f}s max {result['max']:.2f}s")
+    print(f"discord: {result['discord_requests']} requests, {result['rate_limited']} answered 429, "
+          f"{result['typing_posts']} typing posts, {result['deduplicated']} duplicate sends")
+    print(f"ollama: {result['ollama_requests']} requests, at most {result['ollama_max_in_flight']} at once")
+    print(f"dropped as cooldown skips {result['cooldown_skips']}, coalesced {generation['coalesced']}, "
+          f"stale {generation['dropped_stale']}, queue full {generation['dropped_full']}, "
+          f"generation errors {generation['failed']}")
+    print(f"\n{metrics.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Overhead of the metrics hooks, and a scrape of /metrics after real traffic.
+
+Times metrics.observe/inc disabled and enabled, then runs main_loop against
+benchmarks/fake_discord.py and benchmarks/fake_ollama.py with metrics on,
+answers --mentions mentions and prints the latency summary and a few lines
+of the Prometheus endpoint.
+
+Usage: python benchmarks/bench_metrics.py [--mentions 20] [--calls 200000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from fake_discord import FakeDiscord, make_app, start_in_thread
+from fake_ollama import start_fake_ollama
+from metrics import Metrics
+
+
+def hook_cost(enabled, calls):
+    registry = Metrics(enabled=enabled)
+    start = time.perf_counter()
+    for _ in range(calls):
+        registry.observe("send", 0.042)
+        registry.inc("replies_sent")
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mentions", type=int, default=20)
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--port", type=int, default=8786)
+    parser.add_argument("--ollama-port", type=int, default=11438)
+    parser.add_argument("--metrics-port", type=int, default=9108)
+    args = parser.parse_args()
+
+    print(f"observe+inc disabled: {hook_cost(False, args.calls):6.0f} ns")
+    print(f"observe+inc enabled:  {hook_cost(True, args.calls):6.0f} ns")
+
+    tmp = tempfile.mkdtemp()
+    Config.DATABASE_FILE = os.path.join(tmp, "bench.db")
+    Config.STATE_FILE = os.path.join(tmp, "state.json")
+    Config.TYPING_ANIMATION_DELAY = 0.001
+    Config.COOLDOWN_SECONDS = 0
+    Config.POLL_INTERVAL = Config.POLL_MIN_INTERVAL = Config.POLL_MAX_INTERVAL = 1
+    Config.RESPONSE_CACHE = False
+    Config.METRICS_ENABLED = True
+    Config.METRICS_PORT = args.metrics_port
+    Config.METRICS_LOG_INTERVAL = 0
+
+    fake = FakeDiscord([Config.CHANNEL_ID])
+    channel = fake.channels[Config.CHANNEL_ID]
+    channel.add(1, "history before startup")
+    Config.API_BASE = f"{start_in_thread(make_app(fake), args.port)}/api/v9"
+    _, Config.OLLAMA_HOST = start_fake_ollama(args.ollama_port, load_time=0.5, parallel=2)
+
+    import discord_app
+    from metrics import metrics
+    metrics.enabled = True  # created when this script imported metrics, before the override
+    discord_app.save_state({
+        "channels": {Config.CHANNEL_ID: {"last_processed_id": channel.messages[-1]["id"], "last_reply": ""}},
+        "last_run": ""
+    })
+    threading.Thread(target=discord_app.main_loop, daemon=True).start()
+
+    for i in range(args.mentions):
+        channel.add(100 + i, f"status report {i}?", mention=True)
+        time.sleep(0.1)
+    while len(channel.replies) < args.mentions:
+        time.sleep(0.05)
+    time.sleep(1)  # let the write-behind batch commit
+
+    print(f"\n{metrics.summary()}\n")
+    body = urllib.request.urlopen(f"http://127.0.0.1:{args.metrics_port}/metrics").read().decode()
+    lines = body.splitlines()
+    print(f"/metrics: {len(lines)} lines, e.g.")
+    for line in lines:
+        if 'stage="end_to_end"' in line and ("_count" in line or 'le="5"' in line) or line.startswith("bot_generation_"):
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Post-processing cost per reply, old personality path vs. ResponsePipeline,
+and a hot reload of PERSONALITY_FILE.
+
+Usage: python benchmarks/bench_personality.py [--replies 20000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+import personality
+
+REPLIES = [
+    "(Checks ammo) Stay sharp, this place reeks of trouble.",
+    "Where's everyone going? Keep your head down and watch my back while I check the church, "
+    "the bell tower and whatever is left of the village square before they come back for us.",
+    "Not now.",
+    "(Reloads) " + " ".join(["Move."] * 60),
+]
+
+
+def legacy_finish_response(response, lang="en"):
+    """LLMHandler.finish_response before the pipeline"""
+    profile = personality.PERSONALITIES.get(Config.PERSONALITY_PROFILE, personality.PERSONALITIES["leon_re4"])
+    final_response = response
+    if random.random() < 0.3:
+        profile = personality.PERSONALITIES.get(Config.PERSONALITY_PROFILE, personality.PERSONALITIES["leon_re4"])
+        quote = random.choice(profile["quotes"].get(lang, profile["quotes"]["en"]))
+        final_response = f"{quote}. {final_response}"
+    if random.random() < 0.4:
+        if random.choice([True, False]):
+            final_response = f"{final_response}"
+        else:
+            final_response = f"{final_response}"
+    words = final_response.split()
+    if len(words) > Config.MAX_RESPONSE_WORDS:
+        final_response = ' '.join(words[:Config.MAX_RESPONSE_WORDS]) + '...'
+        personality.logger.info(f"Truncated response from {len(words)} to {Config.MAX_RESPONSE_WORDS} words")
+    cleaned = re.sub(r'^\s*\([^)]*\)\s*', '', final_response)
+    words = cleaned.split()
+    if len(words) > Config.MAX_RESPONSE_WORDS:
+        return ' '.join(words[:Config.MAX_RESPONSE_WORDS]) + '...'
+    return cleaned
+
+
+def legacy_system_prompt(lang="en"):
+    """System prompt as format_prompt built it on every call"""
+    profile = personality.PERSONALITIES.get(Config.PERSONALITY_PROFILE, personality.PERSONALITIES["leon_re4"])
+    system_prompt = profile["system_prompt"].get(lang, profile["system_prompt"]["en"])
+    return system_prompt + f"\nKeep responses under {Config.MAX_RESPONSE_WORDS} words. Be concise."
+
+
+def timed(label, func, replies, repeat):
+    best = None
+    for _ in range(repeat):
+        random.seed(0)
+        start = time.perf_counter()
+        for text in replies:
+            func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<24} {best / len(replies) * 1e9:8.0f} ns/reply")
+
+
+def check_reload():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "profiles.json")
+        registry = personality.ProfileRegistry(path=path, reload_interval=0)
+        before = registry.get()
+
+        profile = dict(personality.PERSONALITIES["leon_re4"], quote_chance=0.0)
+        profile["system_prompt"] = dict(profile["system_prompt"], en="You are Leon, on a quiet day.")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"leon_re4": profile}, f)
+        after = registry.get()
+        print(f"reload: prompt changed {before.system_prompt() != after.system_prompt()}, "
+              f"cache key {before.cache_key} -> {after.cache_key}")
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{ not json")
+        os.utime(path, ns=(time.time_ns() + 10**9,) * 2)
+        print(f"broken file keeps the last profiles: {registry.get() is after}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--replies", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    replies = [REPLIES[i % len(REPLIES)] for i in range(args.replies)]
+    # Both paths log truncations; time the processing, not the handler
+    personality.logger.setLevel("WARNING")
+    timed("legacy finish", legacy_finish_response, replies, args.repeat)
+    timed("pipeline", personality.response_pipeline.run, replies, args.repeat)
+    timed("legacy system prompt", legacy_system_prompt, replies, args.repeat)
+    timed("profile system prompt", lambda _: personality.registry.get().system_prompt(), replies, args.repeat)
+
+    # The old path appended the quote before stripping a leading "(action)",
+    # which then no longer matched
+    random.seed(1)
+    legacy = [legacy_finish_response(REPLIES[0]) for _ in range(1000)]
+    random.seed(1)
+    piped = [personality.response_pipeline.run(REPLIES[0]) for _ in range(1000)]
+    print(f"replies still showing '(Checks ammo)': legacy {sum('(Checks' in r for r in legacy)}, "
+          f"pipeline {sum('(Checks' in r for r in piped)} of 1000")
+    personality.logger.setLevel("INFO")
+    check_reload()
+
+
+if __name__ == "__main__":
+    main()
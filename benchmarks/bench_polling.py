@@ -0,0 +1,146 @@
+"""Requests per hour and mention latency of fixed vs adaptive polling.
+
+Replays synthetic channel traces on a simulated clock through
+polling.PollSchedule, the way the blocking main_loop uses it. A poll that
+finds a mention is answered before the loop goes on, taking --generation
+seconds. "fixed" is the old behaviour: every POLL_INTERVAL seconds whatever
+happened. "adaptive" uses the Config defaults. Latency is from posting a
+mention to the reply being sent.
+
+Traces, as Poisson arrivals per channel:
+  idle          chatter every ~10 min, a mention every ~30 min
+  busy          chatter every ~8 s, a mention every ~2 min
+  conversation  quiet, with a few 5 minute bursts of back and forth
+                (a mention every ~20 s) per hour
+
+It also times the mention pre-filter: parsing and walking a fetched page
+with and without decode_messages' check of the raw body.
+
+Usage: python benchmarks/bench_polling.py [--hours 24] [--generation 3]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from polling import PollSchedule
+
+CHANNEL = "900000"
+
+
+def poisson(rng, start, end, mean_gap):
+    times = []
+    t = start + rng.expovariate(1 / mean_gap)
+    while t < end:
+        times.append(t)
+        t += rng.expovariate(1 / mean_gap)
+    return times
+
+
+def trace(name, hours, rng):
+    """Sorted (time, is_mention) events"""
+    end = hours * 3600
+    if name == "idle":
+        events = [(t, False) for t in poisson(rng, 0, end, 600)] + [(t, True) for t in poisson(rng, 0, end, 1800)]
+    elif name == "busy":
+        events = [(t, False) for t in poisson(rng, 0, end, 8)] + [(t, True) for t in poisson(rng, 0, end, 120)]
+    else:
+        events = []
+        for start in poisson(rng, 0, end, 1200):
+            events += [(t, True) for t in poisson(rng, start, start + 300, 20)]
+            events += [(t, False) for t in poisson(rng, start, start + 300, 30)]
+    return sorted(events)
+
+
+def simulate(events, hours, generation):
+    """Returns (polls per hour, mention latencies)"""
+    now = [0.0]
+    schedule = PollSchedule([CHANNEL], clock=lambda: now[0])
+    end = hours * 3600
+    seen = 0  # events fetched so far
+    latencies = []
+
+    while now[0] < end:
+        for channel_id in schedule.due():
+            fetched = 0
+            while seen + fetched < len(events) and events[seen + fetched][0] <= now[0]:
+                fetched += 1
+            batch = events[seen:seen + fetched]
+            seen += fetched
+            mentions = [posted for posted, is_mention in batch if is_mention]
+            if mentions:
+                # The blocking loop waits for its replies before polling again
+                now[0] += generation
+                latencies += [now[0] - posted for posted in mentions]
+            schedule.record(channel_id, fetched, bool(mentions))
+        now[0] += schedule.wait()
+
+    return schedule.polls / hours, latencies
+
+
+def run_traces(args):
+    defaults = (Config.POLL_INTERVAL, Config.POLL_MIN_INTERVAL, Config.POLL_MAX_INTERVAL)
+    modes = {
+        "fixed": (defaults[0], defaults[0], defaults[0]),
+        "adaptive": defaults,
+    }
+    print(f"{'trace':<13} {'mode':<9} {'requests/h':>10} {'mentions':>8} {'p50 latency':>12} {'p90 latency':>12}")
+    for name in ("idle", "busy", "conversation"):
+        events = trace(name, args.hours, random.Random(args.seed))
+        for mode, (interval, minimum, maximum) in modes.items():
+            Config.POLL_INTERVAL, Config.POLL_MIN_INTERVAL, Config.POLL_MAX_INTERVAL = interval, minimum, maximum
+            per_hour, latencies = simulate(events, args.hours, args.generation)
+            p90 = statistics.quantiles(latencies, n=10)[-1] if len(latencies) > 1 else 0.0
+            print(f"{name:<13} {mode:<9} {per_hour:10.0f} {len(latencies):8d} "
+                  f"{statistics.median(latencies) if latencies else 0:11.2f}s {p90:11.2f}s")
+    Config.POLL_INTERVAL, Config.POLL_MIN_INTERVAL, Config.POLL_MAX_INTERVAL = defaults
+
+
+def message(i, mention):
+    """Shaped like a Discord API message object"""
+    author = {"id": str(4000 + i % 7), "username": f"user{i % 7}", "avatar": "a" * 32,
+              "discriminator": "0", "public_flags": 0, "global_name": f"User {i % 7}"}
+    return {
+        "type": 0, "content": f"<@{Config.USER_ID}> are we safe?" if mention else f"chatting about the village {i}",
+        "mentions": [{"id": Config.USER_ID, "username": "leon"}] if mention else [],
+        "mention_roles": [], "attachments": [], "embeds": [], "timestamp": "2026-10-18T12:00:00.000000+00:00",
+        "edited_timestamp": None, "flags": 0, "components": [], "id": str(1300000000000000000 + i),
+        "channel_id": CHANNEL, "author": author, "pinned": False, "mention_everyone": False, "tts": False
+    }
+
+
+def run_prefilter(args):
+    import discord_app
+    state = {"channels": {CHANNEL: {"last_processed_id": "", "last_reply": ""}}, "last_run": ""}
+    for size in (10, 100):
+        body = json.dumps([message(i, False) for i in reversed(range(size))]).encode()
+        for label, decode in (("json.loads", json.loads), ("decode_messages", discord_app.decode_messages)):
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                discord_app.queue_mentions(state, CHANNEL, decode(body), None)
+            elapsed = (time.perf_counter() - start) / args.iterations
+            print(f"page of {size:3d} without mentions, {label:<15} {elapsed * 1e6:8.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--generation", type=float, default=3.0, help="seconds to generate and send a reply")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    Config.USER_ID = "1200000000000000001"
+    run_traces(args)
+    print()
+    run_prefilter(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Prompt-eval time per request: raw generate prompts vs. the cached chat prefix.
+
+Talks to a running Ollama (OLLAMA_HOST or localhost) with Config.MODEL_NAME.
+
+Usage: python benchmarks/bench_prompt_cache.py [--requests 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ollama
+
+from config import Config
+from llm_handler import LLMHandler
+
+MENTIONS = [
+    "@Leon what's the plan?",
+    "@Leon are we safe here?",
+    "@Leon how many rounds left?",
+    "@Leon did you see that thing?",
+    "@Leon where do we go now?"
+]
+
+
+def run(label, build, send, requests):
+    evals = []
+    for i in range(requests):
+        response = send(build(MENTIONS[i % len(MENTIONS)]))
+        evals.append((response.get('prompt_eval_count') or 0,
+                      (response.get('prompt_eval_duration') or 0) / 1e6))
+    counts = [count for count, _ in evals]
+    times = [ms for _, ms in evals]
+    print(f"{label:<14} prompt tokens evaluated: {statistics.mean(counts):7.1f} avg"
+          f"   prompt eval: {statistics.median(times):8.1f} ms p50 {max(times):8.1f} ms max")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    handler = LLMHandler()
+    options = {"temperature": Config.TEMPERATURE, "num_predict": 16}
+
+    # Before: rebuilt raw prompt, no keep_alive
+    def legacy_send(prompt):
+        return ollama.generate(model=Config.MODEL_NAME, prompt=prompt, options=options)
+
+    run("raw generate", handler.build_prompt, legacy_send, args.requests)
+
+    # After: stable chat prefix kept warm between requests
+    def chat_send(messages):
+        return ollama.chat(model=Config.MODEL_NAME, messages=messages, options=options,
+                           keep_alive=Config.OLLAMA_KEEP_ALIVE)
+
+    run("chat + prefix", handler.build_messages, chat_send, args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Sends/sec and 429s against a fake Discord that enforces rate-limit buckets.
+
+Compares the shared proactive limiter (discord_app.api_request) with the old
+reactive approach (send, sleep retry_after on 429, resend), both sending
+--messages replies from --threads concurrent senders.
+
+Usage: python benchmarks/bench_ratelimit.py [--messages 40] [--threads 4]
+                                            [--bucket-limit 5] [--bucket-window 1]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from fake_discord import FakeDiscord, make_app, start_in_thread
+
+
+def reactive_send(session, data):
+    # What send_reply used to do on a 429
+    while True:
+        response = session.post(f"{Config.API_BASE}/channels/{Config.CHANNEL_ID}/messages",
+                                json=data, timeout=10)
+        if response.status_code != 429:
+            return response
+        time.sleep(response.json().get("retry_after", 5))
+
+
+def run(label, send, messages, threads, fake):
+    before = fake.rate_limited
+    per_thread = messages // threads
+    start = time.perf_counter()
+
+    def worker(n):
+        for i in range(per_thread):
+            send({"content": f"reply {n}-{i}"})
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    sent = per_thread * threads
+    print(f"{label:<12} {sent} sends in {elapsed:6.2f}s = {sent / elapsed:6.2f} sends/s, "
+          f"{fake.rate_limited - before} x 429")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--bucket-limit", type=int, default=5)
+    parser.add_argument("--bucket-window", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8782)
+    args = parser.parse_args()
+
+    fake = FakeDiscord([Config.CHANNEL_ID], args.bucket_limit, args.bucket_window)
+    base = start_in_thread(make_app(fake), args.port)
+    Config.API_BASE = f"{base}/api/v9"
+
+    import discord_app
+    print(f"bucket: {args.bucket_limit} requests per {args.bucket_window}s "
+          f"(ceiling {args.bucket_limit / args.bucket_window:.2f} sends/s)")
+
+    run("reactive", lambda data: reactive_send(discord_app.session, data),
+        args.messages, args.threads, fake)
+    time.sleep(args.bucket_window)
+    run("limiter", lambda data: discord_app.api_request(
+        "POST", discord_app.MESSAGES_ROUTE, Config.CHANNEL_ID, json=data, timeout=10
+    ), args.messages, args.threads, fake)
+
+
+if __name__ == "__main__":
+    main()
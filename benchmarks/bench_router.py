@@ -0,0 +1,101 @@
+"""Failover and load balancing of LLMRouter against fake Ollama servers.
+
+Starts three benchmarks/fake_ollama.py servers: two for the main model and
+one faster "fast" tier server. It runs three phases of --mentions
+concurrent mentions each: all servers up, the first main server hanging,
+and that server back up. Each phase runs through an LLMHandler with a
+single backend (the old setup) and through one routing over all three.
+For each it reports error replies, latency and which server served what.
+
+Usage: python benchmarks/bench_router.py [--mentions 40] [--timeout 2]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from fake_ollama import start_fake_ollama
+
+MENTIONS = [
+    "status?",
+    "you there?",
+    "what do we do about the villagers blocking the road to the church?",
+    "how many rounds do you have left for the shotgun after that last fight?",
+]
+
+
+def run_phase(label, handler, fakes, mentions):
+    import personality
+    before = [fake.stats["requests"] for fake in fakes.values()]
+    start = time.perf_counter()
+    futures = []
+    for i in range(mentions):
+        text = MENTIONS[i % len(MENTIONS)]
+        futures.append((time.perf_counter(), handler.submit(f"user{i}", f"{text} #{i}", "en")))
+
+    latencies, errors = [], 0
+    error_reply = personality.registry.get().error_response("en")
+    for submitted, future in futures:
+        reply = future.result()
+        latencies.append(time.perf_counter() - submitted)
+        errors += reply == error_reply
+    served = ", ".join(
+        f"{name} {fake.stats['requests'] - count}" for (name, fake), count in zip(fakes.items(), before)
+    )
+    print(f"  {label:<14} errors {errors:3d}/{mentions}  p50 {statistics.median(latencies):5.2f}s  "
+          f"max {max(latencies):5.2f}s  wall {time.perf_counter() - start:5.2f}s  served: {served}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mentions", type=int, default=40)
+    parser.add_argument("--timeout", type=float, default=2.0, help="LLM_REQUEST_TIMEOUT")
+    parser.add_argument("--port", type=int, default=11450)
+    args = parser.parse_args()
+
+    fakes, hosts = {}, {}
+    for i, (name, prefill, token) in enumerate([("main-a", 0.1, 0.02), ("main-b", 0.1, 0.02), ("fast", 0.02, 0.005)]):
+        fakes[name], hosts[name] = start_fake_ollama(
+            args.port + i, load_time=0.2, prefill_time=prefill, token_time=token, parallel=2
+        )
+
+    Config.MAX_CONCURRENT_GENERATIONS = 4
+    Config.RESPONSE_CACHE = False
+    Config.CONVERSATION_HISTORY = False
+    Config.LLM_REQUEST_TIMEOUT = args.timeout
+    Config.LLM_HEALTH_INTERVAL = 1
+    Config.LLM_FAST_MAX_WORDS = 4
+    Config.GENERATION_MAX_PER_USER = args.mentions
+
+    from llm_handler import LLMHandler
+
+    Config.OLLAMA_HOST = hosts["main-a"]
+    Config.LLM_BACKENDS = []
+    single = LLMHandler()
+
+    Config.LLM_BACKENDS = [
+        {"host": hosts["main-a"], "model": "llama3"},
+        {"host": hosts["main-b"], "model": "llama3"},
+        {"host": hosts["fast"], "model": "llama3.2:1b", "tier": "fast"},
+    ]
+    routed = LLMHandler()
+
+    for label, handler in (("single backend", single), ("router", routed)):
+        print(label)
+        handler.wait_ready()
+        run_phase("all up", handler, fakes, args.mentions)
+        fakes["main-a"].mode = "hang"
+        run_phase("main-a hangs", handler, fakes, args.mentions)
+        fakes["main-a"].mode = "up"
+        time.sleep(Config.LLM_HEALTH_INTERVAL * 2)
+        run_phase("main-a back", handler, fakes, args.mentions)
+        print(f"  backends: {handler.router.backend_stats()}")
+
+
+if __name__ == "__main__":
+    main()
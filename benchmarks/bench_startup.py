@@ -0,0 +1,86 @@
+"""Import time and time-to-first-reply of discord_app against a cold model.
+
+Runs benchmarks/fake_discord.py and benchmarks/fake_ollama.py in-process; the
+fake model takes --load-time seconds to load. Reports how long importing
+discord_app takes (in a fresh interpreter), how long the old import-time
+"Test connection" generate blocked for, and, with main_loop running, when
+ingestion starts and when the first mention gets its reply.
+
+Usage: python benchmarks/bench_startup.py [--load-time 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from fake_discord import FakeDiscord, make_app, start_in_thread
+from fake_ollama import start_fake_ollama
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import discord_app; print(time.perf_counter() - t)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--load-time", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=8785)
+    parser.add_argument("--ollama-port", type=int, default=11437)
+    args = parser.parse_args()
+
+    # Import in a fresh interpreter, the way `python main.py` pays for it
+    import_time = float(subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1])
+
+    import ollama
+    _, legacy_base = start_fake_ollama(args.ollama_port + 1, load_time=args.load_time)
+    start = time.perf_counter()
+    ollama.Client(host=legacy_base).generate(model=Config.MODEL_NAME, prompt="Test connection")
+    legacy_block = time.perf_counter() - start
+
+    tmp = tempfile.mkdtemp()
+    Config.DATABASE_FILE = os.path.join(tmp, "bench.db")
+    Config.STATE_FILE = os.path.join(tmp, "state.json")
+    Config.TYPING_ANIMATION_DELAY = 0
+    Config.COOLDOWN_SECONDS = 0
+    Config.POLL_INTERVAL = Config.POLL_MIN_INTERVAL = Config.POLL_MAX_INTERVAL = 1
+
+    fake = FakeDiscord([Config.CHANNEL_ID])
+    channel = fake.channels[Config.CHANNEL_ID]
+    channel.add(1, "history before startup")
+    base = start_in_thread(make_app(fake), args.port)
+    Config.API_BASE = f"{base}/api/v9"
+    _, Config.OLLAMA_HOST = start_fake_ollama(args.ollama_port, load_time=args.load_time)
+
+    import discord_app
+    discord_app.save_state({
+        "channels": {Config.CHANNEL_ID: {"last_processed_id": channel.messages[-1]["id"], "last_reply": ""}},
+        "last_run": ""
+    })
+    channel.add(2, "are you there?", mention=True)
+
+    start, start_wall = time.perf_counter(), time.time()
+    threading.Thread(target=discord_app.main_loop, daemon=True).start()
+    first_fetch = None
+    while not channel.replies:
+        if first_fetch is None and channel.requests:
+            first_fetch = time.perf_counter() - start
+        time.sleep(0.01)
+    first_reply = channel.replies[0]["received_at"] - start_wall
+
+    print(f"model load time: {args.load_time:.1f}s")
+    print(f"import discord_app: {import_time * 1000:.0f}ms "
+          f"(the old import also blocked {legacy_block:.2f}s on a test generate)")
+    print(f"first fetch after start: {first_fetch * 1000:.0f}ms")
+    print(f"first reply after start: {first_reply:.2f}s: {channel.replies[0]['content'][:60]!r}")
+
+
+if __name__ == "__main__":
+    main()
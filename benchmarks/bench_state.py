@@ -0,0 +1,109 @@
+"""Cost and crash safety of cursor persistence.
+
+Times --updates cursor advances (one update_state per poll batch) with the
+old unbuffered json.dump rewrite, the atomic coalesced state file and the
+SQLite backend. Then SIGKILLs a process that is busy saving state, --kills
+times per mode, and counts how often the state file it leaves behind can no
+longer be parsed.
+
+Usage: python benchmarks/bench_state.py [--updates 2000] [--channels 20] [--kills 20]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+
+def legacy_save_state(state):
+    with open(Config.STATE_FILE, 'w') as f:
+        json.dump(state, f, indent=2)
+
+
+def advance(discord_app, state, channels, updates, save=None):
+    for i in range(updates):
+        channel_id = channels[i % len(channels)]
+        if save is None:
+            discord_app.update_state(state, channel_id, str(10 ** 18 + i))
+        else:
+            state["channels"][channel_id]["last_processed_id"] = str(10 ** 18 + i)
+            save(state)
+
+
+def save_forever(state_file, mode, channels):
+    Config.STATE_FILE = state_file
+    Config.STATE_SAVE_INTERVAL = 0
+    import discord_app
+    state = {"channels": {c: {"last_processed_id": "", "last_reply": ""} for c in channels}, "last_run": ""}
+    save = legacy_save_state if mode == "legacy" else discord_app.save_state
+    while True:
+        advance(discord_app, state, channels, 100, save)
+
+
+def crash_test(mode, kills, channels, tmp):
+    corrupt = 0
+    context = multiprocessing.get_context("spawn")
+    for i in range(kills):
+        state_file = os.path.join(tmp, f"crash-{mode}-{i}.json")
+        process = context.Process(target=save_forever, args=(state_file, mode, channels))
+        process.start()
+        while not os.path.exists(state_file):
+            time.sleep(0.01)
+        time.sleep(random.uniform(0.05, 0.2))
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+        try:
+            with open(state_file) as f:
+                json.load(f)
+        except json.JSONDecodeError:
+            corrupt += 1
+    return corrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--kills", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    Config.DATABASE_FILE = os.path.join(tmp, "bench.db")
+    Config.STATE_FILE = os.path.join(tmp, "state.json")
+    channels = [f"channel-{i}" for i in range(args.channels)]
+    Config.CHANNEL_IDS = channels
+
+    import discord_app
+    from database import init_db, close_db
+    init_db()
+
+    for label, backend, legacy in (("legacy", "file", True), ("file", "file", False), ("sqlite", "sqlite", False)):
+        Config.STATE_BACKEND = backend
+        state = discord_app.load_state()
+        start = time.perf_counter()
+        advance(discord_app, state, channels, args.updates, legacy_save_state if legacy else None)
+        discord_app.flush_state(state)
+        close_db()
+        elapsed = time.perf_counter() - start
+
+        restored = discord_app.load_state()
+        ok = restored["channels"] == state["channels"]
+        print(f"{label:<7} {args.updates} updates in {elapsed * 1000:7.1f}ms "
+              f"({elapsed / args.updates * 1e6:6.1f}us each), restored intact: {ok}")
+        close_db()
+
+    for mode in ("legacy", "file"):
+        corrupt = crash_test(mode, args.kills, channels, tmp)
+        print(f"{mode:<7} killed mid-save {args.kills} times: {corrupt} unreadable state files")
+
+
+if __name__ == "__main__":
+    main()
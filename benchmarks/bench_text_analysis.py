@@ -0,0 +1,101 @@
+"""Language detection and normalization cost per message, old vs. text_analysis.
+
+Runs over a synthetic chat mix: mostly ASCII English with mentions, some
+emoji, Arabic, Persian/Urdu letters the old character set missed, Arabic
+presentation forms and mixed-script messages.
+
+Usage: python benchmarks/bench_text_analysis.py [--messages 20000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+import text_analysis
+
+# (text, expected language)
+CORPUS = [
+    ("<@123456> what's the plan?", "en"),
+    ("<@!123456> are we safe here??", "en"),
+    ("lol that was close", "en"),
+    ("<@123456> how many rounds left", "en"),
+    ("<@123456> did you see that thing 😱", "en"),
+    ("gg 🔥🔥", "en"),
+    ("café at the village, anyone?", "en"),
+    ("<@123456> مرحبا كيف حالك؟", "ar"),
+    ("<@123456> وين نروح الحين", "ar"),
+    ("<@123456> سلام، چطوری؟", "ar"),
+    ("<@123456> یہ کیا ہے", "ar"),
+    ("<@123456> ﻣﺮﺣﺒﺎ", "ar"),
+    ("<@123456> ok ، fine", "en"),
+]
+WEIGHTS = [10, 6, 8, 6, 3, 3, 1, 2, 2, 1, 1, 1, 1]
+
+MENTION_PATTERN = re.compile(r'<@[!&]?\d+>')
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+
+
+def legacy_detect_language(text):
+    """database.detect_language before text_analysis"""
+    arabic_chars = set("ابتثجحخدذرزسشصضطظعغفقكلمنهويةىءأإئؤة")
+    if any(char in arabic_chars for char in text):
+        return "ar"
+    return "en"
+
+
+def legacy_normalize(text):
+    """ResponseCache.normalize before text_analysis"""
+    text = MENTION_PATTERN.sub(' ', text.lower())
+    text = PUNCTUATION_PATTERN.sub(' ', text)
+    return ' '.join(text.split())
+
+
+def timed(label, func, messages, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in messages:
+            func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<28} {best / len(messages) * 1e9:8.0f} ns/message")
+
+
+def accuracy(label, func):
+    wrong = [text for text, expected in CORPUS if func(text) != expected]
+    print(f"{label:<28} {len(CORPUS) - len(wrong)}/{len(CORPUS)} labels correct"
+          + (f", wrong: {wrong}" if wrong else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    messages = [text for text, _ in rng.choices(CORPUS, WEIGHTS, k=args.messages)]
+
+    accuracy("legacy detect", legacy_detect_language)
+    accuracy("text_analysis detect", text_analysis.detect_language)
+    Config.MIXED_LANGUAGE_RATIO = 0.5
+    accuracy("detect, ratio 0.5", text_analysis.detect_language)
+    Config.MIXED_LANGUAGE_RATIO = 0.0
+    print()
+
+    timed("legacy detect", legacy_detect_language, messages, args.repeat)
+    timed("text_analysis detect", text_analysis.detect_language, messages, args.repeat)
+    Config.MIXED_LANGUAGE_RATIO = 0.5
+    timed("detect, ratio 0.5", text_analysis.detect_language, messages, args.repeat)
+    Config.MIXED_LANGUAGE_RATIO = 0.0
+    timed("legacy normalize", legacy_normalize, messages, args.repeat)
+    timed("cached normalize", text_analysis.normalize, messages, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
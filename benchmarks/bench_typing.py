@@ -0,0 +1,83 @@
+"""Typing-indicator POSTs and threads for a burst of replies in one channel.
+
+Runs --replies concurrent replies against benchmarks/fake_discord.py, each
+typing for --hold seconds before its message is posted. "legacy" is the old
+thread-per-reply loop (a typing POST every 2 seconds until the typing time is
+up); "scheduler" is discord_app.typing_scheduler.
+
+Usage: python benchmarks/bench_typing.py [--replies 30] [--hold 4]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from fake_discord import FakeDiscord, make_app, start_in_thread
+
+
+def legacy_typing(discord_app, typing_time):
+    # The old simulate_typing: nothing stopped it once the reply was sent
+    start_time = time.time()
+    while (time.time() - start_time) < typing_time:
+        discord_app.send_typing_indicator(Config.CHANNEL_ID)
+        time.sleep(2)
+
+
+def run(label, discord_app, fake, replies, hold, legacy):
+    channel = fake.channels[Config.CHANNEL_ID]
+    typing_before = channel.typing
+    baseline = peak_threads = threading.active_count()
+    typing_time = hold * 2  # Replies are longer than the time they take
+
+    def reply(n):
+        if legacy:
+            threading.Thread(target=legacy_typing, args=(discord_app, typing_time), daemon=True).start()
+        else:
+            token = discord_app.typing_scheduler.start(Config.CHANNEL_ID, typing_time)
+        time.sleep(hold)
+        discord_app.api_request("POST", discord_app.MESSAGES_ROUTE, Config.CHANNEL_ID,
+                                json={"content": f"reply {n}"}, timeout=10)
+        if not legacy:
+            discord_app.typing_scheduler.stop(token)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(replies) as pool:
+        futures = [pool.submit(reply, n) for n in range(replies)]
+        while not all(f.done() for f in futures):
+            peak_threads = max(peak_threads, threading.active_count())
+            time.sleep(0.05)
+    # Let leftover typing loops run out
+    while time.perf_counter() - start < typing_time + 2:
+        peak_threads = max(peak_threads, threading.active_count())
+        time.sleep(0.1)
+
+    # The reply pool's own threads are the same in both runs
+    print(f"{label:<10} {replies} replies: {channel.typing - typing_before:4d} typing POSTs, "
+          f"peak {peak_threads - baseline - replies} typing threads")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--replies", type=int, default=30)
+    parser.add_argument("--hold", type=float, default=4)
+    parser.add_argument("--port", type=int, default=8783)
+    args = parser.parse_args()
+
+    fake = FakeDiscord([Config.CHANNEL_ID])
+    base = start_in_thread(make_app(fake), args.port)
+    Config.API_BASE = f"{base}/api/v9"
+
+    import discord_app
+    run("legacy", discord_app, fake, args.replies, args.hold, legacy=True)
+    run("scheduler", discord_app, fake, args.replies, args.hold, legacy=False)
+    print(f"scheduler stats: {discord_app.typing_scheduler.schedule.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Split ingestion/generation throughput and exactly-once replies across processes.
+
+Preloads --mentions mentions into benchmarks/fake_discord.py, ingests them
+into a fresh work queue (DEPLOY_ROLE = "ingest") and starts --workers
+generation worker processes. Each generation takes --generation-time seconds,
+standing in for an Ollama server per worker; LLM_WARMUP_TIMEOUT is 0, so
+with no Ollama running it then returns the error reply straight away. With --kill, one worker is
+SIGKILLed part way through so its leased mentions have to be retried by the
+others; every mention must still end up with exactly one reply.
+
+Usage: python benchmarks/bench_workers.py [--mentions 200] [--workers 4]
+                                          [--generation-time 0.2] [--kill]
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from fake_discord import FakeDiscord, make_app, start_in_thread
+
+
+def run_worker(n, generation_time, overrides):
+    # A fresh interpreter, like a worker started with `main.py --role worker`
+    for name, value in overrides.items():
+        setattr(Config, name, value)
+    Config.DEPLOY_ROLE = "worker"
+
+    from discord_app import llm
+    from work_queue import WorkQueue
+    from worker import GenerationWorker
+
+    generate = llm.generate_response
+
+    def slow_generate(*args):
+        time.sleep(generation_time)
+        return generate(*args)
+
+    llm.generate_response = slow_generate
+    GenerationWorker(WorkQueue(), worker_id=f"bench-{n}", threads=1).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mentions", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--generation-time", type=float, default=0.2)
+    parser.add_argument("--kill", action="store_true", help="SIGKILL one worker mid-run")
+    parser.add_argument("--lease", type=float, default=2, help="QUEUE_LEASE for the run")
+    parser.add_argument("--port", type=int, default=8784)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    fake = FakeDiscord([Config.CHANNEL_ID])
+    channel = fake.channels[Config.CHANNEL_ID]
+    channel.preload(args.mentions, mention_every=1)
+    base = start_in_thread(make_app(fake), args.port)
+
+    overrides = {
+        "API_BASE": f"{base}/api/v9",
+        "DATABASE_FILE": os.path.join(tmp, "bench.db"),
+        "STATE_FILE": os.path.join(tmp, "state.json"),
+        "QUEUE_FILE": os.path.join(tmp, "queue.db"),
+        "QUEUE_LEASE": args.lease,
+        "WORKER_POLL_INTERVAL": 0.05,
+        "TYPING_ANIMATION_DELAY": 0,
+        "COOLDOWN_SECONDS": 0,
+        "LLM_WARMUP_TIMEOUT": 0,  # Don't wait for an Ollama that isn't there
+        "GLOBAL_RATE_LIMIT": 10 ** 6  # The fake has no global limit to respect
+    }
+    for name, value in overrides.items():
+        setattr(Config, name, value)
+    Config.DEPLOY_ROLE = "ingest"
+
+    import discord_app
+    from database import init_db
+    init_db()
+    state = discord_app.load_state()
+    discord_app.catch_up(state, {Config.CHANNEL_ID: str(int(channel.messages[0]["id"]) - 1)})
+    print(f"queued: {discord_app.work_queue.stats()}")
+
+    context = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    workers = [context.Process(target=run_worker, args=(n, args.generation_time, overrides), daemon=True)
+               for n in range(args.workers)]
+    for process in workers:
+        process.start()
+
+    killed = False
+    while True:
+        time.sleep(0.05)
+        stats = discord_app.work_queue.stats()
+        if args.kill and not killed and len(channel.replies) >= args.mentions // 3:
+            os.kill(workers[0].pid, signal.SIGKILL)
+            killed = True
+            print(f"killed worker 0 after {len(channel.replies)} replies")
+        if not any(stats.get(status) for status in ("pending", "claimed", "sending")):
+            break
+    elapsed = time.perf_counter() - start
+
+    for process in workers:
+        process.terminate()
+
+    per_mention = Counter(reply["message_reference"]["message_id"] for reply in channel.replies)
+    print(f"done: {discord_app.work_queue.stats()}")
+    # Measured between replies so worker start-up doesn't count
+    received = sorted(reply["received_at"] for reply in channel.replies)
+    print(f"{args.workers} workers: {args.mentions} mentions in {elapsed:.2f}s, "
+          f"{(len(received) - 1) / (received[-1] - received[0]):.1f} replies/s once running")
+    print(f"replies: {len(channel.replies)}, mentions replied once: "
+          f"{sum(1 for count in per_mention.values() if count == 1)}, "
+          f"duplicates: {sum(count - 1 for count in per_mention.values())}, "
+          f"resends dropped by nonce: {channel.deduplicated}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Local stand-in for the Discord REST endpoints the bot uses.
+
+Serves GET/POST /api/v9/channels/{id}/messages and POST .../typing from an
+in-memory channel that can be preloaded with a backlog. With --bucket-limit
+every route/channel pair is a fixed-window rate-limit bucket: responses
+carry X-RateLimit-* headers and requests over the limit get a 429.
+
+Usage: python benchmarks/fake_discord.py [--backlog 5000] [--port 8780]
+                                         [--bucket-limit 5 --bucket-window 5]
+Point the bot at it with Config.API_BASE = "http://127.0.0.1:8780/api/v9".
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+DISCORD_EPOCH_MS = 1420070400000
+
+
+def make_snowflake(timestamp=None, increment=0):
+    ms = int((timestamp if timestamp is not None else time.time()) * 1000)
+    return str(((ms - DISCORD_EPOCH_MS) << 22) | (increment & 0xFFF))
+
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.channel_id = channel_id
+        self.messages = []  # oldest first
+        self.replies = []
+        self.typing = 0
+        self.requests = 0
+        self.nonces = {}  # nonce -> reply, for enforce_nonce
+        self.deduplicated = 0
+        self.counter = 0
+
+    def add(self, author_id, content, mention=False, timestamp=None):
+        self.counter += 1
+        message = {
+            "id": make_snowflake(timestamp, self.counter),
+            "channel_id": self.channel_id,
+            "author": {"id": str(author_id), "username": f"user{author_id}"},
+            "content": f"<@{Config.USER_ID}> {content}" if mention else content,
+            "mentions": [{"id": Config.USER_ID}] if mention else [],
+            "timestamp": time.strftime(
+                "%Y-%m-%dT%H:%M:%S+00:00",
+                time.gmtime(timestamp if timestamp is not None else time.time())
+            )
+        }
+        self.messages.append(message)
+        return message
+
+    def preload(self, count, mention_every=5, start=None, spacing=1.0):
+        """Backlog of count messages, every mention_every-th one a mention"""
+        start = start if start is not None else time.time() - count * spacing
+        for i in range(count):
+            self.add(1000 + i % 13, f"backlog message {i}",
+                     mention=mention_every and i % mention_every == 0,
+                     timestamp=start + i * spacing)
+
+    def page(self, after=None, before=None, limit=50):
+        # Same semantics as Discord: the limit messages right after `after`
+        # (or the latest ones), returned newest first
+        limit = max(1, min(int(limit), 100))
+        if after:
+            after = int(after)
+            selected = [m for m in self.messages if int(m["id"]) > after][:limit]
+        else:
+            candidates = self.messages
+            if before:
+                candidates = [m for m in candidates if int(m["id"]) < int(before)]
+            selected = candidates[-limit:]
+        return list(reversed(selected))
+
+
+class FakeDiscord:
+    def __init__(self, channel_ids, bucket_limit=0, bucket_window=5.0):
+        self.channels = {cid: FakeChannel(cid) for cid in channel_ids}
+        self.bucket_limit = bucket_limit
+        self.bucket_window = bucket_window
+        self.windows = {}  # (route, channel id) -> (window start, count)
+        self.rate_limited = 0
+
+    def limit(self, route, channel_id):
+        """Charge a request to its bucket, returns (headers, retry_after or None)"""
+        if not self.bucket_limit:
+            return {}, None
+
+        now = time.monotonic()
+        start, count = self.windows.get((route, channel_id), (now, 0))
+        if now - start >= self.bucket_window:
+            start, count = now, 0
+        reset_after = self.bucket_window - (now - start)
+
+        headers = {
+            "X-RateLimit-Bucket": "bucket-" + route.lower().replace(' /', '-'),
+            "X-RateLimit-Limit": str(self.bucket_limit),
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}"
+        }
+        if count >= self.bucket_limit:
+            self.rate_limited += 1
+            headers["X-RateLimit-Remaining"] = "0"
+            return headers, reset_after
+
+        self.windows[(route, channel_id)] = (start, count + 1)
+        headers["X-RateLimit-Remaining"] = str(self.bucket_limit - count - 1)
+        return headers, None
+
+    def rate_limited_response(self, headers, retry_after):
+        return web.json_response(
+            {"message": "You are being rate limited.", "retry_after": retry_after, "global": False},
+            status=429,
+            headers={**headers, "Retry-After": str(retry_after)}
+        )
+
+    def channel(self, request):
+        channel = self.channels.get(request.match_info["channel_id"])
+        if channel is None:
+            raise web.HTTPNotFound()
+        channel.requests += 1
+        return channel
+
+    async def get_messages(self, request):
+        channel = self.channel(request)
+        headers, retry_after = self.limit("GET /messages", channel.channel_id)
+        if retry_after is not None:
+            return self.rate_limited_response(headers, retry_after)
+
+        query = request.query
+        return web.json_response(channel.page(
+            after=query.get("after"), before=query.get("before"), limit=query.get("limit", 50)
+        ), headers=headers)
+
+    async def post_message(self, request):
+        channel = self.channel(request)
+        headers, retry_after = self.limit("POST /messages", channel.channel_id)
+        if retry_after is not None:
+            return self.rate_limited_response(headers, retry_after)
+
+        data = await request.json()
+        nonce = data.get("nonce")
+        if data.get("enforce_nonce") and nonce in channel.nonces:
+            # Discord hands back the message already created with this nonce
+            channel.deduplicated += 1
+            return web.json_response(channel.nonces[nonce], headers=headers)
+
+        reply = {
+            "id": make_snowflake(increment=len(channel.replies)),
+            "channel_id": channel.channel_id,
+            "content": data.get("content", ""),
+            "message_reference": data.get("message_reference"),
+            "received_at": time.time()
+        }
+        channel.replies.append(reply)
+        if nonce is not None:
+            channel.nonces[nonce] = reply
+        return web.json_response(reply, headers=headers)
+
+    async def post_typing(self, request):
+        channel = self.channel(request)
+        headers, retry_after = self.limit("POST /typing", channel.channel_id)
+        if retry_after is not None:
+            return self.rate_limited_response(headers, retry_after)
+
+        channel.typing += 1
+        return web.Response(status=204, headers=headers)
+
+    async def stats(self, request):
+        return web.json_response({
+            "rate_limited": self.rate_limited,
+            **{cid: {
+                "messages": len(ch.messages),
+                "replies": len(ch.replies),
+                "typing": ch.typing,
+                "deduplicated": ch.deduplicated,
+                "requests": ch.requests
+            } for cid, ch in self.channels.items()}
+        })
+
+
+def make_app(fake):
+    app = web.Application()
+    app["discord"] = fake
+    app.router.add_get("/api/v9/channels/{channel_id}/messages", fake.get_messages)
+    app.router.add_post("/api/v9/channels/{channel_id}/messages", fake.post_message)
+    app.router.add_post("/api/v9/channels/{channel_id}/typing", fake.post_typing)
+    app.router.add_get("/stats", fake.stats)
+    return app
+
+
+def start_in_thread(app, port):
+    """Serve app on 127.0.0.1:port from a daemon thread, returns the base URL"""
+    started = threading.Event()
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(app, access_log=None)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    started.wait()
+    return f"http://127.0.0.1:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backlog", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--bucket-limit", type=int, default=0, help="requests per bucket window, 0 = unlimited")
+    parser.add_argument("--bucket-window", type=float, default=5.0)
+    args = parser.parse_args()
+
+    fake = FakeDiscord([Config.CHANNEL_ID], args.bucket_limit, args.bucket_window)
+    fake.channels[Config.CHANNEL_ID].preload(args.backlog)
+    web.run_app(make_app(fake), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
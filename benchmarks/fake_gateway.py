@@ -0,0 +1,146 @@
+"""Local stand-in for the Discord gateway that replays recorded events.
+
+Speaks enough of the protocol for gateway.GatewayClient: HELLO, IDENTIFY,
+heartbeats, RESUME (replaying everything after the client's sequence) and
+server-initiated RECONNECT. Events come from a JSONL file of recorded
+dispatches ({"t": "MESSAGE_CREATE", "d": {...}} per line) or are generated.
+
+Usage: python benchmarks/fake_gateway.py [--events recorded.jsonl] [--port 8765]
+                                         [--count 100] [--rate 5] [--reconnect-every 25]
+Point the bot at it with Config.GATEWAY_URL = "ws://127.0.0.1:8765/?v=9&encoding=json".
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+HEARTBEAT_INTERVAL_MS = 41250
+
+
+def synthetic_events(count, mention_every=3):
+    """MESSAGE_CREATE events where every few messages mention the bot"""
+    base = int(time.time() * 1000 - 1420070400000) << 22
+    events = []
+    for i in range(count):
+        mentions = [{"id": Config.USER_ID}] if i % mention_every == 0 else []
+        content = f"<@{Config.USER_ID}> status report {i}" if mentions else f"chatter {i}"
+        events.append({
+            "t": "MESSAGE_CREATE",
+            "d": {
+                "id": str(base + i * 4096),
+                "channel_id": Config.CHANNEL_ID,
+                "author": {"id": str(900 + i % 7), "username": f"user{i % 7}"},
+                "content": content,
+                "mentions": mentions,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+            }
+        })
+    return events
+
+
+class FakeGateway:
+    def __init__(self, events, rate, reconnect_every):
+        self.events = events
+        self.rate = rate
+        self.reconnect_every = reconnect_every
+        self.sessions = {}  # session_id -> next event index
+        self.stats = {"connections": 0, "identifies": 0, "resumes": 0, "heartbeats": 0, "sent": 0}
+
+    async def handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.stats["connections"] += 1
+        await ws.send_json({"op": 10, "d": {"heartbeat_interval": HEARTBEAT_INTERVAL_MS}})
+
+        session_id, position = None, 0
+        replay = None
+        async for msg in ws:
+            payload = json.loads(msg.data)
+            op = payload.get("op")
+
+            if op == 1:
+                self.stats["heartbeats"] += 1
+                await ws.send_json({"op": 11})
+            elif op == 2:
+                self.stats["identifies"] += 1
+                session_id = f"session-{self.stats['identifies']}"
+                host = request.host
+                await ws.send_json({"op": 0, "s": 0, "t": "READY", "d": {
+                    "session_id": session_id,
+                    "resume_gateway_url": f"ws://{host}/"
+                }})
+                position = self.sessions.setdefault(session_id, 0)
+                replay = asyncio.create_task(self.replay(ws, session_id, position))
+            elif op == 6:
+                self.stats["resumes"] += 1
+                session_id = payload["d"]["session_id"]
+                if session_id not in self.sessions:
+                    await ws.send_json({"op": 9, "d": False})
+                    continue
+                # Sequence numbers are event index + 1
+                position = payload["d"]["seq"] or 0
+                replay = asyncio.create_task(self.replay(ws, session_id, position, resumed=True))
+
+        if replay:
+            replay.cancel()
+        return ws
+
+    async def replay(self, ws, session_id, position, resumed=False):
+        if resumed:
+            await ws.send_json({"op": 0, "s": position, "t": "RESUMED", "d": {}})
+        sent = 0
+        while position < len(self.events) and not ws.closed:
+            event = self.events[position]
+            position += 1
+            self.sessions[session_id] = position
+            await ws.send_json({"op": 0, "s": position, **event})
+            self.stats["sent"] += 1
+            sent += 1
+            if self.reconnect_every and sent % self.reconnect_every == 0:
+                await ws.send_json({"op": 7, "d": None})
+                return
+            if self.rate:
+                await asyncio.sleep(1 / self.rate)
+
+    async def stats_handler(self, request):
+        return web.json_response({**self.stats, "events": len(self.events)})
+
+
+def load_events(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_app(events, rate=0, reconnect_every=0):
+    gateway = FakeGateway(events, rate, reconnect_every)
+    app = web.Application()
+    app["gateway"] = gateway
+    app.router.add_get("/", gateway.handle)
+    app.router.add_get("/stats", gateway.stats_handler)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", help="JSONL file of recorded dispatch events")
+    parser.add_argument("--count", type=int, default=100, help="synthetic events if no file")
+    parser.add_argument("--rate", type=float, default=5, help="events per second, 0 = unthrottled")
+    parser.add_argument("--reconnect-every", type=int, default=0,
+                        help="send RECONNECT after this many events to exercise RESUME")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    events = load_events(args.events) if args.events else synthetic_events(args.count)
+    web.run_app(make_app(events, args.rate, args.reconnect_every), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Local stand-in for the Ollama HTTP API with configurable latencies.
+
+Serves /api/ps, /api/tags, /api/generate and /api/chat (streaming or not)
+well enough for the ollama Python client. The first request loads the model
+(--load-time), then every request pays --prefill-time before its first
+token and --token-time per token; at most --parallel requests generate at
+once, like OLLAMA_NUM_PARALLEL. An empty generate prompt only loads the
+model, as with the real server.
+
+Prefill and token times are means: --latency-dist fixed uses them as is,
+uniform spreads each request's times over +-jitter of the mean and
+lognormal draws them with sigma = jitter (same mean, long right tail).
+
+Set FakeOllama.mode to "down" to answer every request with a 503, or to
+"hang" to accept requests and never answer, to exercise failover.
+
+Usage: python benchmarks/fake_ollama.py [--port 11435] [--load-time 5]
+                                        [--prefill-time 0.05] [--token-time 0.02] [--parallel 1]
+                                        [--latency-dist fixed|uniform|lognormal] [--jitter 0.5]
+Point the bot at it with Config.OLLAMA_HOST = "http://127.0.0.1:11435".
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_discord import start_in_thread
+
+REPLY = ("Where's everyone going? Bingo? Stay sharp, this place reeks of trouble "
+         "and I have a bad feeling about the village. Keep your head down and "
+         "watch my back while I check the church.")
+
+
+DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+
+class FakeOllama:
+    def __init__(self, load_time=5.0, prefill_time=0.05, token_time=0.02, parallel=1, reply=REPLY,
+                 latency_dist="fixed", jitter=0.5, seed=None):
+        self.load_time = load_time
+        self.prefill_time = prefill_time
+        self.token_time = token_time
+        self.latency_dist = latency_dist
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.mode = "up"
+        self.slots = asyncio.Semaphore(parallel)
+        self.tokens = reply.split(" ")
+        self.loaded = set()
+        self.loading = {}  # model -> task loading it
+        self.stats = {"requests": 0, "loads": 0, "tokens": 0, "aborted": 0, "in_flight": 0, "max_in_flight": 0}
+
+    async def load(self, model):
+        if model in self.loaded:
+            return 0.0
+        if model not in self.loading:
+            self.loading[model] = asyncio.ensure_future(asyncio.sleep(self.load_time))
+            self.stats["loads"] += 1
+        start = time.perf_counter()
+        await self.loading[model]
+        self.loaded.add(model)
+        return time.perf_counter() - start
+
+    def sample(self, mean):
+        """One request's duration around mean, per latency_dist"""
+        if self.latency_dist == "uniform":
+            return mean * self.random.uniform(max(0.0, 1 - self.jitter), 1 + self.jitter)
+        if self.latency_dist == "lognormal":
+            sigma = self.jitter
+            return mean * self.random.lognormvariate(-sigma * sigma / 2, sigma)
+        return mean
+
+    async def fault(self, request):
+        """Response for a down server, None while up; hangs while mode is "hang" """
+        while self.mode == "hang":
+            await asyncio.sleep(0.1)
+        if self.mode == "down":
+            return web.json_response({"error": "server unavailable"}, status=503)
+        if request.transport is None or request.transport.is_closing():
+            # The client gave up while we hung
+            self.stats["aborted"] += 1
+            return web.Response(status=499)
+        return None
+
+    def chunk(self, kind, model, text, done, **extra):
+        body = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "done": done, **extra}
+        if kind == "chat":
+            body["message"] = {"role": "assistant", "content": text}
+        else:
+            body["response"] = text
+        return body
+
+    async def generate(self, request, kind):
+        data = await request.json()
+        failed = await self.fault(request)
+        if failed is not None:
+            return failed
+        model = data.get("model", "")
+        self.stats["requests"] += 1
+        load_duration = await self.load(model)
+        stream = data.get("stream", True)
+        if kind == "generate" and not data.get("prompt"):
+            return web.json_response(self.chunk(kind, model, "", True, done_reason="load"))
+
+        limit = (data.get("options") or {}).get("num_predict") or len(self.tokens)
+        tokens = self.tokens[:limit]
+        prompt = data.get("prompt") or " ".join(m.get("content", "") for m in data.get("messages", []))
+        prefill_time = self.sample(self.prefill_time)
+        token_time = self.sample(self.token_time)
+        final = {
+            "done_reason": "stop",
+            "load_duration": int(load_duration * 1e9),
+            "prompt_eval_count": len(prompt.split()),
+            "prompt_eval_duration": int(prefill_time * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(len(tokens) * token_time * 1e9)
+        }
+
+        async with self.slots:
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            try:
+                await asyncio.sleep(prefill_time)
+                if not stream:
+                    await asyncio.sleep(len(tokens) * token_time)
+                    self.stats["tokens"] += len(tokens)
+                    return web.json_response(self.chunk(kind, model, " ".join(tokens), True, **final))
+
+                response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+                await response.prepare(request)
+                try:
+                    for i, token in enumerate(tokens):
+                        text = token if i == 0 else " " + token
+                        await response.write((json.dumps(self.chunk(kind, model, text, False)) + "\n").encode())
+                        self.stats["tokens"] += 1
+                        await asyncio.sleep(token_time)
+                    await response.write((json.dumps(self.chunk(kind, model, "", True, **final)) + "\n").encode())
+                except ConnectionResetError:
+                    # The client closed the stream, which aborts generation
+                    self.stats["aborted"] += 1
+                return response
+            finally:
+                self.stats["in_flight"] -= 1
+
+    async def handle_generate(self, request):
+        return await self.generate(request, "generate")
+
+    async def handle_chat(self, request):
+        return await self.generate(request, "chat")
+
+    async def handle_ps(self, request):
+        failed = await self.fault(request)
+        if failed is not None:
+            return failed
+        return web.json_response({"models": [{"name": m, "model": m} for m in sorted(self.loaded)]})
+
+    async def handle_tags(self, request):
+        return web.json_response({"models": []})
+
+    async def handle_stats(self, request):
+        return web.json_response(self.stats)
+
+
+def make_app(fake):
+    app = web.Application()
+    app["ollama"] = fake
+    app.router.add_get("/api/ps", fake.handle_ps)
+    app.router.add_get("/api/tags", fake.handle_tags)
+    app.router.add_post("/api/generate", fake.handle_generate)
+    app.router.add_post("/api/chat", fake.handle_chat)
+    app.router.add_get("/stats", fake.handle_stats)
+    return app
+
+
+def start_fake_ollama(port, **options):
+    """Serve a FakeOllama from a daemon thread, returns (fake, base URL)"""
+    fake = FakeOllama(**options)
+    return fake, start_in_thread(make_app(fake), port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--load-time", type=float, default=5.0)
+    parser.add_argument("--prefill-time", type=float, default=0.05)
+    parser.add_argument("--token-time", type=float, default=0.02)
+    parser.add_argument("--parallel", type=int, default=1)
+    parser.add_argument("--latency-dist", choices=DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    args = parser.parse_args()
+
+    fake = FakeOllama(args.load_time, args.prefill_time, args.token_time, args.parallel,
+                      latency_dist=args.latency_dist, jitter=args.jitter)
+    web.run_app(make_app(fake), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
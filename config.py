@@ -3,13 +3,91 @@ class Config:
     USER_TOKEN = "user_token" 
     USER_ID = "user_id" 
     CHANNEL_ID = "channel_id" 
+    CHANNEL_IDS = []  # Channels served by this process, empty means just CHANNEL_ID 
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)" 
+     
+    # Discord API settings 
+    API_BASE = "https://discord.com/api/v9" 
+    POLL_INTERVAL = 5  # Longest interval between polls of a channel with recent messages 
+    POLL_MIN_INTERVAL = 1  # Seconds between polls of a channel with a new mention or a reply pending 
+    POLL_MAX_INTERVAL = 30  # Quiet channels back off up to this, set all three equal for a fixed interval 
+    POLL_IDLE_AFTER = 120  # Seconds without messages before a channel counts as quiet 
+    POLL_BACKOFF = 2  # Interval multiplier for each poll without a mention 
+    HTTP_POOL_SIZE = 10  # Keep-alive connections shared by all API calls 
+    GLOBAL_RATE_LIMIT = 50  # Requests per second across all routes 
+    RATE_LIMIT_RETRIES = 3  # Retries after an unexpected 429 
+    INGESTION_MODE = "poll"  # "poll" the REST API or "gateway" websocket events (async engine) 
+    CATCHUP_STALE_POLICY = "reply"  # Backlog mentions older than CATCHUP_STALE_MINUTES: "reply", "summarize" or "skip" 
+    CATCHUP_STALE_MINUTES = 30 
+    GATEWAY_URL = "wss://gateway.discord.gg/?v=9&encoding=json" 
+     
+    # Engine settings 
+    ASYNC_MODE = False  # Run the asyncio engine instead of the blocking loop 
+    MAX_CONCURRENT_GENERATIONS = 2  # Generation workers (concurrent Ollama requests) 
+    MAX_CONCURRENT_SENDS = 4  # Discord sends/typing calls in flight (async mode) 
+    GENERATION_QUEUE_SIZE = 50  # Pending mentions before the oldest are dropped 
+    GENERATION_MAX_PER_USER = 3  # Pending mentions kept per user, older ones are coalesced 
+    GENERATION_MAX_WAIT = 60  # Queue latency budget in seconds, staler mentions without a REPLY_DEADLINE are dropped 
+    REPLY_DEADLINE = 90  # Seconds from ingesting a mention to its reply, past it an in-character fallback is sent, 0 = no deadline 
+    DEPLOY_ROLE = "all"  # "all" in one process, or split into "ingest" and "worker" processes sharing QUEUE_FILE 
+    WORKER_ID = ""  # Name a worker holds its leases under, defaults to host-pid 
+    WORKER_POLL_INTERVAL = 0.5  # Seconds an idle worker waits before checking the queue again 
+    QUEUE_LEASE = 120  # Seconds a worker may hold a mention before another worker retries it, keep under Discord's few-minute nonce window 
+    QUEUE_MAX_ATTEMPTS = 3  # Tries per mention before it is marked failed 
+    QUEUE_RETENTION = 86400  # Seconds finished mentions are kept to reject re-ingestion 
      
     # Response settings 
     COOLDOWN_SECONDS = 0.05  # Minimum time between replies 
     TYPING_ANIMATION_DELAY = 0.05  # Seconds per character for typing effect 
+    TYPING_REFRESH_INTERVAL = 8  # Seconds between typing POSTs per channel (Discord shows one for ~10s) 
+    MAX_TYPING_REQUESTS = 2  # Typing POSTs in flight at once 
     MAX_RESPONSE_WORDS = 25  # Maximum words in response 
+    LANGUAGE_SCRIPTS = {"ar": "arabic"}  # Reply language per script (see text_analysis.SCRIPT_RANGES), others get "en" 
+    MIXED_LANGUAGE_RATIO = 0.0  # Share of letters a script needs to pick its language, 0 = any character 
      
     # LLM settings 
     MODEL_NAME = "llama3" 
     TEMPERATURE = 0.6 
     MAX_TOKENS = 240 
+    USE_CHAT_API = True  # Use the chat API so Ollama reuses the cached system prefix 
+    OLLAMA_KEEP_ALIVE = "30m"  # How long Ollama keeps the model loaded between requests 
+    OLLAMA_HOST = ""  # Ollama server for this process (e.g. "http://10.0.0.5:11434"), empty = local default 
+    LLM_WARMUP_TIMEOUT = 120  # Seconds mentions wait for Ollama at startup before generation is tried anyway 
+    LLM_BACKENDS = []  # Ollama endpoints, e.g. [{"host": "http://10.0.0.5:11434", "model": "llama3"}, {"host": "http://10.0.0.6:11434", "model": "llama3.2:1b", "tier": "fast"}], empty = OLLAMA_HOST with MODEL_NAME 
+    LLM_FAST_MAX_WORDS = 0  # Mentions of up to this many words go to "fast" tier backends, 0 = always the main tier 
+    LLM_REQUEST_TIMEOUT = 60  # Seconds a backend may go silent before the request fails over, 0 = wait forever 
+    LLM_HEALTH_INTERVAL = 10  # Seconds between health checks of backends marked down 
+    STREAM_GENERATION = True  # Stream tokens and stop once the word limit is reached 
+    CONVERSATION_HISTORY = True  # Include the user's recent turns in the prompt 
+    HISTORY_MAX_USERS = 1000  # Conversation windows kept in memory 
+    HISTORY_MAX_TURNS = 5  # Turns kept per window 
+    HISTORY_MAX_TOKENS = 400  # Approximate token budget per window 
+    HISTORY_TTL = 1800  # Seconds before an idle window is dropped 
+    RESPONSE_CACHE = True  # Reuse replies for repeated mentions 
+    RESPONSE_CACHE_SIZE = 500  # Cached replies kept in memory 
+    RESPONSE_CACHE_TTL = 3600  # Seconds a cached reply stays valid in memory 
+    RESPONSE_CACHE_MAX_CHARS = 80  # Longer (normalized) messages are never cached 
+    RESPONSE_CACHE_NEAR_DUPLICATES = True  # Also match similar wording 
+    RESPONSE_CACHE_SIMILARITY = 0.75  # Minimum trigram similarity for a near match 
+    RESPONSE_CACHE_PERSISTENT = True  # Fall back to replies saved in the database 
+    RESPONSE_CACHE_DB_TTL = 86400  # Max age in seconds of a reused saved reply 
+    PERSONALITY_PROFILE = "leon_re4" 
+    PERSONALITY_FILE = ""  # Optional JSON profiles added to/overriding personality.PERSONALITIES, reloaded on change 
+    PERSONALITY_RELOAD_INTERVAL = 5  # Seconds between checks of PERSONALITY_FILE 
+     
+    # Storage settings 
+    DATABASE_FILE = "chat_history.db" 
+    QUEUE_FILE = "work_queue.db"  # Mention queue shared by ingest and worker processes 
+    DB_WRITE_BEHIND = True  # Batch save_message inserts on a background writer 
+    DB_BATCH_SIZE = 50  # Rows per write transaction 
+    DB_FLUSH_INTERVAL = 0.5  # Max seconds a saved message waits before commit 
+    STATE_FILE = "bot_state.json" 
+    STATE_BACKEND = "file"  # "file" (atomic JSON rewrite) or "sqlite" (cursors committed with saved messages) 
+    STATE_SAVE_INTERVAL = 5  # Min seconds between state file writes, pending changes are saved on shutdown 
+    LOG_FILE = "bot.log" 
+    EXPORT_CHUNK_SIZE = 5000  # Rows per read when exporting training data 
+    EXPORT_STATE_FILE = "export_state.json"  # Last exported row for export_training.py --incremental 
+    METRICS_ENABLED = False  # Per-stage latency histograms and counters 
+    METRICS_HOST = "127.0.0.1" 
+    METRICS_PORT = 0  # Serve Prometheus text format on /metrics, 0 disables the endpoint 
+    METRICS_LOG_INTERVAL = 300  # Seconds between latency summaries in the log, 0 disables 
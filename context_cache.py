@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from config import Config
+import database
+
+logger = logging.getLogger('ContextCache')
+
+
+def estimate_tokens(text):
+    """Rough token count, good enough for bounding prompt size"""
+    return len(text) // 4 + 1 if text else 0
+
+
+class ConversationWindow:
+    __slots__ = ("turns", "tokens", "touched_at")
+
+    def __init__(self):
+        self.turns = deque()
+        self.tokens = 0
+        self.touched_at = time.monotonic()
+
+    def append(self, user_text, bot_text):
+        self.turns.append({"user": user_text, "bot": bot_text})
+        self.tokens += estimate_tokens(user_text) + estimate_tokens(bot_text)
+
+    def trim(self, max_turns, max_tokens):
+        trimmed = 0
+        while self.turns and (len(self.turns) > max_turns or self.tokens > max_tokens):
+            turn = self.turns.popleft()
+            self.tokens -= estimate_tokens(turn["user"]) + estimate_tokens(turn["bot"])
+            trimmed += 1
+        return trimmed
+
+
+class ConversationCache:
+    """LRU/TTL cache of each user's recent turns, written through to SQLite.
+
+    A user's window is loaded from the database once, on first sight; after
+    that every reply updates the window in memory and persists the message,
+    so prompt building never has to query the database.
+    """
+
+    def __init__(self, max_users=None, max_turns=None, max_tokens=None, ttl=None):
+        self.max_users = max_users or Config.HISTORY_MAX_USERS
+        self.max_turns = max_turns or Config.HISTORY_MAX_TURNS
+        self.max_tokens = max_tokens or Config.HISTORY_MAX_TOKENS
+        self.ttl = ttl or Config.HISTORY_TTL
+
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evicted_lru": 0,
+            "evicted_ttl": 0,
+            "trimmed_turns": 0
+        }
+
+    def get(self, user_id):
+        """Recent turns for user_id, oldest first"""
+        with self._lock:
+            window = self._lookup(user_id)
+            if window is not None:
+                self._stats["hits"] += 1
+                return list(window.turns)
+            self._stats["misses"] += 1
+
+        window = self._load(user_id)
+        with self._lock:
+            # Another thread may have loaded or updated it in the meantime
+            window = self._windows.setdefault(user_id, window)
+            self._windows.move_to_end(user_id)
+            self._evict()
+            return list(window.turns)
+
+    def record(self, message, response, cache_key=None, core_response=None, language=None, append=True):
+        """Append a reply to the user's window and persist it.
+
+        With append=False the message is only persisted.
+        """
+        user_id = message['author']['id']
+        with self._lock:
+            window = self._lookup(user_id) if append else None
+            if window is not None:
+                window.append(message['content'], response)
+                self._stats["trimmed_turns"] += window.trim(self.max_turns, self.max_tokens)
+        # Unknown users are loaded from the database on their next mention
+        return database.save_message(message, response, cache_key, core_response, language)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._windows),
+                "turns": sum(len(w.turns) for w in self._windows.values()),
+                "tokens": sum(w.tokens for w in self._windows.values()),
+                **self._stats
+            }
+
+    def _lookup(self, user_id):
+        window = self._windows.get(user_id)
+        if window is None:
+            return None
+        now = time.monotonic()
+        if now - window.touched_at > self.ttl:
+            del self._windows[user_id]
+            self._stats["evicted_ttl"] += 1
+            return None
+        window.touched_at = now
+        self._windows.move_to_end(user_id)
+        return window
+
+    def _load(self, user_id):
+        window = ConversationWindow()
+        # History comes back newest first
+        for turn in reversed(database.get_conversation_history(user_id, self.max_turns)):
+            if turn["bot"]:
+                window.append(turn["user"], turn["bot"])
+        window.trim(self.max_turns, self.max_tokens)
+        return window
+
+    def _evict(self):
+        while len(self._windows) > self.max_users:
+            self._windows.popitem(last=False)
+            self._stats["evicted_lru"] += 1
+
+
+conversation_cache = ConversationCache()
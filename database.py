@@ -1,104 +1,379 @@
 import sqlite3
 import logging
 import json
+import queue
+import atexit
+import threading
+import time
+from itertools import groupby
 from config import Config
+from metrics import metrics
+from text_analysis import detect_language
 
 logger = logging.getLogger('Database')
 
+# Statements are kept as constants so sqlite3's per-connection statement
+# cache reuses the prepared statement on every call
+INSERT_MESSAGE = '''INSERT OR IGNORE INTO messages
+                    (id, user_id, content, language, response, channel_id, snowflake,
+                     cache_key, core_response)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+
+# Served by idx_messages_user_time, snowflake breaks same-second ties
+SELECT_HISTORY = '''SELECT content, response
+                    FROM messages
+                    WHERE user_id = ?
+                    ORDER BY timestamp DESC, snowflake DESC
+                    LIMIT ?'''
+
+UPSERT_CONTEXT = '''INSERT OR REPLACE INTO personality_context
+                    (user_id, last_context, personality_traits)
+                    VALUES (?, ?, ?)'''
+
+SELECT_CACHED_RESPONSE = '''SELECT core_response
+                            FROM messages
+                            WHERE cache_key = ?
+                            AND timestamp >= datetime('now', ?)
+                            ORDER BY snowflake DESC
+                            LIMIT 1'''
+
+UPSERT_CHANNEL_STATE = '''INSERT OR REPLACE INTO channel_state
+                          (channel_id, last_processed_id, last_reply, updated_at)
+                          VALUES (?, ?, ?, ?)'''
+
+SELECT_CHANNEL_STATE = '''SELECT channel_id, last_processed_id, last_reply, updated_at
+                          FROM channel_state'''
+
+SELECT_CONTEXT = '''SELECT last_context, personality_traits
+                    FROM personality_context
+                    WHERE user_id = ?'''
+
+# Keyset pagination on seq, so each chunk is a short indexed range read
+SELECT_TRAINING_CHUNK = '''SELECT m.seq, m.content, m.response, pc.personality_traits
+                           FROM messages m
+                           LEFT JOIN personality_context pc ON m.user_id = pc.user_id
+                           WHERE m.seq > ? AND m.response IS NOT NULL
+                           AND (? IS NULL OR m.timestamp >= ?)
+                           ORDER BY m.seq
+                           LIMIT ?'''
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456"
+)
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+_writer = None
+
+def get_connection():
+    """Return this thread's persistent connection, opening it on first use"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(
+            Config.DATABASE_FILE,
+            timeout=30,
+            cached_statements=128,
+            check_same_thread=False  # Only so close_db() can close it
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+class MessageWriter:
+    """Write-behind queue that batches save_message inserts.
+
+    Rows are grouped into one transaction per DB_BATCH_SIZE rows or per
+    DB_FLUSH_INTERVAL seconds, whichever comes first. Writes are applied in
+    the order they were queued, so a cursor saved after some messages is
+    never committed without them.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, row, statement=INSERT_MESSAGE):
+        self.queue.put((statement, row))
+
+    def flush(self):
+        """Block until every queued row is committed"""
+        self.queue.join()
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        running = True
+        while running:
+            row = self.queue.get()
+            if row is None:
+                self.queue.task_done()
+                break
+
+            batch = [row]
+            while len(batch) < Config.DB_BATCH_SIZE:
+                try:
+                    row = self.queue.get(timeout=Config.DB_FLUSH_INTERVAL)
+                except queue.Empty:
+                    break
+                if row is None:
+                    running = False
+                    self.queue.task_done()
+                    break
+                batch.append(row)
+
+            self._write(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def _write(self, batch):
+        start = time.monotonic()
+        try:
+            conn = get_connection()
+            with conn:
+                # Consecutive rows of the same statement go in one executemany
+                for statement, rows in groupby(batch, key=lambda item: item[0]):
+                    conn.executemany(statement, [row for _, row in rows])
+            metrics.observe("db_write", time.monotonic() - start)
+            metrics.inc("db_rows", len(batch))
+        except Exception as e:
+            logger.error(f"Failed to save {len(batch)} messages: {e}")
+
+def _get_writer():
+    global _writer
+    if _writer is None:
+        with _connections_lock:
+            if _writer is None:
+                _writer = MessageWriter()
+    return _writer
+
+def flush():
+    """Commit all pending write-behind inserts"""
+    if _writer is not None:
+        _writer.flush()
+
+def close_db():
+    """Flush pending writes and close every open connection"""
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+    with _connections_lock:
+        for conn in _connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.warning(f"Error closing connection: {e}")
+        _connections.clear()
+    _local.__dict__.clear()
+
+atexit.register(close_db)
+
+def _create_base_tables(c):
+    # Messages table
+    c.execute('''CREATE TABLE IF NOT EXISTS messages
+                 (id TEXT PRIMARY KEY,
+                  timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                  user_id TEXT,
+                  content TEXT,
+                  language TEXT,
+                  response TEXT)''')
+
+    # Personality context table
+    c.execute('''CREATE TABLE IF NOT EXISTS personality_context
+                 (user_id TEXT PRIMARY KEY,
+                  last_context TEXT,
+                  personality_traits TEXT)''')
+
+def _add_channel_and_history_index(c):
+    c.execute("ALTER TABLE messages ADD COLUMN channel_id TEXT")
+    c.execute("ALTER TABLE messages ADD COLUMN snowflake INTEGER")
+    # Discord ids are snowflakes, so their integer value orders messages
+    c.execute("UPDATE messages SET snowflake = CAST(id AS INTEGER)")
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_messages_user_time
+                 ON messages (user_id, timestamp, snowflake)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_messages_channel
+                 ON messages (channel_id, snowflake)''')
+
+def _add_response_cache_columns(c):
+    c.execute("ALTER TABLE messages ADD COLUMN cache_key TEXT")
+    c.execute("ALTER TABLE messages ADD COLUMN core_response TEXT")
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_messages_cache_key
+                 ON messages (cache_key, snowflake)
+                 WHERE cache_key IS NOT NULL''')
+
+def _add_channel_state(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS channel_state
+                 (channel_id TEXT PRIMARY KEY,
+                  last_processed_id TEXT,
+                  last_reply TEXT,
+                  updated_at TEXT)''')
+
+def _add_message_sequence(c):
+    # The implicit rowid of a table with a TEXT primary key can be renumbered
+    # by VACUUM, an INTEGER PRIMARY KEY can't. SQLite has no ALTER for that,
+    # so the table is rebuilt; seq starts as the old rowid so incremental
+    # export state carries over.
+    c.execute('''CREATE TABLE messages_new
+                 (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                  id TEXT NOT NULL UNIQUE,
+                  timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                  user_id TEXT,
+                  content TEXT,
+                  language TEXT,
+                  response TEXT,
+                  channel_id TEXT,
+                  snowflake INTEGER,
+                  cache_key TEXT,
+                  core_response TEXT)''')
+    c.execute('''INSERT INTO messages_new
+                 (seq, id, timestamp, user_id, content, language, response,
+                  channel_id, snowflake, cache_key, core_response)
+                 SELECT rowid, id, timestamp, user_id, content, language, response,
+                        channel_id, snowflake, cache_key, core_response
+                 FROM messages ORDER BY rowid''')
+    c.execute("DROP TABLE messages")
+    c.execute("ALTER TABLE messages_new RENAME TO messages")
+    c.execute('''CREATE INDEX idx_messages_user_time
+                 ON messages (user_id, timestamp, snowflake)''')
+    c.execute('''CREATE INDEX idx_messages_channel
+                 ON messages (channel_id, snowflake)''')
+    c.execute('''CREATE INDEX idx_messages_cache_key
+                 ON messages (cache_key, snowflake)
+                 WHERE cache_key IS NOT NULL''')
+
+# Schema versions, applied in order and tracked in PRAGMA user_version.
+# Never edit a released migration, append a new one instead.
+MIGRATIONS = [
+    (1, "base tables", _create_base_tables),
+    (2, "channel column, snowflake ordering and history index", _add_channel_and_history_index),
+    (3, "response cache columns", _add_response_cache_columns),
+    (4, "channel state table", _add_channel_state),
+    (5, "stable message sequence for exports", _add_message_sequence),
+]
+
+def migrate(conn):
+    """Bring the schema up to the latest version in place"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, description, apply in MIGRATIONS:
+        if number <= version:
+            continue
+        c = conn.cursor()
+        # Ingest and worker processes migrate at startup too. IMMEDIATE takes
+        # the write lock up front, and the version is read again under it in
+        # case another process applied this step while we waited.
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            if c.execute("PRAGMA user_version").fetchone()[0] >= number:
+                conn.rollback()
+                continue
+            apply(c)
+            c.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info(f"Applied migration {number}: {description}")
+
 def init_db():
     try:
-        conn = sqlite3.connect(Config.DATABASE_FILE)
-        c = conn.cursor()
-        
-        # Messages table
-        c.execute('''CREATE TABLE IF NOT EXISTS messages
-                     (id TEXT PRIMARY KEY, 
-                      timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                      user_id TEXT, 
-                      content TEXT, 
-                      language TEXT,
-                      response TEXT)''')
-        
-        # Personality context table
-        c.execute('''CREATE TABLE IF NOT EXISTS personality_context
-                     (user_id TEXT PRIMARY KEY,
-                      last_context TEXT,
-                      personality_traits TEXT)''')
-        
-        conn.commit()
+        migrate(get_connection())
         logger.info("Database initialized")
     except Exception as e:
         logger.error(f"Database error: {e}")
-    finally:
-        conn.close()
 
-def save_message(message, response=None):
+def save_message(message, response=None, cache_key=None, core_response=None, language=None):
     try:
-        conn = sqlite3.connect(Config.DATABASE_FILE)
-        c = conn.cursor()
-        c.execute('''INSERT OR IGNORE INTO messages 
-                     (id, user_id, content, language, response)
-                     VALUES (?, ?, ?, ?, ?)''',
-                 (message['id'], 
-                  message['author']['id'],
-                  message['content'],
-                  detect_language(message['content']),
-                  response))
-        conn.commit()
+        row = (message['id'],
+               message['author']['id'],
+               message['content'],
+               language or detect_language(message['content']),
+               response,
+               message.get('channel_id'),
+               int(message['id']),
+               cache_key,
+               core_response)
+        if Config.DB_WRITE_BEHIND:
+            _get_writer().put(row)
+        else:
+            start = time.monotonic()
+            conn = get_connection()
+            with conn:
+                conn.execute(INSERT_MESSAGE, row)
+            metrics.observe("db_write", time.monotonic() - start)
+            metrics.inc("db_rows")
         return True
     except Exception as e:
         logger.error(f"Failed to save message: {e}")
         return False
-    finally:
-        conn.close()
 
-def detect_language(text):
-    arabic_chars = set("ابتثجحخدذرزسشصضطظعغفقكلمنهويةىءأإئؤة")
-    return "ar" if any(char in arabic_chars for char in text) else "en"
+def save_channel_state(channel_id, last_processed_id, last_reply, updated_at):
+    """Save a channel's cursor, queued behind any messages saved before it"""
+    try:
+        row = (channel_id, last_processed_id, last_reply, updated_at)
+        if Config.DB_WRITE_BEHIND:
+            _get_writer().put(row, UPSERT_CHANNEL_STATE)
+        else:
+            conn = get_connection()
+            with conn:
+                conn.execute(UPSERT_CHANNEL_STATE, row)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to save channel state: {e}")
+        return False
+
+def load_channel_states():
+    """Saved channel states as {channel id: (last processed id, last reply, updated at)}"""
+    flush()
+    rows = get_connection().execute(SELECT_CHANNEL_STATE).fetchall()
+    return {row[0]: row[1:] for row in rows}
 
 def get_conversation_history(user_id, limit=5):
     """Get recent conversation history for a user"""
     try:
-        conn = sqlite3.connect(Config.DATABASE_FILE)
-        c = conn.cursor()
-        c.execute('''SELECT content, response 
-                     FROM messages 
-                     WHERE user_id = ? 
-                     ORDER BY timestamp DESC 
-                     LIMIT ?''', (user_id, limit))
+        c = get_connection().execute(SELECT_HISTORY, (user_id, limit))
         rows = c.fetchall()
         return [{"user": row[0], "bot": row[1]} for row in rows] if rows else []
     except Exception as e:
         logger.error(f"Error fetching history: {e}")
         return []
-    finally:
-        conn.close()
+
+def get_cached_response(cache_key, max_age):
+    """Most recent core reply saved under cache_key within max_age seconds"""
+    try:
+        row = get_connection().execute(
+            SELECT_CACHED_RESPONSE, (cache_key, f"-{int(max_age)} seconds")
+        ).fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error(f"Error fetching cached response: {e}")
+        return None
 
 def save_personality_context(user_id, context, traits):
     """Save personality context for a user"""
     try:
-        conn = sqlite3.connect(Config.DATABASE_FILE)
-        c = conn.cursor()
-        c.execute('''INSERT OR REPLACE INTO personality_context 
-                     (user_id, last_context, personality_traits) 
-                     VALUES (?, ?, ?)''',
-                 (user_id, json.dumps(context), json.dumps(traits)))
-        conn.commit()
+        conn = get_connection()
+        with conn:
+            conn.execute(UPSERT_CONTEXT, (user_id, json.dumps(context), json.dumps(traits)))
         return True
     except Exception as e:
         logger.error(f"Error saving context: {e}")
         return False
-    finally:
-        conn.close()
 
 def get_personality_context(user_id):
     """Get saved personality context for a user"""
     try:
-        conn = sqlite3.connect(Config.DATABASE_FILE)
-        c = conn.cursor()
-        c.execute('''SELECT last_context, personality_traits 
-                     FROM personality_context 
-                     WHERE user_id = ?''', (user_id,))
+        c = get_connection().execute(SELECT_CONTEXT, (user_id,))
         row = c.fetchone()
         if row:
             return {
@@ -109,35 +384,48 @@ def get_personality_context(user_id):
     except Exception as e:
         logger.error(f"Error loading context: {e}")
         return None
-    finally:
-        conn.close()
+
+def iter_training_rows(after_seq=0, since=None, chunk_size=None):
+    """Yield chunks of (seq, prompt, response, traits JSON) for messages with a response.
+
+    Rows come oldest first in lists of up to EXPORT_CHUNK_SIZE. Every chunk
+    is its own short read starting after the last seq, so memory stays at
+    one chunk and a long export never holds a read transaction open against
+    the bot's writes. after_seq resumes an earlier export; since (a
+    "YYYY-MM-DD HH:MM:SS" UTC timestamp) skips older messages.
+    """
+    flush()
+    chunk_size = chunk_size or Config.EXPORT_CHUNK_SIZE
+    conn = get_connection()
+    # Exports read seq, which a database the bot hasn't opened since may lack
+    migrate(conn)
+    while True:
+        rows = conn.execute(SELECT_TRAINING_CHUNK, (after_seq, since, since, chunk_size)).fetchall()
+        if not rows:
+            return
+        yield rows
+        after_seq = rows[-1][0]
+
+def iter_training_data(after_seq=0, since=None, chunk_size=None):
+    """Yield {'prompt', 'response', 'personality_traits'} dicts one at a time"""
+    for rows in iter_training_rows(after_seq, since, chunk_size):
+        for _, prompt, response, traits in rows:
+            yield {
+                "prompt": prompt,
+                "response": response,
+                "personality_traits": json.loads(traits) if traits else {}
+            }
 
 def get_training_data():
     """
     Fetch all messages with responses and associated personality traits for training.
     Returns list of dicts: {'prompt', 'response', 'personality_traits'}
+
+    Holds everything in memory, use iter_training_data or export_training.py
+    for large histories.
     """
     try:
-        conn = sqlite3.connect(Config.DATABASE_FILE)
-        c = conn.cursor()
-        # Join messages with personality_context to get traits for each message's user
-        c.execute('''
-            SELECT m.content, m.response, pc.personality_traits
-            FROM messages m
-            LEFT JOIN personality_context pc ON m.user_id = pc.user_id
-            WHERE m.response IS NOT NULL
-        ''')
-        rows = c.fetchall()
-        conn.close()
-
-        return [
-            {
-                "prompt": row[0],
-                "response": row[1],
-                "personality_traits": json.loads(row[2]) if row[2] else {}
-            }
-            for row in rows
-        ]
+        return list(iter_training_data())
     except Exception as e:
         logger.error(f"Error fetching training data: {e}")
-        return []
\ No newline at end of file
+        return []
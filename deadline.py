@@ -0,0 +1,52 @@
+import time
+
+from config import Config
+from metrics import metrics
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage):
+        super().__init__(f"Reply deadline passed during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """Time budget of one mention, from ingestion until its reply is sent.
+
+    Stages pass remaining() on as their timeout and long-running ones poll
+    expired() to stop early. The first stage to notice the deadline has
+    passed calls miss(), which counts it once as deadline_misses_<stage>.
+    """
+
+    __slots__ = ("expires_at", "missed")
+
+    def __init__(self, seconds=None):
+        seconds = Config.REPLY_DEADLINE if seconds is None else seconds
+        self.expires_at = time.monotonic() + seconds if seconds else None
+        self.missed = None
+
+    def remaining(self):
+        """Seconds left, None without a deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    @property
+    def fallback(self):
+        """True if the deadline passed before the reply was generated, so
+        the mention is answered with the fallback"""
+        return self.missed in ("queue", "generation")
+
+    def miss(self, stage):
+        if self.missed is None:
+            self.missed = stage
+            metrics.inc(f"deadline_misses_{stage}")
+
+    def check(self, stage):
+        """Raise DeadlineExceeded if the deadline passed before or during stage"""
+        if self.expired():
+            self.miss(stage)
+            raise DeadlineExceeded(stage)
@@ -1,51 +1,198 @@
 import requests
+import glob
 import json
+import os
+import tempfile
 import time
 import logging
-import threading
-from datetime import datetime, timedelta
-from typing import TypedDict
+from concurrent.futures import CancelledError, TimeoutError
+from datetime import datetime, timedelta, timezone
+from typing import Dict, TypedDict
 
 from llm_handler import LLMHandler
-from database import init_db, save_message, detect_language
+from database import init_db, close_db, save_channel_state, load_channel_states
+from text_analysis import detect_language
+from context_cache import conversation_cache
+from ratelimit import rate_limiter
+from work_queue import WorkQueue
+from typing_indicator import TypingScheduler
+from metrics import metrics
+from polling import PollSchedule
+from deadline import Deadline
 from config import Config
 
 logger = logging.getLogger('DiscordApp')
 llm = LLMHandler()
 
-# Global state for cooldown management
-last_reply_time = None
-typing_animations = {}
+# One keep-alive session shared by every API call instead of a fresh
+# connection per request
+session = requests.Session()
+session.mount("https://", requests.adapters.HTTPAdapter(
+    pool_connections=Config.HTTP_POOL_SIZE,
+    pool_maxsize=Config.HTTP_POOL_SIZE
+))
+
+POLL_LIMIT = 10  # Messages per regular poll
+PAGE_SIZE = 100  # Largest page Discord returns, used to catch up
+REPLY_SEARCH_PAGES = 5  # Pages after a mention searched for a reply that may already be posted
+
+# Routes as Discord buckets them, the channel id is the major parameter
+MESSAGES_ROUTE = "/channels/{channel_id}/messages"
+TYPING_ROUTE = "/channels/{channel_id}/typing"
+DISCORD_EPOCH_MS = 1420070400000
+
+# Ingest-only processes hand mentions to the generation workers (worker.py)
+work_queue = WorkQueue() if Config.DEPLOY_ROLE == "ingest" else None
+
+def channel_ids():
+    """Channels this process serves: CHANNEL_IDS, or just CHANNEL_ID"""
+    return [str(channel_id) for channel_id in (Config.CHANNEL_IDS or [Config.CHANNEL_ID])]
 
 # Define safe state structure
-class BotState(TypedDict):
+class ChannelState(TypedDict):
     last_processed_id: str
+    last_reply: str  # When we last replied here, for the cooldown
+
+class BotState(TypedDict):
+    channels: Dict[str, ChannelState]
     last_run: str
 
-def load_state() -> BotState:
+# Channels changed since the last save, and when that was
+_dirty_channels = set()
+_state_saved_at = 0.0
+
+def read_state_file():
+    # Temp files left by a crash in the middle of write_json_atomic
+    for leftover in glob.glob(os.path.join(
+        os.path.dirname(os.path.abspath(Config.STATE_FILE)), f".{os.path.basename(Config.STATE_FILE)}.*.tmp"
+    )):
+        try:
+            os.unlink(leftover)
+        except OSError:
+            pass
+
     try:
         with open(Config.STATE_FILE, 'r') as f:
-            raw_state = json.load(f)
-            return {
-                "last_processed_id": str(raw_state.get("last_processed_id", "")),
-                "last_run": str(raw_state.get("last_run", ""))
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"State file {Config.STATE_FILE} is unreadable, starting without cursors: {e}")
+        return {}
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file beside path, fsync it and rename it over path,
+    so a crash leaves either the old file or the new one, never half of it"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def load_state() -> BotState:
+    raw_state = read_state_file()
+    raw_channels = raw_state.get("channels")
+    if not isinstance(raw_channels, dict):
+        # Single-channel state files only had the one cursor
+        raw_channels = {Config.CHANNEL_ID: {"last_processed_id": raw_state.get("last_processed_id", "")}}
+
+    if Config.STATE_BACKEND == "sqlite":
+        saved = load_channel_states()
+        # Until the first save the file's cursors carry over
+        if saved:
+            raw_channels = {
+                channel_id: {"last_processed_id": last_processed_id, "last_reply": last_reply}
+                for channel_id, (last_processed_id, last_reply, _) in saved.items()
             }
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {
-            "last_processed_id": "",
-            "last_run": ""
+            raw_state["last_run"] = max(updated_at or "" for _, _, updated_at in saved.values())
+
+    channels = {}
+    for channel_id in {*raw_channels, *channel_ids()}:
+        raw_channel = raw_channels.get(channel_id) or {}
+        channels[str(channel_id)] = {
+            "last_processed_id": str(raw_channel.get("last_processed_id") or ""),
+            "last_reply": str(raw_channel.get("last_reply") or "")
         }
+    _dirty_channels.update(channels)
+    return {
+        "channels": channels,
+        "last_run": str(raw_state.get("last_run", ""))
+    }
 
 def save_state(state: BotState) -> None:
+    """Persist state now, to the state file or (STATE_BACKEND = "sqlite") as
+    channel_state rows queued behind the messages saved before them"""
+    global _state_saved_at
     try:
-        with open(Config.STATE_FILE, 'w') as f:
-            json.dump(state, f, indent=2)
+        if Config.STATE_BACKEND == "sqlite":
+            for channel_id in _dirty_channels:
+                channel = state["channels"][channel_id]
+                save_channel_state(channel_id, channel["last_processed_id"], channel["last_reply"], state["last_run"])
+        else:
+            write_json_atomic(Config.STATE_FILE, state)
+        _dirty_channels.clear()
+        _state_saved_at = time.monotonic()
     except Exception as e:
         logger.error(f"Error saving state: {e}")
 
-def fetch_messages(after=None):
+def flush_state(state: BotState, force=True) -> None:
+    """Save pending changes. Unless forced, state file writes are coalesced
+    to one per STATE_SAVE_INTERVAL; the database writer batches on its own."""
+    if not _dirty_channels:
+        return
+    if force or Config.STATE_BACKEND == "sqlite" or time.monotonic() - _state_saved_at >= Config.STATE_SAVE_INTERVAL:
+        save_state(state)
+
+def update_state(state: BotState, channel_id, last_processed_id) -> None:
+    state["channels"][channel_id]["last_processed_id"] = str(last_processed_id) if last_processed_id else ""
+    state["last_run"] = datetime.now().isoformat()
+    _dirty_channels.add(channel_id)
+    flush_state(state, force=False)
+
+def api_request(method, route, channel_id, deadline=None, **kwargs):
+    """Send a request through the shared rate limiter.
+
+    Waits for the route's bucket before sending, and retries a 429 at most
+    RATE_LIMIT_RETRIES times; the last response is returned either way.
+    A wait on the limiter that runs past the deadline counts as a send-stage
+    miss, the request still goes out.
+    """
+    route_key = f"{method} {route}"
+    url = f"{Config.API_BASE}{route.format(channel_id=channel_id)}"
+
+    for _ in range(Config.RATE_LIMIT_RETRIES + 1):
+        remaining = deadline.remaining() if deadline is not None else None
+        if not rate_limiter.acquire(route_key, channel_id, remaining):
+            # A finished reply is still sent, late beats never
+            deadline.miss("send")
+            deadline = None
+            rate_limiter.acquire(route_key, channel_id)
+        response = session.request(method, url, **kwargs)
+
+        body = None
+        if response.status_code == 429:
+            try:
+                body = response.json()
+            except ValueError:
+                pass
+        retry_after = rate_limiter.update(route_key, channel_id, response.status_code, response.headers, body)
+        if retry_after is None:
+            break
+        logger.warning(f"Rate limited on {route_key}. Retrying after {retry_after}s")
+    return response
+
+def fetch_messages(channel_id, after=None, limit=POLL_LIMIT):
     try:
-        params = {"limit": 10}
+        params = {"limit": limit}
         if after:
             params["after"] = after
 
@@ -55,69 +202,211 @@ def fetch_messages(after=None):
             "Content-Type": "application/json"
         }
 
-        response = requests.get(
-            f"https://discord.com/api/v9/channels/{Config.CHANNEL_ID}/messages",
+        response = api_request(
+            "GET", MESSAGES_ROUTE, channel_id,
             headers=headers,
             params=params,
             timeout=15
         )
 
-        if response.status_code == 429:
-            retry_after = response.json().get('retry_after', 5)
-            logger.warning(f"Rate limited. Retrying after {retry_after}s")
-            time.sleep(retry_after)
-            return fetch_messages(after)
-
         response.raise_for_status()
-        return response.json()
+        return decode_messages(response.content)
     except Exception as e:
         logger.error(f"Fetch error: {e}")
         return []
 
-def send_typing_indicator():
-    try:
-        headers = {
-            "Authorization": Config.USER_TOKEN,
-            "User-Agent": Config.USER_AGENT
-        }
-
-        requests.post(
-            f"https://discord.com/api/v9/channels/{Config.CHANNEL_ID}/typing",
+class MessagePage(list):
+    """Fetched messages, newest first, flagged when none can mention us"""
+    may_mention = True
+
+def decode_messages(body):
+    """Parse a messages response body.
+
+    A mention carries our id in the message's mentions, so a body that
+    doesn't contain it anywhere can't hold one. Such pages are flagged and
+    queue_mentions only moves the cursor past them.
+    """
+    messages = json.loads(body)
+    if not isinstance(messages, list):
+        return messages
+    page = MessagePage(messages)
+    page.may_mention = Config.USER_ID.encode() in body
+    return page
+
+def mentions_bot(msg):
+    return any(str(mention.get("id")) == Config.USER_ID for mention in msg.get("mentions", []))
+
+def has_mention(messages):
+    return getattr(messages, "may_mention", True) and any(mentions_bot(msg) for msg in messages)
+
+def snowflake_time(message_id):
+    """When a Discord id was created, as a UTC datetime"""
+    ms = (int(message_id) >> 22) + DISCORD_EPOCH_MS
+    return datetime.fromtimestamp(ms / 1000, timezone.utc)
+
+def message_age(message_id):
+    """Seconds since a Discord id was created"""
+    return time.time() - snowflake_time(message_id).timestamp()
+
+def iter_backlog(channel_id, after):
+    """Yield everything posted after `after`, one page (newest first) at a time"""
+    while True:
+        page = fetch_messages(channel_id, after, limit=PAGE_SIZE)
+        if not page:
+            return
+        page.sort(key=lambda m: int(m['id']), reverse=True)
+        yield page
+        if len(page) < PAGE_SIZE:
+            return
+        after = page[0]['id']
+
+def find_reply(message):
+    """Our reply to message if one was posted, looked for in the
+    REPLY_SEARCH_PAGES pages after it. Raises if a page can't be fetched."""
+    headers = {
+        "Authorization": Config.USER_TOKEN,
+        "User-Agent": Config.USER_AGENT,
+        "Content-Type": "application/json"
+    }
+    after = message['id']
+    for _ in range(REPLY_SEARCH_PAGES):
+        response = api_request(
+            "GET", MESSAGES_ROUTE, message['channel_id'],
             headers=headers,
-            timeout=5
+            params={"limit": PAGE_SIZE, "after": after},
+            timeout=15
         )
-    except Exception as e:
-        logger.warning(f"Typing indicator failed: {e}")
-
-def simulate_typing(response, message_id):
-    global typing_animations
-    session_id = f"{Config.CHANNEL_ID}-{message_id}"
-    typing_animations[session_id] = True
-
-    typing_time = len(response) * Config.TYPING_ANIMATION_DELAY
+        response.raise_for_status()
+        page = json.loads(response.content)
+        for msg in page:
+            reference = msg.get('message_reference') or {}
+            if (str(msg.get('author', {}).get('id')) == Config.USER_ID
+                    and str(reference.get('message_id')) == str(message['id'])):
+                return msg
+        if len(page) < PAGE_SIZE:
+            return None
+        after = max(page, key=lambda m: int(m['id']))['id']
+    return None
+
+def split_stale(page, cutoff, stale):
+    """Apply CATCHUP_STALE_POLICY to mentions older than cutoff.
+
+    Returns the messages to process normally; with the "summarize" policy
+    stale mentions are collected per author in `stale` instead.
+    """
+    if Config.CATCHUP_STALE_POLICY == "reply" or not getattr(page, "may_mention", True):
+        return page
+
+    fresh = []
+    for msg in page:
+        if mentions_bot(msg) and snowflake_time(msg['id']) < cutoff:
+            if Config.CATCHUP_STALE_POLICY == "summarize":
+                stale.setdefault(msg['author']['id'], []).append(msg)
+            continue
+        fresh.append(msg)
+    return fresh
+
+def summarize_stale(stale):
+    """One mention per author, carrying everything they said while we were away"""
+    summaries = []
+    for messages in stale.values():
+        messages.sort(key=lambda m: int(m['id']))
+        latest = dict(messages[-1])
+        latest['content'] = "\n".join(m['content'] for m in messages)
+        summaries.append(latest)
+    # Newest first, like a fetched page
+    return sorted(summaries, key=lambda m: int(m['id']), reverse=True)
+
+def catch_up(state: BotState, cursors):
+    """Work through every channel's backlog since its cursor, in order.
+
+    cursors maps channel id -> last processed id. Channels take turns a page
+    at a time so a busy one can't hold up the others. Returns replies sent.
+    """
     start_time = time.time()
-
-    while typing_animations.get(session_id) and (time.time() - start_time) < typing_time:
-        send_typing_indicator()
-        time.sleep(2)
-
-    typing_animations.pop(session_id, None)
-
-def send_reply(original_message, reply_text):
-    """Send reply mentioning the original author"""
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=Config.CATCHUP_STALE_MINUTES)
+    backlogs = {channel_id: iter_backlog(channel_id, after) for channel_id, after in cursors.items()}
+    stale = {channel_id: {} for channel_id in cursors}
+    pages = total = replied = 0
+
+    while backlogs:
+        pending = []
+        for channel_id, backlog in list(backlogs.items()):
+            page = next(backlog, None)
+            if page is None:
+                del backlogs[channel_id]
+                continue
+
+            queued, _ = queue_mentions(
+                state, channel_id, split_stale(page, cutoff, stale[channel_id]), cursors[channel_id]
+            )
+            pending.extend(queued)
+            cursors[channel_id] = page[0]['id']
+            pages += 1
+            total += len(page)
+
+        replied += send_replies(state, pending)
+        for channel_id in backlogs:
+            update_state(state, channel_id, cursors[channel_id])
+
+    for channel_id, authors in stale.items():
+        if authors:
+            new_count, _ = process_messages(state, channel_id, summarize_stale(authors), None)
+            replied += new_count
+
+    if pages:
+        logger.info(
+            f"Caught up on {total} messages in {pages} pages across {len(cursors)} channels "
+            f"({replied} replies) in {time.time() - start_time:.1f}s"
+        )
+    return replied
+
+def send_typing_indicator(channel_id):
+    headers = {
+        "Authorization": Config.USER_TOKEN,
+        "User-Agent": Config.USER_AGENT
+    }
+
+    api_request(
+        "POST", TYPING_ROUTE, channel_id,
+        headers=headers,
+        timeout=5
+    )
+
+# One scheduler thread keeps every pending reply's channel typing
+typing_scheduler = TypingScheduler(send_typing_indicator)
+
+# Only evaluated when the metrics are scraped or logged
+metrics.add_gauges("generation", llm.scheduler_stats)
+metrics.add_gauges("llm", llm.router.stats)
+metrics.add_gauges("response_cache", llm.response_cache.stats)
+metrics.add_gauges("conversation_cache", conversation_cache.stats)
+metrics.add_gauges("typing", lambda: typing_scheduler.schedule.stats)
+if work_queue is not None:
+    metrics.add_gauges("work_queue", work_queue.stats)
+
+def send_reply(original_message, reply_text, deadline=None):
+    """Send reply mentioning the original author, within the mention's deadline"""
     # Get the author ID from the original message
     author_id = original_message['author']['id']
     message_id = original_message['id']
+    channel_id = original_message['channel_id']
+    # A fallback for a missed deadline goes out under the normal send limits
+    if deadline is not None and deadline.missed:
+        deadline = None
     
-    threading.Thread(
-        target=simulate_typing,
-        args=(reply_text, message_id),
-        daemon=True
-    ).start()
+    typing = typing_scheduler.start(
+        channel_id, len(reply_text) * Config.TYPING_ANIMATION_DELAY
+    )
 
     min_wait = min(len(reply_text) * Config.TYPING_ANIMATION_DELAY, Config.COOLDOWN_SECONDS)
+    remaining = deadline.remaining() if deadline is not None else None
+    if remaining is not None:
+        min_wait = min(min_wait, remaining)
     time.sleep(min_wait)
+    metrics.observe("typing", min_wait)
 
+    start = time.monotonic()
     try:
         headers = {
             "Authorization": Config.USER_TOKEN,
@@ -125,95 +414,212 @@ def send_reply(original_message, reply_text):
             "Content-Type": "application/json"
         }
 
-        # Mention the original author instead of the bot
+        # Mention the original author instead of the bot. The mention id
+        # as nonce lets Discord drop a resend of a reply that already went out
         data = {
             "content": f"<@{author_id}> {reply_text}",
             "message_reference": {
-                "channel_id": Config.CHANNEL_ID,
+                "channel_id": channel_id,
                 "message_id": message_id
-            }
+            },
+            "nonce": message_id,
+            "enforce_nonce": True
         }
 
-        response = requests.post(
-            f"https://discord.com/api/v9/channels/{Config.CHANNEL_ID}/messages",
+        response = api_request(
+            "POST", MESSAGES_ROUTE, channel_id, deadline,
             headers=headers,
             json=data,
             timeout=10
         )
 
-        if response.status_code == 429:
-            retry_after = response.json().get('retry_after', 5)
-            logger.warning(f"Rate limited on reply. Retrying after {retry_after}s")
-            time.sleep(retry_after)
-            return send_reply(original_message, reply_text)
-
         response.raise_for_status()
         logger.info(f"Replied to {message_id}")
+        if metrics.enabled:
+            metrics.observe("send", time.monotonic() - start)
+            metrics.observe("end_to_end", message_age(message_id))
+            metrics.inc("replies_sent")
         return True
     except Exception as e:
         logger.error(f"Reply failed: {e}")
+        metrics.inc("replies_failed")
         return False
+    finally:
+        typing_scheduler.stop(typing)
 
-def can_reply():
-    global last_reply_time
-    if last_reply_time is None:
+def can_reply(state: BotState, channel_id):
+    last_reply = state["channels"][channel_id]["last_reply"]
+    if not last_reply:
         return True
-    return (datetime.now() - last_reply_time) >= timedelta(seconds=Config.COOLDOWN_SECONDS)
+    return (datetime.now() - datetime.fromisoformat(last_reply)) >= timedelta(seconds=Config.COOLDOWN_SECONDS)
 
-def process_messages(messages, last_processed_id):
-    global last_reply_time
-    new_messages = 0
+def record_reply(state: BotState, channel_id):
+    """Start the channel's cooldown, saved with its cursor by update_state"""
+    state["channels"][channel_id]["last_reply"] = datetime.now().isoformat()
+    _dirty_channels.add(channel_id)
+
+def queue_mentions(state: BotState, channel_id, messages, last_processed_id):
+    """Submit every new mention in a channel's messages for generation.
 
+    Returns the (message, language, future, deadline) of each and the new
+    cursor. Each mention's deadline starts here.
+    """
+    if messages and not getattr(messages, "may_mention", True):
+        return [], messages[0]['id']
+
+    pending = []
     for msg in reversed(messages):
         if last_processed_id and msg['id'] == last_processed_id:
             continue
 
-        if any(str(mention.get("id")) == Config.USER_ID for mention in msg.get("mentions", [])):
-            try:
-                if not can_reply():
-                    logger.info("Skipping reply due to cooldown")
-                    continue
+        if mentions_bot(msg):
+            if metrics.enabled:
+                metrics.observe("fetch_lag", message_age(msg['id']))
+                metrics.inc("mentions")
+            if not can_reply(state, channel_id):
+                logger.info(f"Skipping reply in {channel_id} due to cooldown")
+                metrics.inc("cooldown_skips")
+            elif work_queue is not None:
+                # Not caught: a failed enqueue must keep the cursor behind it
+                work_queue.enqueue(msg, detect_language(msg['content']))
+            else:
+                try:
+                    lang = detect_language(msg['content'])
+                    deadline = Deadline()
+                    future = llm.submit(msg['author']['id'], msg['content'], lang, deadline)
+                    pending.append((msg, lang, future, deadline))
+                except Exception as e:
+                    logger.error(f"Processing error: {e}")
 
-                lang = detect_language(msg['content'])
-                response = llm.generate_response(msg['content'], lang)
+        last_processed_id = msg['id']
+
+    return pending, last_processed_id
 
-                if response and send_reply(msg, response):  # Pass the entire message object
-                    last_reply_time = datetime.now()
-                    new_messages += 1
-                    save_message(msg, response)
+def missed_deadline(msg, lang, future, deadline):
+    """Fallback reply for a mention whose generation outlived its deadline"""
+    # Cancelling a queued generation keeps it from running at all; one
+    # already running stops at its next streamed token
+    if future.cancel():
+        deadline.miss("queue")
+    else:
+        try:
+            # Finished right after the wait timed out
+            return future.result(0)
+        except TimeoutError:
+            deadline.miss("generation")
+    logger.warning(f"Mention {msg['id']} missed its reply deadline, sending the fallback")
+    return llm.fallback_response(lang)
+
+def save_reply(msg, response, lang, fallback=False):
+    """Save a replied mention. A fallback reply is left out of the user's
+    conversation and of the response cache"""
+    if fallback:
+        return conversation_cache.record(msg, response, language=lang, append=False)
+    return conversation_cache.record(
+        msg, response, *llm.cache_entry(msg['author']['id'], msg['content'], lang), language=lang
+    )
+
+def send_replies(state: BotState, pending):
+    """Reply in queue order as the generations finish, returns the number sent"""
+    new_messages = 0
+    for msg, lang, future, deadline in pending:
+        try:
+            try:
+                response = future.result(deadline.remaining())
+            except TimeoutError:
+                response = missed_deadline(msg, lang, future, deadline)
 
-            except Exception as e:
-                logger.error(f"Processing error: {e}")
+            if response and send_reply(msg, response, deadline):  # Pass the entire message object
+                record_reply(state, msg['channel_id'])
+                new_messages += 1
+                save_reply(msg, response, lang, deadline.fallback)
 
-        last_processed_id = msg['id']
+        except CancelledError:
+            logger.info(f"Dropped queued mention {msg['id']}")
+        except Exception as e:
+            logger.error(f"Processing error: {e}")
 
-    return new_messages, last_processed_id
+    return new_messages
+
+def process_messages(state: BotState, channel_id, messages, last_processed_id):
+    pending, last_processed_id = queue_mentions(state, channel_id, messages, last_processed_id)
+    return send_replies(state, pending), last_processed_id
 
 def main_loop():
-    logger.info("Starting Discord User App")
+    metrics.start()
+    if Config.DEPLOY_ROLE == "worker":
+        import worker
+        return worker.run()
+
+    if Config.ASYNC_MODE or Config.INGESTION_MODE == "gateway":
+        # Imported lazily so the blocking mode doesn't require aiohttp
+        import async_app
+        return async_app.run()
+
+    channels = channel_ids()
+    logger.info(f"Starting Discord User App for {len(channels)} channels")
+    if work_queue is None:
+        # Loads the model while we catch up; mentions queue until it's ready
+        llm.warm_up()
     init_db()
     state: BotState = load_state()
-    last_processed_id = state.get("last_processed_id") or None
+
+    # Anything posted while we were down, not just the latest page
+    catch_up(state, {
+        channel_id: state["channels"][channel_id]["last_processed_id"]
+        for channel_id in channels if state["channels"][channel_id]["last_processed_id"]
+    })
+    schedule = PollSchedule(channels)
+    metrics.add_gauges("poll", schedule.stats)
 
     while True:
         try:
-            start_time = time.time()
-            messages = fetch_messages(last_processed_id)
+            cursors = {}
+            pending = []
+            backlogged = {}
+
+            # One poll per due channel per round, every channel's mentions
+            # share the generation queue before any reply is waited on
+            for channel_id in schedule.due():
+                last_processed_id = state["channels"][channel_id]["last_processed_id"] or None
+                messages = fetch_messages(channel_id, last_processed_id)
+                schedule.record(channel_id, len(messages), has_mention(messages))
+                if not messages:
+                    continue
+
+                queued, cursors[channel_id] = queue_mentions(state, channel_id, messages, last_processed_id)
+                pending.extend(queued)
+
+                # A full page means more messages are waiting behind it
+                if len(messages) >= POLL_LIMIT:
+                    backlogged[channel_id] = cursors[channel_id]
+
+            if cursors:
+                new_count = send_replies(state, pending)
+                logger.info(f"Processed {new_count} new mentions in {len(cursors)} channels")
+                if new_count:
+                    logger.info(f"Generation queue: {llm.scheduler_stats()}")
+                    logger.info(f"Conversation cache: {conversation_cache.stats()}")
+                    logger.info(f"Response cache: {llm.response_cache.stats()}")
+
+                for channel_id, last_processed_id in cursors.items():
+                    update_state(state, channel_id, last_processed_id)
 
-            if messages:
-                new_count, last_processed_id = process_messages(messages, last_processed_id)
-                logger.info(f"Processed {new_count} new mentions")
+            if backlogged:
+                catch_up(state, backlogged)
 
-                state["last_processed_id"] = str(last_processed_id) if last_processed_id else ""
-                state["last_run"] = datetime.now().isoformat()
-                save_state(state)
+            # Picks up a coalesced save that no later update came along for
+            flush_state(state, force=False)
 
-            elapsed = time.time() - start_time
-            sleep_time = max(1, Config.POLL_INTERVAL - elapsed)
+            sleep_time = schedule.wait()
+            if _dirty_channels:
+                sleep_time = min(sleep_time, Config.STATE_SAVE_INTERVAL)
             time.sleep(sleep_time)
 
         except KeyboardInterrupt:
             logger.info("App stopped by user")
+            flush_state(state)
+            close_db()
             break
         except Exception as e:
             logger.error(f"Main loop error: {e}")
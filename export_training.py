@@ -0,0 +1,131 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from config import Config
+from database import get_connection, iter_training_rows
+
+logger = logging.getLogger('Export')
+
+
+def output_paths(output, shards, compress, after_seq=0):
+    """File names for an export, one per shard"""
+    base, ext = output, ""
+    for suffix in (".gz", ".jsonl"):
+        if base.endswith(suffix):
+            base, ext = base[:-len(suffix)], suffix + ext
+    ext = ext or ".jsonl"
+    if compress and not ext.endswith(".gz"):
+        ext += ".gz"
+    if after_seq:
+        # Incremental runs never overwrite the files of earlier runs
+        base = f"{base}.after-{after_seq}"
+    if shards == 1:
+        return [base + ext]
+    return [f"{base}-{shard:05d}-of-{shards:05d}{ext}" for shard in range(shards)]
+
+
+def training_line(prompt, response, traits):
+    # Traits are stored as JSON already, so they go in without a parse/dump round trip
+    return (f'{{"prompt": {json.dumps(prompt, ensure_ascii=False)}, '
+            f'"response": {json.dumps(response, ensure_ascii=False)}, '
+            f'"personality_traits": {traits or "{}"}}}\n')
+
+
+def export_training_data(output, shards=1, compress=False, after_seq=0, since=None, chunk_size=None):
+    """Stream training data to JSONL, returns (rows, last seq, paths).
+
+    Rows are sharded by seq across the files. Each file is written under
+    a temporary name and only renamed into place once the export finished,
+    so a failed run leaves no partial output behind.
+    """
+    # The bot's 256MB mmap would page the whole file into this process's
+    # RSS over a full scan; a sequential export gains nothing from it
+    get_connection().execute("PRAGMA mmap_size=0")
+    paths = output_paths(output, shards, compress, after_seq)
+    temps = [f"{path}.tmp" for path in paths]
+    opener = gzip.open if paths[0].endswith(".gz") else open
+    files = [opener(temp, "wt", encoding="utf-8") for temp in temps]
+
+    rows, last_seq = 0, after_seq
+    start = time.monotonic()
+    try:
+        for chunk in iter_training_rows(after_seq, since, chunk_size):
+            if shards == 1:
+                files[0].write("".join(training_line(*row[1:]) for row in chunk))
+            else:
+                lines = [[] for _ in files]
+                for row in chunk:
+                    lines[row[0] % shards].append(training_line(*row[1:]))
+                for f, shard_lines in zip(files, lines):
+                    f.write("".join(shard_lines))
+            rows += len(chunk)
+            last_seq = chunk[-1][0]
+        for f in files:
+            f.close()
+    except BaseException:
+        for f, temp in zip(files, temps):
+            f.close()
+            os.remove(temp)
+        raise
+
+    for temp, path in zip(temps, paths):
+        os.replace(temp, path)
+    elapsed = time.monotonic() - start
+    logger.info(f"Exported {rows} rows to {len(paths)} files in {elapsed:.1f}s "
+                f"({rows / elapsed if elapsed else 0:.0f} rows/s)")
+    return rows, last_seq, paths
+
+
+def load_export_state(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_export_state(path, state):
+    temp = f"{path}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(temp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export messages with responses as JSONL training data")
+    parser.add_argument("--output", default="training_data.jsonl", help="output file, .gz compresses")
+    parser.add_argument("--compress", action="store_true", help="gzip the output")
+    parser.add_argument("--shards", type=int, default=1, help="split rows across this many files")
+    parser.add_argument("--chunk-size", type=int, default=Config.EXPORT_CHUNK_SIZE, help="rows per read")
+    parser.add_argument("--since", help='only messages at or after this UTC time, "YYYY-MM-DD HH:MM:SS"')
+    parser.add_argument("--incremental", action="store_true",
+                        help="only rows added since the last incremental export")
+    parser.add_argument("--state-file", default=Config.EXPORT_STATE_FILE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    state = load_export_state(args.state_file) if args.incremental else {}
+    # Older state files hold last_rowid, which migration 5 kept as the seq
+    after_seq = state.get("last_seq", state.get("last_rowid", 0))
+
+    rows, last_seq, paths = export_training_data(
+        args.output, max(args.shards, 1), args.compress, after_seq, args.since, args.chunk_size
+    )
+    if args.incremental:
+        save_export_state(args.state_file, {
+            "last_seq": last_seq,
+            "rows": rows,
+            "exported_at": datetime.now().isoformat(),
+            "files": paths
+        })
+    for path in paths:
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+import random
+
+import aiohttp
+
+from config import Config
+
+logger = logging.getLogger('Gateway')
+
+# Gateway opcodes
+DISPATCH = 0
+HEARTBEAT = 1
+IDENTIFY = 2
+RESUME = 6
+RECONNECT = 7
+INVALID_SESSION = 9
+HELLO = 10
+HEARTBEAT_ACK = 11
+
+# Close codes after which reconnecting cannot help
+FATAL_CLOSE_CODES = {4004, 4010, 4011, 4012, 4013, 4014}
+# Close codes that invalidate the session, so we identify afresh
+SESSION_CLOSE_CODES = {4007, 4009}
+
+
+class GatewayClient:
+    """Websocket client that pushes MESSAGE_CREATE events to a callback.
+
+    Keeps the connection alive with heartbeats, resumes the session after
+    a drop (so no events are lost in between) and falls back to a fresh
+    identify when the session can't be resumed. Events missed before a
+    fresh session are not replayed, so on_ready is started on every READY
+    for the caller to catch up over REST.
+    """
+
+    def __init__(self, session, on_message, url=None, channel_ids=None, on_ready=None):
+        self.session = session
+        self.on_message = on_message
+        self.on_ready = on_ready
+        self._ready_task = None
+        self.url = url or Config.GATEWAY_URL
+        self.channel_ids = {str(channel_id) for channel_id in channel_ids or [Config.CHANNEL_ID]}
+
+        self.sequence = None
+        self.session_id = None
+        self.resume_url = None
+        self.heartbeat_acked = True
+        self.stopped = False
+
+    async def run(self):
+        """Connect and reconnect until stop() or a fatal close code"""
+        backoff = 1
+        while not self.stopped:
+            try:
+                close_code = await self._connect()
+                backoff = 1
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"Gateway connection failed: {e}")
+                close_code = None
+
+            if self.stopped:
+                break
+            if close_code in FATAL_CLOSE_CODES:
+                logger.critical(f"Gateway closed with fatal code {close_code}")
+                break
+            if close_code in SESSION_CLOSE_CODES:
+                self._reset_session()
+
+            await asyncio.sleep(backoff + random.random())
+            backoff = min(backoff * 2, 60)
+
+    def stop(self):
+        self.stopped = True
+
+    def _reset_session(self):
+        self.session_id = None
+        self.resume_url = None
+        self.sequence = None
+
+    async def _connect(self):
+        url = self.url
+        if self.session_id and self.resume_url:
+            # The resume URL comes without our version/encoding query
+            query = self.url.partition('?')[2]
+            url = f"{self.resume_url.rstrip('/')}/?{query}" if query else self.resume_url
+        async with self.session.ws_connect(url, heartbeat=None, max_msg_size=0) as ws:
+            msg = await ws.receive(timeout=30)
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                # Closed (or errored) before HELLO: a dropped connection
+                logger.warning(f"Gateway closed before HELLO ({msg.type.name}, code {ws.close_code})")
+                return ws.close_code
+            hello = json.loads(msg.data)
+            if hello.get("op") != HELLO:
+                logger.warning(f"Expected HELLO, got op {hello.get('op')}")
+                return None
+
+            interval = hello["d"]["heartbeat_interval"] / 1000
+            self.heartbeat_acked = True
+            heartbeat = asyncio.create_task(self._heartbeat(ws, interval))
+            try:
+                if self.session_id:
+                    await self._send(ws, RESUME, {
+                        "token": Config.USER_TOKEN,
+                        "session_id": self.session_id,
+                        "seq": self.sequence
+                    })
+                else:
+                    await self._identify(ws)
+
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        if not await self._handle(ws, json.loads(msg.data)):
+                            # Non-1000 close keeps the session resumable
+                            await ws.close(code=4000)
+                            break
+                    elif msg.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSED):
+                        break
+            finally:
+                heartbeat.cancel()
+
+            logger.info(f"Gateway disconnected (code {ws.close_code})")
+            return ws.close_code
+
+    async def _identify(self, ws):
+        await self._send(ws, IDENTIFY, {
+            "token": Config.USER_TOKEN,
+            "properties": {
+                "os": "linux",
+                "browser": "Chrome",
+                "device": ""
+            }
+        })
+
+    async def _send(self, ws, op, data):
+        await ws.send_json({"op": op, "d": data})
+
+    async def _heartbeat(self, ws, interval):
+        # First beat is jittered so reconnecting clients don't beat in lockstep
+        await asyncio.sleep(interval * random.random())
+        while not ws.closed:
+            if not self.heartbeat_acked:
+                logger.warning("Heartbeat not acknowledged, reconnecting")
+                await ws.close(code=4000)
+                return
+            self.heartbeat_acked = False
+            await self._send(ws, HEARTBEAT, self.sequence)
+            await asyncio.sleep(interval)
+
+    async def _handle(self, ws, payload):
+        """Handle one gateway payload, False means reconnect"""
+        op = payload.get("op")
+
+        if op == DISPATCH:
+            self.sequence = payload.get("s") or self.sequence
+            event = payload.get("t")
+            data = payload.get("d") or {}
+
+            if event == "READY":
+                self.session_id = data.get("session_id")
+                self.resume_url = data.get("resume_gateway_url")
+                logger.info("Gateway session ready")
+                if self.on_ready and (self._ready_task is None or self._ready_task.done()):
+                    # In its own task so the catch-up doesn't hold up events
+                    self._ready_task = asyncio.create_task(self.on_ready())
+            elif event == "RESUMED":
+                logger.info("Gateway session resumed")
+            elif event == "MESSAGE_CREATE" and str(data.get("channel_id")) in self.channel_ids:
+                await self.on_message(data)
+        elif op == HEARTBEAT:
+            await self._send(ws, HEARTBEAT, self.sequence)
+        elif op == HEARTBEAT_ACK:
+            self.heartbeat_acked = True
+        elif op == RECONNECT:
+            logger.info("Gateway asked us to reconnect")
+            return False
+        elif op == INVALID_SESSION:
+            if not payload.get("d"):
+                self._reset_session()
+            logger.info("Gateway session invalidated")
+            await asyncio.sleep(1 + random.random() * 4)
+            return False
+        return True
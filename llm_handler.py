@@ -1,85 +1,253 @@
 import logging
 import personality
 from config import Config
-import re
+from scheduler import GenerationScheduler
+from context_cache import conversation_cache
+from response_cache import ResponseCache
+from llm_router import LLMRouter
+from deadline import DeadlineExceeded
+from metrics import metrics
+import threading
+import time
 
 logger = logging.getLogger('LLMHandler')
 
 class LLMHandler:
     def __init__(self):
+        self.scheduler = GenerationScheduler(self.generate_response)
+        self.response_cache = ResponseCache()
+        # Connecting and loading the models happen in warm_up(), off the
+        # import path, so startup never waits on Ollama
+        self.router = LLMRouter()
+        self.ready = threading.Event()
+        self._warm_up_lock = threading.Lock()
+        self._warm_up_thread = None
+
+    def warm_up(self):
+        """Connect to Ollama and load the models in the background, once"""
+        with self._warm_up_lock:
+            if self._warm_up_thread is None:
+                self._warm_up_thread = threading.Thread(target=self._warm_up, name="llm-warm-up", daemon=True)
+                self._warm_up_thread.start()
+
+    def wait_ready(self, timeout=None) -> bool:
+        self.warm_up()
+        return self.ready.wait(timeout)
+
+    def _warm_up(self):
+        start = time.monotonic()
         try:
-            # Initialize Ollama client properly
             import ollama
-            self.ollama = ollama
-            logger.info(f"LLM initialized with model: {Config.MODEL_NAME}")
-            
-            # Test connection
-            response = self.ollama.generate(model=Config.MODEL_NAME, prompt="Test connection")
-            logger.info("Ollama connection successful")
         except ImportError:
             logger.critical("Ollama module not installed. Please install with 'pip install ollama'")
-            self.ollama = None
-        except Exception as e:
-            logger.critical(f"LLM initialization failed: {e}")
-            self.ollama = None
+            self._finish_warm_up()
+            return
+
+        self.router.connect(ollama)
+        if self.router.wait_healthy(Config.LLM_WARMUP_TIMEOUT):
+            # Generation starts with the first loaded model, slower loads finish behind it
+            self.router.preload(max(0.0, Config.LLM_WARMUP_TIMEOUT - (time.monotonic() - start)))
+            logger.info(f"LLM ready with {self.router.stats()['healthy']} of {len(self.router.backends)} "
+                        f"backends after {time.monotonic() - start:.1f}s")
+        else:
+            # Generate anyway: requests fail with the error reply until a
+            # backend comes up
+            logger.critical(f"No Ollama backend reachable after {Config.LLM_WARMUP_TIMEOUT}s")
+        self.router.start_health_checks()
+        self._finish_warm_up()
+
+    def _finish_warm_up(self):
+        self.ready.set()
+        # Mentions queued during warm-up start generating now
+        self.scheduler.start()
+
+    def submit(self, user_id: str, user_input: str, lang: str = "en", deadline=None):
+        """Queue a generation on the worker pool, returns a Future.
+
+        Before the model is ready the mention just waits in the queue.
+        """
+        self.warm_up()
+        return self.scheduler.submit(user_id, user_input, lang, user_id, deadline=deadline)
+
+    def fallback_response(self, lang: str = "en") -> str:
+        """In-character reply for a mention that missed its deadline"""
+        return personality.registry.get().fallback_response(lang)
+
+    def cache_entry(self, user_id: str, user_input: str, lang: str = "en"):
+        """(key, core) to save with a reply, (None, None) if it was written
+        for the user's conversation and mustn't be served to anyone else"""
+        if Config.CONVERSATION_HISTORY and conversation_cache.get(user_id):
+            return None, None
+        return self.response_cache.entry(user_input, lang)
+
+    def scheduler_stats(self) -> dict:
+        """Queue depth, wait and service times of the generation pool"""
+        return self.scheduler.stats()
 
-    def generate_response(self, user_input: str, lang: str = "en") -> str:
-        """Generate response with personality and word limit"""
-        if self.ollama is None:
-            return personality.get_error_response(lang)
+    def generate_response(self, user_input: str, lang: str = "en", user_id: str = None, deadline=None) -> str:
+        """Generate response with personality and word limit.
+
+        With a deadline, a mention that waited past it is not generated and
+        a streamed generation is stopped once it passes; both get the
+        profile's fallback reply.
+        """
+        # One profile for the whole request, even if it is reloaded meanwhile
+        profile = personality.registry.get()
+        if not self.wait_ready(Config.LLM_WARMUP_TIMEOUT) or not self.router.connected:
+            return profile.error_response(lang)
             
         try:
-            # Get web context
-            
-            
-            # Format prompt with personality
-            system_prompt = personality.get_personality()["system_prompt"].get(
-                lang, 
-                personality.get_personality()["system_prompt"]["en"]
-            )
-            
-            # Add word limit instruction to prompt
-            system_prompt += f"\nKeep response under {Config.MAX_RESPONSE_WORDS} words. Be concise."
-            
-            prompt = (
-                f"<|system|>\n{system_prompt}\n"
-                f"</s>\n<|user|>\n{user_input}\n</s>\n<|assistant|>\n"
-            )
-            
+            if deadline is not None:
+                deadline.check("queue")
+            start = time.monotonic()
+            history = []
+            if user_id and Config.CONVERSATION_HISTORY:
+                history = conversation_cache.get(user_id)
+
+            # A reply that follows someone's conversation is only right for
+            # them, so the cache only serves and stores context-free replies
+            cacheable = Config.RESPONSE_CACHE and not history
+            if cacheable:
+                response = self.response_cache.get(user_input, lang)
+                if response is not None:
+                    # Fresh styling keeps cached replies from looking identical
+                    return self.finish_response(response, lang, profile)
+
+            tier = self.router.tier_for(user_input)
+            if Config.USE_CHAT_API:
+                request = {"messages": self.build_messages(user_input, lang, history, profile)}
+            else:
+                request = {"prompt": self.build_prompt(user_input, lang, history, profile)}
+            built = time.monotonic()
+            metrics.observe("prompt_build", built - start)
+
             # Generate actual response
-            response = self.ollama.generate(
-                model=Config.MODEL_NAME,
-                prompt=prompt,
-                options={
-                    "temperature": Config.TEMPERATURE,
-                    "num_predict": Config.MAX_TOKENS
-                }
-            )['response'].strip()
-            
-            # Apply personality styling
-            styled_response = personality.apply_personality(response, lang)
-            
-            # Remove parenthetical actions like "(Checking ammo)"
-            cleaned_response = self.remove_parenthetical_actions(styled_response)
-            
-            # Enforce word limit
-            final_response = self.enforce_word_limit(cleaned_response)
-            
-            logger.info(f"Generated response: {final_response[:100]}...")
-            return final_response
-            
+            if Config.STREAM_GENERATION:
+                response = self.stream_response(request, tier, deadline)
+            else:
+                response = self.complete(request, tier, deadline)
+            metrics.observe("generation", time.monotonic() - built)
+
+            if cacheable:
+                self.response_cache.put(user_input, lang, response)
+
+            return self.finish_response(response, lang, profile)
+
+        except DeadlineExceeded as e:
+            logger.warning(f"{e}, using the fallback reply")
+            return profile.fallback_response(lang)
         except Exception as e:
             logger.error(f"Response generation failed: {e}")
-            return personality.get_error_response(lang)
-
-    def remove_parenthetical_actions(self, text):
-        """Remove text in parentheses that appear at the beginning of the response"""
-        # Pattern to match parentheses at start of string
-        return re.sub(r'^\s*\([^)]*\)\s*', '', text)
-
-    def enforce_word_limit(self, text):
-        """Truncate response to MAX_RESPONSE_WORDS"""
-        words = text.split()
-        if len(words) > Config.MAX_RESPONSE_WORDS:
-            return ' '.join(words[:Config.MAX_RESPONSE_WORDS]) + '...'
-        return text
+            metrics.inc("generation_errors")
+            return profile.error_response(lang)
+
+    def finish_response(self, response: str, lang: str = "en", profile=None) -> str:
+        """Style and trim a raw model reply"""
+        start = time.monotonic()
+        final_response = personality.response_pipeline.run(response, lang, profile)
+        metrics.observe("postprocess", time.monotonic() - start)
+        logger.info(f"Generated response: {final_response[:100]}...")
+        return final_response
+
+    def build_prompt(self, user_input: str, lang: str = "en", history=(), profile=None) -> str:
+        """Raw prompt for the generate API"""
+        # Compiled once per profile, so every request starts with a
+        # byte-identical prefix that Ollama can serve from its prompt cache
+        system_prompt = (profile or personality.registry.get()).system_prompt(lang)
+
+        # Replay the user's recent turns so replies follow the conversation
+        turns = "".join(
+            f"<|user|>\n{turn['user']}\n</s>\n<|assistant|>\n{turn['bot']}\n</s>\n"
+            for turn in history
+        )
+        return (
+            f"<|system|>\n{system_prompt}\n</s>\n{turns}"
+            f"<|user|>\n{user_input}\n</s>\n<|assistant|>\n"
+        )
+
+    def build_messages(self, user_input: str, lang: str = "en", history=(), profile=None) -> list:
+        """Message list for the chat API, system prompt first"""
+        messages = [{
+            "role": "system",
+            "content": (profile or personality.registry.get()).system_prompt(lang)
+        }]
+        for turn in history:
+            messages.append({"role": "user", "content": turn["user"]})
+            messages.append({"role": "assistant", "content": turn["bot"]})
+        messages.append({"role": "user", "content": user_input})
+        return messages
+
+    def send_request(self, request: dict, stream: bool = False, tier: str = "main", deadline=None):
+        """Send a prompt or message-list request to the least busy Ollama backend"""
+        options = {
+            "options": {
+                "temperature": Config.TEMPERATURE,
+                "num_predict": Config.MAX_TOKENS
+            },
+            # Keep the model, and with it the cached prefix, loaded between mentions
+            "keep_alive": Config.OLLAMA_KEEP_ALIVE
+        }
+        return self.router.send(request, options, stream, tier, deadline)
+
+    def complete(self, request: dict, tier: str = "main", deadline=None) -> str:
+        """Non-streaming generation"""
+        response = self.send_request(request, tier=tier, deadline=deadline)
+        self.log_prompt_eval(response)
+        return self.response_text(response).strip()
+
+    def stream_response(self, request: dict, tier: str = "main", deadline=None) -> str:
+        """Stream tokens and stop the model once the word limit is exceeded
+        or the deadline passes"""
+        start = time.time()
+        stream = self.send_request(request, stream=True, tier=tier, deadline=deadline)
+
+        text = ""
+        try:
+            for chunk in stream:
+                if deadline is not None:
+                    deadline.check("generation")
+                if not text:
+                    # Dominated by prompt evaluation, so it shows cache reuse
+                    logger.info(f"First token after {(time.time() - start) * 1000:.0f}ms")
+                text += self.response_text(chunk)
+                if chunk.get('done'):
+                    self.log_prompt_eval(chunk)
+                    break
+
+                cleaned = personality.strip_leading_action(text).lstrip()
+                # An unclosed leading "(action" may still be stripped later
+                if cleaned.startswith('('):
+                    continue
+                # One word past the limit means the last kept word is complete
+                if len(cleaned.split()) > Config.MAX_RESPONSE_WORDS:
+                    logger.info("Word limit reached, stopping generation early")
+                    break
+        finally:
+            # Closing the stream drops the connection, which aborts the generation
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+
+        return text.strip()
+
+    @staticmethod
+    def response_text(response) -> str:
+        """Text of a generate or chat response (or stream chunk)"""
+        message = response.get('message')
+        if message:
+            return message.get('content') or ''
+        return response.get('response') or ''
+
+    @staticmethod
+    def log_prompt_eval(response):
+        if metrics.enabled:
+            # Ollama reports durations in nanoseconds
+            metrics.observe("prompt_eval", (response.get('prompt_eval_duration') or 0) / 1e9)
+            metrics.observe("eval", (response.get('eval_duration') or 0) / 1e9)
+            metrics.inc("prompt_tokens", response.get('prompt_eval_count') or 0)
+            metrics.inc("eval_tokens", response.get('eval_count') or 0)
+        duration = response.get('prompt_eval_duration')
+        if duration:
+            logger.info(
+                f"Prompt eval: {response.get('prompt_eval_count')} tokens in {duration / 1e6:.0f}ms"
+            )
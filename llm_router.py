@@ -0,0 +1,219 @@
+import logging
+import threading
+import time
+
+from config import Config
+from metrics import metrics
+
+logger = logging.getLogger('LLMRouter')
+
+TIERS = ("main", "fast")
+
+
+class Backend:
+    """One Ollama endpoint serving one model"""
+
+    def __init__(self, host=None, model=None, tier="main"):
+        self.host = host or None
+        self.model = model or Config.MODEL_NAME
+        self.tier = tier if tier in TIERS else "main"
+        self.client = None
+        self.healthy = False
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def name(self):
+        return f"{self.host or 'default'}/{self.model}"
+
+
+class LLMRouter:
+    """Spreads generations over the Ollama backends in LLM_BACKENDS.
+
+    Each request goes to the healthy backend of its tier with the fewest
+    requests in flight. A backend that errors or stalls for
+    LLM_REQUEST_TIMEOUT seconds is marked down and the request moves on to
+    the next one; a background check brings it back once it answers again.
+    Mentions of at most LLM_FAST_MAX_WORDS words use the "fast" tier (a
+    smaller model) when there is one. Without LLM_BACKENDS this is a single
+    backend on OLLAMA_HOST with MODEL_NAME, as before.
+    """
+
+    def __init__(self, backends=None):
+        specs = backends if backends is not None else Config.LLM_BACKENDS
+        if not specs:
+            specs = [{"host": Config.OLLAMA_HOST, "model": Config.MODEL_NAME}]
+        self.backends = [Backend(spec.get("host"), spec.get("model"), spec.get("tier", "main")) for spec in specs]
+        self._lock = threading.Lock()
+        self._ollama = None
+        self._health_thread = None
+        self.connected = False
+        self.failures = 0
+
+    def connect(self, ollama):
+        """Create a client per backend, no network calls yet"""
+        self._ollama = ollama
+        for backend in self.backends:
+            backend.client = ollama.Client(host=backend.host, timeout=Config.LLM_REQUEST_TIMEOUT or None)
+        self.connected = True
+
+    def check(self, backend):
+        """Health check: lists loaded models without loading any"""
+        try:
+            backend.client.ps()
+        except Exception as e:
+            if backend.healthy:
+                logger.warning(f"Backend {backend.name} is down: {e}")
+            backend.healthy = False
+            return False
+        if not backend.healthy:
+            logger.info(f"Backend {backend.name} is up")
+        backend.healthy = True
+        return True
+
+    def wait_healthy(self, timeout):
+        """Check backends with backoff until one answers, returns False on timeout"""
+        start = time.monotonic()
+        delay = 1
+        while True:
+            if sum(self.check(backend) for backend in self.backends):
+                return True
+            if time.monotonic() - start >= timeout:
+                return False
+            logger.warning(f"No Ollama backend reachable yet, retrying in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 10)
+
+    def preload(self, timeout=None):
+        """Load every healthy backend's model in parallel, keep_alive keeps it loaded.
+
+        Returns once the first model is loaded, every load has finished or
+        timeout passed, whichever comes first; the other loads carry on in
+        the background. Returns True if a model is loaded.
+        """
+        backends = [backend for backend in self.backends if backend.healthy]
+        loaded = threading.Event()
+        finished = threading.Semaphore(0)
+
+        def load(backend):
+            try:
+                # An empty prompt only loads the model. No timeout, loading
+                # a large model can take longer than any request should
+                self._ollama.Client(host=backend.host).generate(
+                    model=backend.model, prompt="", keep_alive=Config.OLLAMA_KEEP_ALIVE
+                )
+                logger.info(f"Preloaded {backend.name}")
+                loaded.set()
+            except Exception as e:
+                logger.error(f"Preloading {backend.name} failed: {e}")
+            finally:
+                finished.release()
+
+        for i, backend in enumerate(backends):
+            threading.Thread(target=load, args=(backend,), name=f"preload-{i}", daemon=True).start()
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for _ in backends:
+            remaining = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            if not finished.acquire(timeout=remaining) or loaded.is_set():
+                break
+        return loaded.is_set()
+
+    def start_health_checks(self):
+        if self._health_thread is None and len(self.backends) > 1:
+            self._health_thread = threading.Thread(target=self._health_loop, name="llm-health", daemon=True)
+            self._health_thread.start()
+
+    def _health_loop(self):
+        while True:
+            time.sleep(Config.LLM_HEALTH_INTERVAL)
+            for backend in self.backends:
+                if not backend.healthy:
+                    self.check(backend)
+
+    def tier_for(self, user_input):
+        if Config.LLM_FAST_MAX_WORDS and len(user_input.split()) <= Config.LLM_FAST_MAX_WORDS:
+            return "fast"
+        return "main"
+
+    def candidates(self, tier="main"):
+        """Backends to try in order: healthy ones of the tier by load, then the rest"""
+        with self._lock:
+            in_tier = [b for b in self.backends if b.tier == tier] or self.backends
+            others = [b for b in self.backends if b not in in_tier]
+            # Down backends still come last, better a late try than an error reply
+            return sorted(in_tier, key=lambda b: (not b.healthy, b.outstanding)) + \
+                sorted(others, key=lambda b: (not b.healthy, b.outstanding))
+
+    def send(self, request, options, stream=False, tier="main", deadline=None):
+        """Send a chat or generate request, failing over between backends.
+
+        Streams are only failed over until their first chunk arrives, and
+        no backend is tried once the deadline has passed.
+        """
+        error = None
+        for backend in self.candidates(tier):
+            if deadline is not None:
+                deadline.check("generation")
+            with self._lock:
+                backend.outstanding += 1
+                backend.requests += 1
+            try:
+                if "messages" in request:
+                    response = backend.client.chat(
+                        model=backend.model, messages=request["messages"], stream=stream, **options
+                    )
+                else:
+                    response = backend.client.generate(
+                        model=backend.model, prompt=request["prompt"], stream=stream, **options
+                    )
+                if stream:
+                    # The request is only sent once the stream is read
+                    response = self._stream(backend, response, next(response, None))
+                else:
+                    self._release(backend)
+                backend.healthy = True
+                return response
+            except Exception as e:
+                self._release(backend)
+                backend.failures += 1
+                backend.healthy = False
+                error = e
+                logger.warning(f"Backend {backend.name} failed, trying the next: {e}")
+                with self._lock:
+                    self.failures += 1
+                metrics.inc("llm_backend_failures")
+        raise error
+
+    def _stream(self, backend, stream, first):
+        try:
+            if first is not None:
+                yield first
+            yield from stream
+        finally:
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+            self._release(backend)
+
+    def _release(self, backend):
+        with self._lock:
+            backend.outstanding -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backends": len(self.backends),
+                "healthy": sum(b.healthy for b in self.backends),
+                "outstanding": sum(b.outstanding for b in self.backends),
+                "failures": self.failures
+            }
+
+    def backend_stats(self):
+        with self._lock:
+            return [
+                {"backend": b.name, "tier": b.tier, "healthy": b.healthy, "outstanding": b.outstanding,
+                 "requests": b.requests, "failures": b.failures}
+                for b in self.backends
+            ]
@@ -1,5 +1,5 @@
+import argparse
 import logging
-from discord_app import main_loop
 from config import Config
 
 # Configure logging
@@ -12,7 +12,20 @@ logging.basicConfig(
     ]
 )
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Discord AI bot")
+    parser.add_argument("--role", choices=["all", "ingest", "worker"], default=Config.DEPLOY_ROLE,
+                        help="run everything, only ingestion, or only a generation worker")
+    parser.add_argument("--ollama-host", default=Config.OLLAMA_HOST, help="Ollama server for this process")
+    parser.add_argument("--worker-id", default=Config.WORKER_ID, help="lease owner name of a worker")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    Config.DEPLOY_ROLE = args.role
+    Config.OLLAMA_HOST = args.ollama_host
+    Config.WORKER_ID = args.worker_id
+
     print("""
     ██████╗ ██╗███████╗ ██████╗  ██████╗ ██████╗ 
     ██╔══██╗██║██╔════╝██╔════╝ ██╔═══██╗██╔══██╗
@@ -23,5 +36,8 @@ if __name__ == "__main__":
     AI-BOT
     """)
     print(f"Personality: {Config.PERSONALITY_PROFILE}")
-    print(f"Cooldown: {Config.COOLDOWN_SECONDS}s | Model: {Config.MODEL_NAME}")
+    print(f"Cooldown: {Config.COOLDOWN_SECONDS}s | Model: {Config.MODEL_NAME} | Role: {Config.DEPLOY_ROLE}")
+
+    # Imported after the overrides above, the LLM and work queue are set up on import
+    from discord_app import main_loop
     main_loop()
@@ -0,0 +1,184 @@
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import Config
+
+logger = logging.getLogger('Metrics')
+
+# Upper bounds in seconds, from a local SQLite commit up to a cold model load
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Stages of a mention in the order they happen, for the log summary
+STAGES = (
+    "fetch_lag", "queue_wait", "prompt_build", "prompt_eval", "eval", "generation",
+    "postprocess", "typing", "send", "db_write", "end_to_end"
+)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate from the buckets, interpolating inside the one holding q"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+
+class Metrics:
+    """Per-stage latency histograms and event counters of the mention pipeline.
+
+    Call sites check `metrics.enabled` (or call observe/inc, which do) so a
+    disabled registry costs one attribute lookup. Gauge groups registered
+    with add_gauges are callables returning a dict of numbers, only
+    evaluated when the metrics are scraped or logged.
+    """
+
+    def __init__(self, enabled=None):
+        self.enabled = Config.METRICS_ENABLED if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._started = False
+        self.server = None
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(max(seconds, 0.0))
+
+    def inc(self, event, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[event] = self._counters.get(event, 0) + amount
+
+    def snapshot_counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def add_gauges(self, group, collect):
+        self._gauges[group] = collect
+
+    def collect_gauges(self):
+        gauges = {}
+        for group, collect in self._gauges.items():
+            try:
+                values = collect()
+            except Exception as e:
+                logger.warning(f"Collecting {group} gauges failed: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges[f"{group}_{key}"] = value
+        return gauges
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self._lock:
+            histograms = {stage: (list(h.counts), h.total, h.count) for stage, h in self._histograms.items()}
+        counters = self.snapshot_counters()
+
+        lines = ["# TYPE bot_stage_seconds histogram"]
+        for stage, (counts, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, n in zip(BUCKETS, counts):
+                cumulative += n
+                lines.append(f'bot_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'bot_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'bot_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'bot_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        lines.append("# TYPE bot_events_total counter")
+        for event, value in sorted(counters.items()):
+            lines.append(f'bot_events_total{{event="{event}"}} {value}')
+
+        for name, value in sorted(self.collect_gauges().items()):
+            lines.append(f"# TYPE bot_{name} gauge")
+            lines.append(f"bot_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """One line per stage with count, mean, p50 and p95"""
+        with self._lock:
+            order = {stage: i for i, stage in enumerate(STAGES)}
+            stages = sorted(self._histograms.items(), key=lambda item: (order.get(item[0], len(order)), item[0]))
+            lines = [
+                f"{stage}: n={h.count} avg={h.total / h.count * 1000:.0f}ms "
+                f"p50={h.quantile(0.5) * 1000:.0f}ms p95={h.quantile(0.95) * 1000:.0f}ms"
+                for stage, h in stages if h.count
+            ]
+            if self._counters:
+                lines.append(", ".join(f"{event}={value}" for event, value in sorted(self._counters.items())))
+        return "\n".join(lines)
+
+    def start(self):
+        """Serve /metrics on METRICS_PORT and log a summary every METRICS_LOG_INTERVAL seconds"""
+        if not self.enabled or self._started:
+            return
+        self._started = True
+        if Config.METRICS_PORT:
+            try:
+                self.server = ThreadingHTTPServer((Config.METRICS_HOST, Config.METRICS_PORT), _handler(self))
+                self.server.daemon_threads = True
+                threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+                logger.info(f"Serving metrics on http://{Config.METRICS_HOST}:{self.server.server_port}/metrics")
+            except OSError as e:
+                logger.error(f"Metrics endpoint failed to start: {e}")
+        if Config.METRICS_LOG_INTERVAL:
+            threading.Thread(target=self._log_loop, name="metrics-log", daemon=True).start()
+
+    def _log_loop(self):
+        while True:
+            time.sleep(Config.METRICS_LOG_INTERVAL)
+            summary = self.summary()
+            if summary:
+                logger.info(f"Latency summary:\n{summary}")
+
+
+def _handler(registry):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+metrics = Metrics()
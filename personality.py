@@ -1,6 +1,12 @@
 from config import Config
+import hashlib
+import json
+import os
 import random
+import re
 import logging
+import threading
+import time
 
 # Configure logger for personality module
 logger = logging.getLogger('Personality')
@@ -62,54 +68,199 @@ PERSONALITIES = {
     }
 }
 
+WORD_LIMIT_INSTRUCTION = "\nKeep response under {words} words. Be concise."
+
+ERROR_RESPONSES = {
+    "en": "Radio crackle: System malfunction. Try again later.",
+    "ar": "تشويش الراديو: النظام معطل. أعد المحاولة لاحقًا."
+}
+
+# Sent instead when a reply can't be generated within REPLY_DEADLINE
+FALLBACK_RESPONSES = {
+    "en": "Pinned down here. Hold that thought, I'll get back to you.",
+    "ar": "أنا محاصر هنا. انتظر قليلاً، سأعود إليك."
+}
+
+# Stage directions like "(Checking ammo)" at the start of a reply
+LEADING_ACTION = re.compile(r'^\s*\([^)]*\)\s*')
+
+
+class Profile:
+    """One PERSONALITIES entry compiled once for the generation hot path.
+
+    System prompts carry the word-limit instruction, quotes are tuples per
+    language and error replies are already trimmed. cache_key names the
+    profile in response cache keys; it changes when a reloaded profile's
+    content does, so replies written for the old prompts aren't reused.
+    """
+
+    def __init__(self, key, data, builtin=True):
+        self.key = key
+        self.data = data
+        self.name = data.get("name", key)
+        suffix = WORD_LIMIT_INSTRUCTION.format(words=Config.MAX_RESPONSE_WORDS)
+        self.system_prompts = {lang: prompt + suffix for lang, prompt in data["system_prompt"].items()}
+        self.quotes = {lang: tuple(quotes) for lang, quotes in data.get("quotes", {}).items() if quotes}
+        self.quote_chance = data.get("quote_chance", 0.3)
+        self.error_responses = {
+            lang: limit_words(text) for lang, text in {**ERROR_RESPONSES, **data.get("error_response", {})}.items()
+        }
+        self.fallback_responses = {
+            lang: limit_words(text)
+            for lang, text in {**FALLBACK_RESPONSES, **data.get("fallback_response", {})}.items()
+        }
+        if builtin:
+            self.cache_key = key
+        else:
+            digest = hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()[:8]
+            self.cache_key = f"{key}#{digest}"
+
+    def system_prompt(self, lang="en"):
+        return self.system_prompts.get(lang) or self.system_prompts["en"]
+
+    def quote(self, lang="en"):
+        quotes = self.quotes.get(lang) or self.quotes.get("en")
+        return random.choice(quotes) if quotes else None
+
+    def error_response(self, lang="en"):
+        return self.error_responses.get(lang) or self.error_responses["en"]
+
+    def fallback_response(self, lang="en"):
+        return self.fallback_responses.get(lang) or self.fallback_responses["en"]
+
+
+class ProfileRegistry:
+    """Compiled profiles, hot-reloaded from Config.PERSONALITY_FILE.
+
+    The file holds JSON shaped like PERSONALITIES; its profiles are added to
+    or replace the built-in ones. Its modification time is checked at most
+    every PERSONALITY_RELOAD_INTERVAL seconds and a file that fails to load
+    leaves the current profiles in place.
+    """
+
+    def __init__(self, profiles=None, path=None, reload_interval=None):
+        self.builtin = PERSONALITIES if profiles is None else profiles
+        self.path = Config.PERSONALITY_FILE if path is None else path
+        self.reload_interval = Config.PERSONALITY_RELOAD_INTERVAL if reload_interval is None else reload_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0
+        self._profiles = self._compile({})
+        self.check_reload()
+
+    def get(self, key=None):
+        """Compiled profile for key (default PERSONALITY_PROFILE), falling back to leon_re4"""
+        if self.path and time.monotonic() >= self._next_check:
+            self.check_reload()
+        profiles = self._profiles
+        return profiles.get(key or Config.PERSONALITY_PROFILE) or profiles["leon_re4"]
+
+    def check_reload(self):
+        """Reload the profile file if it changed, returns True if it was reloaded"""
+        if not self.path:
+            return False
+        with self._lock:
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._mtime:
+                return False
+            try:
+                overrides = {}
+                if mtime is not None:
+                    with open(self.path, encoding="utf-8") as f:
+                        overrides = json.load(f)
+                profiles = self._compile(overrides)
+            except Exception as e:
+                logger.error(f"Failed to load personality file {self.path}: {e}")
+                return False
+            self._mtime = mtime
+            self._profiles = profiles
+            logger.info(f"Loaded {len(overrides)} personality profiles from {self.path}")
+            return True
+
+    def _compile(self, overrides):
+        profiles = {key: Profile(key, data) for key, data in self.builtin.items()}
+        profiles.update((key, Profile(key, data, builtin=False)) for key, data in overrides.items())
+        return profiles
+
+
+def strip_leading_action(text, lang="en", profile=None):
+    """Remove text in parentheses at the beginning of the response"""
+    return LEADING_ACTION.sub('', text, count=1)
+
+
+def add_signature_quote(text, lang="en", profile=None):
+    """Sometimes open with one of the profile's signature quotes"""
+    profile = profile or registry.get()
+    if random.random() < profile.quote_chance:
+        quote = profile.quote(lang)
+        if quote:
+            return f"{quote}. {text}"
+    return text
+
+
+def limit_words(text, lang="en", profile=None):
+    """Ensure response stays within word limit"""
+    words = text.split()
+    if len(words) > Config.MAX_RESPONSE_WORDS:
+        logger.info(f"Truncated response from {len(words)} to {Config.MAX_RESPONSE_WORDS} words")
+        return ' '.join(words[:Config.MAX_RESPONSE_WORDS]) + '...'
+    return text
+
+
+class ResponsePipeline:
+    """Post-processing of raw model replies.
+
+    Stages are callables (text, lang, profile) -> text run in order. The
+    word limit is applied once, after every other stage.
+    """
+
+    def __init__(self, stages=None):
+        self.stages = list(stages if stages is not None else (strip_leading_action, add_signature_quote))
+
+    def add_stage(self, stage, index=None):
+        if index is None:
+            self.stages.append(stage)
+        else:
+            self.stages.insert(index, stage)
+
+    def run(self, text, lang="en", profile=None):
+        profile = profile or registry.get()
+        for stage in self.stages:
+            text = stage(text, lang, profile)
+        return limit_words(text, lang, profile)
+
+
+registry = ProfileRegistry()
+response_pipeline = ResponsePipeline()
+
+
 def get_personality():
     """Get the current personality profile"""
-    return PERSONALITIES.get(Config.PERSONALITY_PROFILE, PERSONALITIES["leon_re4"])
+    return registry.get().data
 
 def get_random_quote(lang="en"):
     """Get a random Leon quote"""
-    personality = get_personality()
-    return random.choice(personality["quotes"].get(lang, personality["quotes"]["en"]))
+    return registry.get().quote(lang)
 
 def apply_personality(response, lang="en"):
     """Apply Leon's personality to a response"""
-    # Start with the core response
-    final_response = response
-    
-    # 30% chance to start with a signature quote
-    if random.random() < 0.3:
-        final_response = f"{get_random_quote(lang)}. {final_response}"
-    
-    # 40% chance to add a combat mannerism
-    if random.random() < 0.4:
-        # Alternate between prefix and suffix
-        if random.choice([True, False]):
-            final_response = f"{final_response}"
-        else:
-            final_response = f"{final_response}"
-    
-    # Enforce word limit
-    return enforce_word_limit(final_response)
+    return response_pipeline.run(response, lang)
 
 def enforce_word_limit(response):
     """Ensure response stays within word limit"""
-    words = response.split()
-    if len(words) > Config.MAX_RESPONSE_WORDS:
-        truncated = ' '.join(words[:Config.MAX_RESPONSE_WORDS]) + '...'
-        logger.info(f"Truncated response from {len(words)} to {Config.MAX_RESPONSE_WORDS} words")
-        return truncated
-    return response
+    return limit_words(response)
 
 def get_error_response(lang="en"):
     """Get error response in character"""
-    if lang == "ar":
-        return enforce_word_limit("تشويش الراديو: النظام معطل. أعد المحاولة لاحقًا.")
-    return enforce_word_limit("Radio crackle: System malfunction. Try again later.")
+    return registry.get().error_response(lang)
 
 def format_prompt(user_input, web_context, lang="en"):
     """Format prompt with Leon's personality"""
-    personality = get_personality()
-    system_prompt = personality["system_prompt"].get(lang, personality["system_prompt"]["en"])
+    system_prompt = registry.get().system_prompt(lang)
     
     # Add Leon-specific context
     bio_context = (
@@ -117,9 +268,6 @@ def format_prompt(user_input, web_context, lang="en"):
         "Primary threats: Zombies, mutants, and corrupt organizations."
     )
     
-    # Add word limit instruction
-    system_prompt += f"\nKeep responses under {Config.MAX_RESPONSE_WORDS} words. Be concise."
-    
     prompt = (
         f"<|system|>\n{system_prompt}\n"
         f"Agent Background: {bio_context}\n"
@@ -0,0 +1,62 @@
+import time
+
+from config import Config
+
+
+class PollSchedule:
+    """When each channel is polled next.
+
+    A channel with a new mention, or a reply still pending, is polled every
+    POLL_MIN_INTERVAL seconds. Every poll without one multiplies its interval
+    by POLL_BACKOFF, up to POLL_INTERVAL while the channel has had messages
+    in the last POLL_IDLE_AFTER seconds and up to POLL_MAX_INTERVAL once it
+    has gone quiet. Setting the three intervals to the same value polls at
+    a fixed interval.
+    """
+
+    def __init__(self, channels, clock=time.monotonic):
+        self.clock = clock
+        now = clock()
+        self.intervals = {channel_id: Config.POLL_INTERVAL for channel_id in channels}
+        self.next_poll = {channel_id: now for channel_id in channels}
+        self.polled_at = {}
+        self.active_at = {channel_id: now for channel_id in channels}
+        self.polls = 0
+
+    def due(self):
+        """Channels to poll now. They stay scheduled at their current
+        interval until record() says what the poll found."""
+        now = self.clock()
+        channels = [channel_id for channel_id, at in self.next_poll.items() if at <= now]
+        for channel_id in channels:
+            self.polled_at[channel_id] = now
+            self.next_poll[channel_id] = now + self.intervals[channel_id]
+        self.polls += len(channels)
+        return channels
+
+    def record(self, channel_id, messages=0, mentioned=False, pending=False):
+        """Adjust a channel's interval after a poll that returned `messages`"""
+        polled_at = self.polled_at.get(channel_id, self.clock())
+        if messages:
+            self.active_at[channel_id] = polled_at
+        if mentioned or pending:
+            interval = Config.POLL_MIN_INTERVAL
+        else:
+            quiet = polled_at - self.active_at[channel_id] >= Config.POLL_IDLE_AFTER
+            ceiling = Config.POLL_MAX_INTERVAL if quiet else Config.POLL_INTERVAL
+            interval = min(self.intervals[channel_id] * Config.POLL_BACKOFF, ceiling)
+        interval = max(interval, Config.POLL_MIN_INTERVAL)
+        self.intervals[channel_id] = interval
+        self.next_poll[channel_id] = polled_at + interval
+
+    def wait(self):
+        """Seconds until the next channel is due"""
+        return max(0.0, min(self.next_poll.values()) - self.clock())
+
+    def stats(self):
+        intervals = self.intervals.values()
+        return {
+            "polls": self.polls,
+            "min_interval": min(intervals),
+            "max_interval": max(intervals)
+        }
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+from config import Config
+
+logger = logging.getLogger('RateLimit')
+
+PROBE_POLL = 0.05  # Seconds between checks while a route's first response is awaited
+PROBE_TIMEOUT = 5  # Seconds before a probe that never got a response is given up on
+
+
+class Bucket:
+    __slots__ = ("limit", "remaining", "reset_at", "window")
+
+    def __init__(self, limit, remaining, reset_at, window):
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_at = reset_at
+        self.window = window
+
+
+class RateLimiter:
+    """Shared Discord rate limiter for every outbound API call.
+
+    Routes are mapped to the buckets Discord reports in X-RateLimit-Bucket
+    (scoped per channel, the major parameter), and each request reserves a
+    slot before it is sent, so calls wait for the bucket to reset instead
+    of running into a 429. The global limit is tracked the same way, with
+    a sliding one-second window.
+
+    Until a route's bucket is known for a channel, one request goes out
+    alone as a probe and the rest wait for its X-RateLimit-* headers.
+    Routes whose responses carry no such headers are not held again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._route_buckets = {}  # route -> bucket hash
+        self._buckets = {}  # (bucket hash, major parameter) -> Bucket
+        self._probes = {}  # (route, major parameter) -> when its probe was sent
+        self._unbucketed = set()  # routes whose responses report no bucket
+        self._global_reset = 0.0
+        self._global_window = deque()
+        self.stats = {"requests": 0, "delayed": 0, "rate_limited": 0}
+
+    def delay(self, route, major=None):
+        """Seconds to wait before a request on route may go; 0 reserves a slot"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._global_reset - now
+
+            while self._global_window and self._global_window[0] <= now - 1:
+                self._global_window.popleft()
+            if len(self._global_window) >= Config.GLOBAL_RATE_LIMIT:
+                wait = max(wait, self._global_window[0] + 1 - now)
+
+            bucket = self._bucket(route, major)
+            probe = bucket is None and route not in self._unbucketed
+            if probe and self._probes.get((route, major), 0) + PROBE_TIMEOUT > now:
+                wait = max(wait, PROBE_POLL)
+            if bucket is not None:
+                if bucket.reset_at <= now:
+                    # Assume a fresh window until a response says otherwise
+                    bucket.remaining = bucket.limit
+                    bucket.reset_at = now + bucket.window
+                if bucket.remaining <= 0:
+                    wait = max(wait, bucket.reset_at - now)
+
+            if wait > 0:
+                return wait
+
+            if bucket is not None:
+                bucket.remaining -= 1
+            elif probe:
+                self._probes[(route, major)] = now
+            self._global_window.append(now)
+            self.stats["requests"] += 1
+            return 0.0
+
+    def acquire(self, route, major=None, timeout=None):
+        """Block until a request on route may be sent.
+
+        Returns False, without waiting, once the wait would run past timeout.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        delayed = False
+        while True:
+            wait = self.delay(route, major)
+            if not wait:
+                break
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            delayed = True
+            time.sleep(wait)
+        if delayed:
+            self._count("delayed")
+        return True
+
+    async def acquire_async(self, route, major=None, timeout=None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        delayed = False
+        while True:
+            wait = self.delay(route, major)
+            if not wait:
+                break
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            delayed = True
+            await asyncio.sleep(wait)
+        if delayed:
+            self._count("delayed")
+        return True
+
+    def update(self, route, major, status, headers, body=None):
+        """Record the limits reported by a response, returns retry-after on 429"""
+        with self._lock:
+            now = time.monotonic()
+            bucket_hash = headers.get("X-RateLimit-Bucket")
+            if bucket_hash:
+                self._route_buckets[route] = bucket_hash
+            elif self._probes.get((route, major)) and self._bucket(route, major) is None:
+                self._unbucketed.add(route)
+            self._probes.pop((route, major), None)
+
+            limit = headers.get("X-RateLimit-Limit")
+            remaining = headers.get("X-RateLimit-Remaining")
+            reset_after = headers.get("X-RateLimit-Reset-After")
+            if bucket_hash and limit is not None and remaining is not None and reset_after is not None:
+                key = (bucket_hash, major)
+                reset_at = now + float(reset_after)
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    self._buckets[key] = Bucket(int(limit), int(remaining), reset_at, float(reset_after))
+                else:
+                    # Requests reserved since this response was produced have
+                    # used more of the bucket than it knows about
+                    bucket.limit = int(limit)
+                    bucket.remaining = min(bucket.remaining, int(remaining))
+                    bucket.reset_at = reset_at
+                    bucket.window = max(bucket.window, float(reset_after))
+
+            if status != 429:
+                return None
+
+            self.stats["rate_limited"] += 1
+            body = body if isinstance(body, dict) else {}
+            retry_after = float(body.get("retry_after") or headers.get("Retry-After") or 5)
+            if body.get("global") or headers.get("X-RateLimit-Global"):
+                self._global_reset = now + retry_after
+            else:
+                bucket = self._bucket(route, major)
+                if bucket is None:
+                    # No bucket headers yet: hold the route itself
+                    self._route_buckets.setdefault(route, route)
+                    bucket = Bucket(1, 0, now + retry_after, retry_after)
+                    self._buckets[(self._route_buckets[route], major)] = bucket
+                bucket.remaining = 0
+                bucket.reset_at = max(bucket.reset_at, now + retry_after)
+            return retry_after
+
+    def _bucket(self, route, major):
+        bucket_hash = self._route_buckets.get(route)
+        return self._buckets.get((bucket_hash, major)) if bucket_hash else None
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+rate_limiter = RateLimiter()
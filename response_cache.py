@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+import database
+import personality
+from text_analysis import normalize
+
+logger = logging.getLogger('ResponseCache')
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ResponseCache:
+    """Cache of raw model replies ("cores") for repeated mentions.
+
+    Keys are the normalized message plus language and personality profile.
+    Lookups fall back to trigram-similar entries in memory, then to earlier
+    replies persisted in the messages table. Callers still run the
+    personality styling on top of the returned core.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, similarity=None):
+        self.max_entries = max_entries or Config.RESPONSE_CACHE_SIZE
+        self.ttl = ttl or Config.RESPONSE_CACHE_TTL
+        self.similarity = similarity or Config.RESPONSE_CACHE_SIMILARITY
+
+        self._entries = OrderedDict()  # key -> (core, expires_at, trigrams)
+        self._index = {}  # trigram -> keys containing it
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "near_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+
+    def make_key(self, text, lang):
+        """Cache key for a message, None if it isn't worth caching"""
+        normalized = normalize(text)
+        if not normalized or len(normalized) > Config.RESPONSE_CACHE_MAX_CHARS:
+            return None
+        return f"{personality.registry.get().cache_key}|{lang}|{normalized}"
+
+    def get(self, text, lang):
+        """Cached core reply for text, or None"""
+        key = self.make_key(text, lang)
+        if key is None:
+            return None
+
+        with self._lock:
+            core = self._get_exact(key)
+            if core is not None:
+                self._stats["hits"] += 1
+                return core
+            if Config.RESPONSE_CACHE_NEAR_DUPLICATES:
+                core = self._get_similar(key)
+                if core is not None:
+                    self._stats["near_hits"] += 1
+                    return core
+
+        if Config.RESPONSE_CACHE_PERSISTENT:
+            core = database.get_cached_response(key, Config.RESPONSE_CACHE_DB_TTL)
+            if core is not None:
+                with self._lock:
+                    self._stats["db_hits"] += 1
+                    self._store(key, core)
+                return core
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, text, lang, core):
+        key = self.make_key(text, lang)
+        if key is not None and core:
+            with self._lock:
+                self._store(key, core)
+
+    def entry(self, text, lang):
+        """(key, core) to persist alongside a saved message, or (None, None)"""
+        key = self.make_key(text, lang)
+        with self._lock:
+            core = self._get_exact(key) if key else None
+        return (key, core) if core is not None else (None, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), **self._stats}
+
+    def _get_exact(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _get_similar(self, key):
+        prefix, _, normalized = key.rpartition('|')
+        grams = trigrams(normalized)
+        shared = {}
+        for gram in grams:
+            for candidate in self._index.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        best_key, best_score = None, self.similarity
+        for candidate, count in shared.items():
+            if not candidate.startswith(prefix + '|'):
+                continue
+            # Jaccard similarity of the two trigram sets
+            score = count / (len(grams) + len(self._entries[candidate][2]) - count)
+            if score >= best_score:
+                best_key, best_score = candidate, score
+        return self._get_exact(best_key) if best_key else None
+
+    def _store(self, key, core):
+        if key in self._entries:
+            self._remove(key)
+        grams = trigrams(key.rpartition('|')[2])
+        self._entries[key] = (core, time.monotonic() + self.ttl, grams)
+        for gram in grams:
+            self._index.setdefault(gram, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _remove(self, key):
+        _, _, grams = self._entries.pop(key)
+        for gram in grams:
+            keys = self._index.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[gram]
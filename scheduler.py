@@ -0,0 +1,205 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from config import Config
+from metrics import metrics
+
+logger = logging.getLogger('Scheduler')
+
+
+class GenerationJob:
+    __slots__ = ("user_id", "args", "deadline", "future", "enqueued_at")
+
+    def __init__(self, user_id, args, deadline=None):
+        self.user_id = user_id
+        self.args = args
+        self.deadline = deadline
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class GenerationScheduler:
+    """Bounded, per-user fair queue in front of a pool of generation workers.
+
+    Pending jobs are kept in one deque per user and workers take them
+    round-robin between users, so while others are waiting a user spamming
+    mentions gets one job started per turn. Without competition they can
+    still have every worker. Jobs that are dropped (queue full, coalesced
+    or stale) have their future cancelled.
+    """
+
+    def __init__(self, handler, workers=None, max_queue=None, max_per_user=None, max_wait=None):
+        self.handler = handler
+        self.workers = workers or Config.MAX_CONCURRENT_GENERATIONS
+        self.max_queue = max_queue or Config.GENERATION_QUEUE_SIZE
+        self.max_per_user = max_per_user or Config.GENERATION_MAX_PER_USER
+        self.max_wait = max_wait or Config.GENERATION_MAX_WAIT
+
+        self._queues = OrderedDict()
+        self._depth = 0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+
+        self._counters = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "dropped_full": 0,
+            "dropped_stale": 0,
+            "coalesced": 0
+        }
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._service_total = 0.0
+        self._service_max = 0.0
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"llm-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Generation scheduler started with {self.workers} workers")
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._running = False
+            for queue in self._queues.values():
+                for job in queue:
+                    job.future.cancel()
+            self._queues.clear()
+            self._depth = 0
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def submit(self, user_id, *args, deadline=None) -> Future:
+        """Queue a generation for user_id, returns a Future with the reply.
+
+        A job with a deadline is never dropped as stale, the handler gets
+        the deadline and answers a job that waited past it with a fallback.
+        """
+        job = GenerationJob(user_id, args, deadline)
+        with self._cond:
+            self._counters["submitted"] += 1
+            queue = self._queues.setdefault(user_id, deque())
+
+            # Only the newest few mentions of a user are worth answering
+            while len(queue) >= self.max_per_user:
+                self._drop(queue.popleft(), "coalesced")
+
+            if self._estimated_wait() > self.max_wait:
+                self._coalesce_all()
+
+            if self._depth >= self.max_queue:
+                self._drop_from_longest()
+
+            self._queues.setdefault(user_id, queue).append(job)
+            self._depth += 1
+            self._cond.notify()
+        return job.future
+
+    def stats(self):
+        """Queue depth, wait and service times for sizing the worker pool"""
+        with self._cond:
+            finished = self._counters["completed"] + self._counters["failed"]
+            started = finished + self._in_flight
+            return {
+                "workers": self.workers,
+                "queue_depth": self._depth,
+                "queued_users": len(self._queues),
+                "in_flight": self._in_flight,
+                **self._counters,
+                "avg_wait": self._wait_total / started if started else 0.0,
+                "max_wait": self._wait_max,
+                "avg_service": self._service_total / finished if finished else 0.0,
+                "max_service": self._service_max
+            }
+
+    def _estimated_wait(self):
+        finished = self._counters["completed"] + self._counters["failed"]
+        if not finished:
+            return 0.0
+        return (self._depth / self.workers) * (self._service_total / finished)
+
+    def _drop(self, job, reason):
+        self._counters[reason] += 1
+        self._depth -= 1
+        job.future.cancel()
+
+    def _coalesce_all(self):
+        # Over the latency budget: keep only each user's latest mention
+        for queue in self._queues.values():
+            while len(queue) > 1:
+                self._drop(queue.popleft(), "coalesced")
+
+    def _drop_from_longest(self):
+        user_id = max(self._queues, key=lambda uid: len(self._queues[uid]))
+        queue = self._queues[user_id]
+        if queue:
+            self._drop(queue.popleft(), "dropped_full")
+        if not queue:
+            del self._queues[user_id]
+
+    def _next_job(self):
+        # Round-robin across users: take the head user's oldest job and
+        # rotate that user to the back if they still have work queued
+        user_id, queue = self._queues.popitem(last=False)
+        job = queue.popleft()
+        if queue:
+            self._queues[user_id] = queue
+        self._depth -= 1
+        return job
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and not self._depth:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                job = self._next_job()
+
+                waited = time.monotonic() - job.enqueued_at
+                if waited > self.max_wait and job.deadline is None:
+                    self._counters["dropped_stale"] += 1
+                    job.future.cancel()
+                    continue
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                self._in_flight += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            metrics.observe("queue_wait", waited)
+
+            start = time.monotonic()
+            try:
+                if job.deadline is None:
+                    result = self.handler(*job.args)
+                else:
+                    result = self.handler(*job.args, deadline=job.deadline)
+                error = None
+            except Exception as e:
+                result, error = None, e
+            service = time.monotonic() - start
+
+            with self._cond:
+                self._in_flight -= 1
+                self._service_total += service
+                self._service_max = max(self._service_max, service)
+                self._counters["failed" if error else "completed"] += 1
+
+            if error:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
@@ -0,0 +1,66 @@
+import re
+from functools import lru_cache
+
+from config import Config
+
+DEFAULT_LANGUAGE = "en"
+
+# Unicode blocks of the scripts LANGUAGE_SCRIPTS can refer to
+SCRIPT_RANGES = {
+    # Arabic, Arabic Supplement, Arabic Extended-A/B, Presentation Forms-A/B,
+    # Rumi numerals and the mathematical alphabetic symbols
+    "arabic": "\u0600-\u06FF\u0750-\u077F\u0870-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF"
+              "\U00010E60-\U00010E7F\U0001EE00-\U0001EEFF",
+    "hebrew": "\u0590-\u05FF\uFB1D-\uFB4F",
+    "cyrillic": "\u0400-\u052F\u1C80-\u1C8F\u2DE0-\u2DFF\uA640-\uA69F",
+    "greek": "\u0370-\u03FF\u1F00-\u1FFF",
+    "devanagari": "\u0900-\u097F\uA8E0-\uA8FF",
+    "cjk": "\u3040-\u30FF\u3400-\u4DBF\u4E00-\u9FFF\uAC00-\uD7AF",
+}
+
+# Letters only, so Arabic punctuation or digits in a message don't count
+SCRIPT_PATTERNS = {
+    script: re.compile(f"(?=[^\\W\\d_])[{ranges}]") for script, ranges in SCRIPT_RANGES.items()
+}
+LETTER_PATTERN = re.compile(r'[^\W\d_]')
+MENTION_PATTERN = re.compile(r'<@[!&]?\d+>')
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+
+
+def detect_language(text):
+    """Language code for text, from the scripts in LANGUAGE_SCRIPTS.
+
+    With MIXED_LANGUAGE_RATIO at 0 any character of a configured script
+    decides (first match wins); above 0 the most used script must make up
+    at least that share of the letters. Otherwise DEFAULT_LANGUAGE.
+    """
+    # Most chat is plain ASCII, which no configured script can match
+    if text.isascii():
+        return DEFAULT_LANGUAGE
+
+    ratio = Config.MIXED_LANGUAGE_RATIO
+    best, best_count = DEFAULT_LANGUAGE, 0
+    for lang, script in Config.LANGUAGE_SCRIPTS.items():
+        pattern = SCRIPT_PATTERNS[script]
+        if ratio <= 0:
+            if pattern.search(text):
+                return lang
+            continue
+        count = len(pattern.findall(text))
+        if count > best_count:
+            best, best_count = lang, count
+
+    if best_count and best_count >= ratio * len(LETTER_PATTERN.findall(text)):
+        return best
+    return DEFAULT_LANGUAGE
+
+
+@lru_cache(maxsize=1024)
+def normalize(text):
+    """Lowercase, drop mentions/punctuation and collapse whitespace.
+
+    Cached, as the response cache normalizes each mention several times.
+    """
+    text = MENTION_PATTERN.sub(' ', text.lower())
+    text = PUNCTUATION_PATTERN.sub(' ', text)
+    return ' '.join(text.split())
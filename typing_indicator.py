@@ -0,0 +1,201 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+logger = logging.getLogger('Typing')
+
+
+class TypingSchedule:
+    """Which channels need a typing POST and when.
+
+    Every pending reply holds a token on its channel until it is sent or
+    its typing time runs out. A channel is posted to once per refresh
+    interval however many replies are pending in it, and again right after
+    one of them is sent (our own message clears the indicator) if others
+    are still waiting.
+    """
+
+    def __init__(self, refresh_interval=None):
+        self.refresh_interval = refresh_interval or Config.TYPING_REFRESH_INTERVAL
+        self._active = {}  # channel id -> {token: expires at}
+        self._next_post = {}  # channel id -> monotonic time of the next POST
+        self._tokens = itertools.count()
+        self.stats = {"started": 0, "deduplicated": 0, "posted": 0}
+
+    def add(self, channel_id, duration):
+        now = time.monotonic()
+        token = (channel_id, next(self._tokens))
+        tokens = self._active.setdefault(channel_id, {})
+        if tokens:
+            self.stats["deduplicated"] += 1
+        else:
+            self._next_post[channel_id] = now
+        tokens[token] = now + duration
+        self.stats["started"] += 1
+        return token
+
+    def remove(self, token):
+        channel_id = token[0]
+        tokens = self._active.get(channel_id)
+        if not tokens or tokens.pop(token, None) is None:
+            return
+        if tokens:
+            self._next_post[channel_id] = time.monotonic()
+        else:
+            self._drop(channel_id)
+
+    def due(self, now):
+        """Channels to post to now, each rescheduled one interval ahead"""
+        due = []
+        for channel_id, at in list(self._next_post.items()):
+            tokens = self._active[channel_id]
+            for token, expires_at in list(tokens.items()):
+                if expires_at <= now:
+                    del tokens[token]
+            if not tokens:
+                self._drop(channel_id)
+            elif at <= now:
+                self._next_post[channel_id] = now + self.refresh_interval
+                due.append(channel_id)
+        return due
+
+    def next_due(self):
+        """Monotonic time something next needs attention, None when idle"""
+        if not self._next_post:
+            return None
+        expiries = (min(tokens.values()) for tokens in self._active.values())
+        return min(min(self._next_post.values()), min(expiries))
+
+    def _drop(self, channel_id):
+        self._active.pop(channel_id, None)
+        self._next_post.pop(channel_id, None)
+
+
+class TypingScheduler:
+    """Single background thread driving typing indicators for every reply.
+
+    send(channel_id) performs the POST; at most max_in_flight of them run at
+    once and never two for the same channel.
+    """
+
+    def __init__(self, send, max_in_flight=None, refresh_interval=None):
+        self.send = send
+        self.schedule = TypingSchedule(refresh_interval)
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(
+            max_in_flight or Config.MAX_TYPING_REQUESTS, thread_name_prefix="typing"
+        )
+        self._in_flight = set()
+        self._thread = None
+
+    def start(self, channel_id, duration):
+        """Keep channel_id typing for up to duration seconds, returns a token for stop()"""
+        if duration <= 0:
+            return None
+        with self._cond:
+            token = self.schedule.add(channel_id, duration)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="typing-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return token
+
+    def stop(self, token):
+        if token is None:
+            return
+        with self._cond:
+            self.schedule.remove(token)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [c for c in self.schedule.due(now) if c not in self._in_flight]
+                if not due:
+                    next_due = self.schedule.next_due()
+                    self._cond.wait(None if next_due is None else max(next_due - now, 0))
+                    continue
+                self._in_flight.update(due)
+                self.schedule.stats["posted"] += len(due)
+
+            for channel_id in due:
+                self._executor.submit(self._post, channel_id)
+
+    def _post(self, channel_id):
+        try:
+            self.send(channel_id)
+        except Exception as e:
+            logger.warning(f"Typing indicator failed: {e}")
+        finally:
+            with self._cond:
+                self._in_flight.discard(channel_id)
+
+
+class AsyncTypingScheduler:
+    """TypingScheduler for the asyncio engine, send is a coroutine function"""
+
+    def __init__(self, send, max_in_flight=None, refresh_interval=None):
+        self.send = send
+        self.schedule = TypingSchedule(refresh_interval)
+        self._slots = asyncio.Semaphore(max_in_flight or Config.MAX_TYPING_REQUESTS)
+        self._wakeup = asyncio.Event()
+        self._in_flight = set()
+        self._posts = set()
+        self._task = None
+
+    def start(self, channel_id, duration):
+        if duration <= 0:
+            return None
+        token = self.schedule.add(channel_id, duration)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return token
+
+    def stop(self, token):
+        if token is None:
+            return
+        self.schedule.remove(token)
+        self._wakeup.set()
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        for post in list(self._posts):
+            post.cancel()
+        await asyncio.gather(*filter(None, [self._task, *self._posts]), return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            for channel_id in self.schedule.due(now):
+                if channel_id in self._in_flight:
+                    continue
+                self._in_flight.add(channel_id)
+                self.schedule.stats["posted"] += 1
+                post = asyncio.create_task(self._post(channel_id))
+                self._posts.add(post)
+                post.add_done_callback(self._posts.discard)
+
+            self._wakeup.clear()
+            next_due = self.schedule.next_due()
+            try:
+                timeout = None if next_due is None else max(next_due - time.monotonic(), 0)
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _post(self, channel_id):
+        try:
+            async with self._slots:
+                await self.send(channel_id)
+        except Exception as e:
+            logger.warning(f"Typing indicator failed: {e}")
+        finally:
+            self._in_flight.discard(channel_id)
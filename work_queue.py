@@ -0,0 +1,149 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger('WorkQueue')
+
+CREATE_JOBS = '''CREATE TABLE IF NOT EXISTS jobs
+                 (message_id TEXT PRIMARY KEY,
+                  channel_id TEXT NOT NULL,
+                  message TEXT NOT NULL,
+                  language TEXT NOT NULL,
+                  status TEXT NOT NULL DEFAULT 'pending',
+                  worker TEXT,
+                  attempts INTEGER NOT NULL DEFAULT 0,
+                  lease_until REAL,
+                  created_at REAL NOT NULL,
+                  finished_at REAL,
+                  error TEXT)'''
+
+CREATE_CLAIM_INDEX = '''CREATE INDEX IF NOT EXISTS idx_jobs_claim
+                        ON jobs (status, created_at)'''
+
+# The mention id is the primary key, so re-ingesting a mention is a no-op
+INSERT_JOB = '''INSERT OR IGNORE INTO jobs
+                (message_id, channel_id, message, language, created_at)
+                VALUES (?, ?, ?, ?, ?)'''
+
+# One statement, so two workers can never claim the same job. Jobs whose
+# lease ran out (the worker died) are handed out again. A job that reached
+# 'sending' keeps that status, so its next worker knows a reply may already
+# be posted.
+CLAIM_JOB = '''UPDATE jobs
+               SET status = CASE status WHEN 'sending' THEN 'sending' ELSE 'claimed' END,
+                   worker = ?, attempts = attempts + 1, lease_until = ?
+               WHERE message_id = (
+                   SELECT message_id FROM jobs
+                   WHERE (status = 'pending'
+                          OR (status IN ('claimed', 'sending') AND COALESCE(lease_until, 0) < ?))
+                   AND attempts < ?
+                   ORDER BY created_at
+                   LIMIT 1)
+               RETURNING message_id, message, language, attempts, status'''
+
+# Set right before the reply is sent, renewing the lease for the send
+MARK_SENDING = '''UPDATE jobs
+                  SET status = 'sending', lease_until = ?
+                  WHERE status IN ('claimed', 'sending') AND message_id = ? AND worker = ?'''
+
+# Only the current lease holder may finish a job
+FINISH_JOB = '''UPDATE jobs
+                SET status = ?, finished_at = ?, error = ?, lease_until = NULL
+                WHERE status IN ('claimed', 'sending') AND message_id = ? AND worker = ?'''
+
+RETRY_JOB = '''UPDATE jobs
+               SET status = CASE status WHEN 'sending' THEN 'sending' ELSE 'pending' END,
+                   error = ?, lease_until = NULL
+               WHERE status IN ('claimed', 'sending') AND message_id = ? AND worker = ?'''
+
+FAIL_ABANDONED = '''UPDATE jobs
+                    SET status = 'failed', finished_at = ?, error = 'lease expired too often'
+                    WHERE status IN ('claimed', 'sending') AND lease_until < ? AND attempts >= ?'''
+
+PRUNE_JOBS = '''DELETE FROM jobs
+                WHERE status IN ('done', 'failed') AND finished_at < ?'''
+
+COUNT_JOBS = '''SELECT status, COUNT(*) FROM jobs GROUP BY status'''
+
+
+class WorkQueue:
+    """SQLite-backed queue of mentions between ingestors and generation workers.
+
+    Lives in one file (Config.QUEUE_FILE) that any number of processes on the
+    host can open. Mentions are keyed by their Discord id, so each is queued
+    once however often it is ingested, and handed to one worker at a time
+    under a lease; a worker that dies mid-job loses its lease and the job
+    goes to another worker after QUEUE_LEASE seconds.
+
+    A job is marked 'sending' before its reply goes out and stays so until
+    it is finished. A worker that claims a 'sending' job is told to look for
+    the reply in the channel first: the nonce only stops Discord posting a
+    resend within a few minutes of the first send.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.QUEUE_FILE
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(CREATE_JOBS)
+        conn.execute(CREATE_CLAIM_INDEX)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit: every statement here is its own transaction
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, message, lang):
+        """Queue a mention, returns False if it was already queued"""
+        cursor = self._connection().execute(INSERT_JOB, (
+            message['id'], str(message['channel_id']), json.dumps(message), lang, time.time()
+        ))
+        return cursor.rowcount == 1
+
+    def claim(self, worker_id):
+        """Lease the oldest available job, returns (message, lang, attempt, resend)
+        or None. resend is True if an earlier attempt may have sent the reply."""
+        now = time.time()
+        conn = self._connection()
+        conn.execute(FAIL_ABANDONED, (now, now, Config.QUEUE_MAX_ATTEMPTS))
+        row = conn.execute(CLAIM_JOB, (
+            worker_id, now + Config.QUEUE_LEASE, now, Config.QUEUE_MAX_ATTEMPTS
+        )).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[1]), row[2], row[3], row[4] == 'sending'
+
+    def mark_sending(self, message_id, worker_id):
+        """Record that the reply is about to be sent, returns False if the
+        lease was lost to another worker"""
+        cursor = self._connection().execute(MARK_SENDING, (
+            time.time() + Config.QUEUE_LEASE, message_id, worker_id
+        ))
+        return cursor.rowcount == 1
+
+    def complete(self, message_id, worker_id):
+        self._connection().execute(FINISH_JOB, ('done', time.time(), None, message_id, worker_id))
+
+    def release(self, message_id, worker_id, error, attempt):
+        """Give a failed job back to the queue, or fail it after its last attempt"""
+        conn = self._connection()
+        if attempt >= Config.QUEUE_MAX_ATTEMPTS:
+            conn.execute(FINISH_JOB, ('failed', time.time(), str(error), message_id, worker_id))
+        else:
+            conn.execute(RETRY_JOB, (str(error), message_id, worker_id))
+
+    def prune(self):
+        """Forget finished jobs older than QUEUE_RETENTION seconds"""
+        self._connection().execute(PRUNE_JOBS, (time.time() - Config.QUEUE_RETENTION,))
+
+    def stats(self):
+        return dict(self._connection().execute(COUNT_JOBS).fetchall())
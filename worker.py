@@ -0,0 +1,105 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from config import Config
+from database import init_db, close_db
+from deadline import Deadline
+from discord_app import llm, find_reply, send_reply, save_reply
+from work_queue import WorkQueue
+
+logger = logging.getLogger('Worker')
+
+STATS_INTERVAL = 60
+
+
+class GenerationWorker:
+    """Generation side of a split deployment (DEPLOY_ROLE = "worker").
+
+    Claims mentions queued by the ingest process, generates with this
+    process's Ollama host and sends the reply. A job is only marked done
+    after its reply went out; if the worker dies before that, the lease runs
+    out and another worker retries it. A retry of a job that got as far as
+    sending first checks the channel for the reply, and the reply's nonce
+    covers a resend within Discord's nonce window.
+    """
+
+    def __init__(self, queue=None, worker_id=None, threads=None):
+        self.queue = queue or WorkQueue()
+        self.worker_id = worker_id or Config.WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
+        self.threads = threads or Config.MAX_CONCURRENT_GENERATIONS
+        self.stopped = threading.Event()
+
+    def process(self, job):
+        message, lang, attempt, resend = job
+        # Starts when the job is claimed, the ingest process's clock isn't ours
+        deadline = Deadline()
+        try:
+            if resend and find_reply(message):
+                logger.info(f"Mention {message['id']} was already answered, not sending again")
+                self.queue.complete(message['id'], self.worker_id)
+                return True
+            response = llm.generate_response(message['content'], lang, message['author']['id'], deadline)
+            if not response:
+                raise ValueError("empty response")
+            if not self.queue.mark_sending(message['id'], self.worker_id):
+                logger.warning(f"Lost the lease on mention {message['id']}, leaving it to its new worker")
+                return False
+            if not send_reply(message, response, deadline):
+                raise RuntimeError("reply not sent")
+        except Exception as e:
+            logger.error(f"Mention {message['id']} failed on attempt {attempt}: {e}")
+            self.queue.release(message['id'], self.worker_id, e, attempt)
+            return False
+
+        self.queue.complete(message['id'], self.worker_id)
+        save_reply(message, response, lang, deadline.fallback)
+        return True
+
+    def _run(self):
+        # Leave mentions to other workers while our model is still loading
+        llm.wait_ready()
+        while not self.stopped.is_set():
+            try:
+                job = self.queue.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"Claim failed: {e}")
+                job = None
+            if job is None:
+                self.stopped.wait(Config.WORKER_POLL_INTERVAL)
+                continue
+            self.process(job)
+
+    def run(self):
+        logger.info(f"Starting generation worker {self.worker_id} with {self.threads} threads")
+        llm.warm_up()
+        init_db()
+        threads = [
+            threading.Thread(target=self._run, name=f"worker-{i}", daemon=True)
+            for i in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while not self.stopped.wait(STATS_INTERVAL):
+                self.queue.prune()
+                logger.info(f"Work queue: {self.queue.stats()}")
+        except KeyboardInterrupt:
+            logger.info("Worker stopped by user")
+        finally:
+            # Jobs in progress finish; anything claimed after this is left to its lease
+            self.stop()
+            for thread in threads:
+                thread.join()
+            close_db()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def run():
+    """Entry point used by discord_app.main_loop for DEPLOY_ROLE = "worker" """
+    GenerationWorker().run()